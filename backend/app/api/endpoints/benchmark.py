@@ -1,26 +1,92 @@
-from fastapi import APIRouter
-from typing import List, Dict, Any
+import os
+from fastapi import APIRouter, HTTPException
+from typing import List, Dict, Any, Optional
+from pydantic import BaseModel
+from app.core.benchmark import benchmark_runner
+from app.core.config import settings
+from app.utils.preprocess_steps import STEPS
 
 router = APIRouter()
 
-# Mock benchmark data for now, or we can store real runs
-BENCHMARKS = [
-    {
-        "model": "deepseek-ocr:latest",
-        "accuracy": "98.5%",
-        "avg_latency": "1.2s",
-        "throughput": "50 img/min",
-        "memory_usage": "4GB"
-    },
-    {
-        "model": "qwen3-vl:8b",
-        "accuracy": "97.8%",
-        "avg_latency": "0.8s",
-        "throughput": "70 img/min",
-        "memory_usage": "3.5GB"
+class BenchmarkRunRequest(BaseModel):
+    models: Optional[List[str]] = None  # Defaults to every registered model
+    corpus_dirs: Optional[List[str]] = None  # Relative to BENCHMARK_CORPUS_DIR; defaults to all of it
+    concurrency_levels: List[int] = [1, 2, 4]
+    warm_passes: int = 1
+    prompt: Optional[str] = None
+    template: Optional[str] = None
+    preprocess_steps: Optional[List[str]] = None  # Defaults to each model's configured chain
+    ollama_host: Optional[str] = None  # One of the configured Ollama hosts; stub servers are CLI-only
+
+def _resolve_corpus_dir(path: str) -> str:
+    """Resolve a requested corpus directory, refusing anything outside BENCHMARK_CORPUS_DIR."""
+    root = os.path.realpath(settings.BENCHMARK_CORPUS_DIR)
+    resolved = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, resolved]) != root:
+        raise HTTPException(status_code=400, detail=f"Corpus directory {path!r} is outside the benchmark corpus root.")
+    if not os.path.isdir(resolved):
+        raise HTTPException(status_code=400, detail=f"Corpus directory {path!r} not found.")
+    return resolved
+
+def _format_accuracy(accuracy: Dict[str, Any]) -> str:
+    """Field exact-match rate for template runs, else 1 - CER; n/a without ground truth."""
+    if accuracy.get("field_accuracy") is not None:
+        return f"{accuracy['field_accuracy'] * 100:.1f}% fields"
+    if accuracy.get("cer") is not None:
+        return f"{max(0.0, 1 - accuracy['cer']) * 100:.1f}% chars"
+    return "n/a"
+
+def _format_row(run: Dict[str, Any], result: Dict[str, Any]) -> Dict[str, Any]:
+    """Flatten one model result into the row shape the benchmark page renders."""
+    warm_p50 = result["warm_latency"]["p50"]
+    best_throughput = max((t["images_per_sec"] or 0 for t in result["throughput"]), default=0)
+    memory_gb = result["memory_bytes"] / 1024**3 if result["memory_bytes"] else None
+    accuracy = result.get("accuracy") or {}  # Runs recorded before accuracy scoring have none
+    return {
+        "run_id": run["id"],
+        "model": result["model"],
+        "accuracy": _format_accuracy(accuracy),
+        "cer": accuracy.get("cer"),
+        "wer": accuracy.get("wer"),
+        "field_accuracy": accuracy.get("field_accuracy"),
+        "avg_latency": f"{warm_p50:.2f}s" if warm_p50 is not None else "n/a",
+        "throughput": f"{best_throughput * 60:.1f} img/min",
+        "memory_usage": f"{memory_gb:.1f}GB" if memory_gb else "n/a",
+        "details": result,
     }
-]
 
 @router.get("")
 async def get_benchmarks():
-    return BENCHMARKS
+    """Per-model rows from every stored run, newest first."""
+    return [
+        _format_row(run, result)
+        for run in benchmark_runner.list_runs()
+        for result in run["results"]
+    ]
+
+@router.get("/runs")
+async def list_benchmark_runs():
+    return [
+        {key: run[key] for key in ("id", "status", "started_at", "finished_at", "config", "error")}
+        for run in benchmark_runner.list_runs()
+    ]
+
+@router.get("/runs/{run_id}")
+async def get_benchmark_run(run_id: str):
+    run = benchmark_runner.get_run(run_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail=f"Benchmark run {run_id} not found")
+    return run
+
+@router.post("/runs", status_code=202)
+async def start_benchmark_run(request: BenchmarkRunRequest):
+    """Start a benchmark run in the background. Poll GET /benchmark/runs/{id} for progress."""
+    unknown = [step for step in request.preprocess_steps or [] if step not in STEPS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown preprocessing steps {unknown}. Expected any of {list(STEPS)}.")
+    allowed_hosts = settings.OLLAMA_HOSTS or [settings.OLLAMA_BASE_URL]
+    if request.ollama_host and request.ollama_host.rstrip("/") not in [host.rstrip("/") for host in allowed_hosts]:
+        raise HTTPException(status_code=400, detail=f"Ollama host {request.ollama_host!r} is not configured. Expected one of {allowed_hosts}.")
+
+    corpus_dirs = [_resolve_corpus_dir(path) for path in request.corpus_dirs or ["."]]
+    return benchmark_runner.start(**request.model_dump(exclude={"corpus_dirs"}), corpus_dirs=corpus_dirs)
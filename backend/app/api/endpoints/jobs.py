@@ -0,0 +1,52 @@
+import asyncio
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Query
+from app.models.manager import manager
+from app.api.endpoints.ocr import _resolve_model_name
+from app.core.config import settings
+from app.core.jobs import job_queue
+from app.utils.uploads import IMAGE_CONTENT_TYPES, save_upload
+
+router = APIRouter()
+
+@router.post("", status_code=202)
+async def submit_job(
+    file: UploadFile = File(...),
+    model_name: str = Form(None),
+    prompt: str = Form(None),
+    template: str = Form(None),
+    no_cache: bool = Form(False),
+    reasoning_model: str = Form(None),
+    keep_upload: bool = Form(False)
+):
+    """Queue an OCR job and return immediately. Poll GET /jobs/{id} (optionally with ?wait=N) for the result."""
+    if file.content_type not in IMAGE_CONTENT_TYPES:
+        raise HTTPException(status_code=400, detail="Invalid file type. Only JPEG, PNG, and WebP are supported.")
+
+    target_model = _resolve_model_name(model_name)
+    try:
+        await manager.get_model(target_model)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        file_path = await asyncio.to_thread(save_upload, file)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to save file: {str(e)}")
+
+    return await job_queue.submit(file_path, target_model, prompt, template, use_cache=not no_cache, filename=file.filename, reasoning_model=reasoning_model, keep_upload=keep_upload)
+
+@router.get("")
+async def list_jobs(status: str = None, limit: int = Query(50, ge=1, le=500)):
+    return await job_queue.list(status, limit)
+
+@router.get("/stats")
+async def get_job_stats():
+    return await job_queue.stats()
+
+@router.get("/{job_id}")
+async def get_job(job_id: str, wait: float = Query(0, ge=0)):
+    """Job status and result. With wait > 0, long-polls until the job finishes (capped at JOB_MAX_WAIT_SECONDS)."""
+    job = await job_queue.wait(job_id, min(wait, settings.JOB_MAX_WAIT_SECONDS))
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
@@ -1,6 +1,8 @@
 from fastapi import APIRouter, HTTPException
 from typing import List, Dict
 from app.models.manager import manager
+from app.core.circuit_breaker import circuit_breakers
+from app.core.admission import admission
 from pydantic import BaseModel
 
 router = APIRouter()
@@ -9,6 +11,7 @@ class ModelInfo(BaseModel):
     name: str
     provider: str
     active: bool
+    resident: bool = False
 
 class SetActiveModelRequest(BaseModel):
     name: str
@@ -17,6 +20,25 @@ class SetActiveModelRequest(BaseModel):
 async def list_models():
     return manager.list_models()
 
+@router.get("/residency")
+async def get_residency():
+    return manager.residency_stats()
+
+@router.get("/health")
+async def get_model_health():
+    """Circuit breaker state of every model that has been used for pass-2 mapping."""
+    return circuit_breakers.stats()
+
+@router.get("/admission")
+async def get_admission_stats():
+    """Per-model concurrency slots, queue depth by priority and queue wait times."""
+    return admission.stats()
+
+@router.get("/backends")
+async def get_backends():
+    """Ollama hosts behind the backend pool: health, in-flight requests and known models."""
+    return manager.pool.stats()
+
 @router.post("/active")
 async def set_active_model(request: SetActiveModelRequest):
     try:
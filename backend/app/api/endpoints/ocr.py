@@ -1,37 +1,38 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from typing import List, Optional, Tuple
+from app.models.base import ImageInput
 from app.models.manager import manager
 from app.core.config import settings
-from app.utils.image_processing import preprocess_image
-import shutil
+from app.core.metrics import IN_FLIGHT, observe_preprocess, observe_stage, record_request, request_mode, stage_timer, track_request
+from app.core.admission import AdmissionRejected, PRIORITIES, PRIORITY_BATCH, PRIORITY_INTERACTIVE, admission
+from app.core.cancellation import (
+    ClientDisconnected, DeadlineExceeded, cancel_on_disconnect, cancellation_counters, cancellation_stats,
+    deadline_scope, set_deadline,
+)
+from app.core.preprocessing import preprocessing_stage, PreprocessQueueFull
+from app.core.cache import result_cache, vision_text_cache
+from app.core.near_duplicates import near_duplicates
+from app.core.documents import ocr_page
+from app.core.singleflight import single_flight
+from app.core.storage import upload_storage
+from app.utils.documents import PDF_CONTENT_TYPES, DocumentError, is_pdf, render_pdf_pages
+from app.utils.preprocess_steps import parse_steps
+from app.utils.stats import latency_summary
+from app.utils.uploads import (
+    IMAGE_CONTENT_TYPES, IMAGE_EXTENSIONS, UploadTooLarge, copy_limited, new_upload_path, persist_upload_in_background, read_upload, save_upload,
+)
+import asyncio
+import json
 import os
-import uuid
 import time
+import zipfile
 
 router = APIRouter()
 
-@router.post("/process")
-async def process_ocr(
-    file: UploadFile = File(...),
-    model_name: str = Form(None),
-    prompt: str = Form(None),
-    template: str = Form(None)
-):
-    # Validate file type
-    if file.content_type not in ["image/jpeg", "image/png", "image/webp"]:
-        raise HTTPException(status_code=400, detail="Invalid file type. Only JPEG, PNG, and WebP are supported.")
+ZIP_CONTENT_TYPES = ["application/zip", "application/x-zip-compressed"]
 
-    # 1. Save file
-    file_ext = file.filename.split(".")[-1]
-    filename = f"{uuid.uuid4()}.{file_ext}"
-    file_path = os.path.join(settings.UPLOAD_DIR, filename)
-    
-    try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to save file: {str(e)}")
-        
-    # 2. Get Model
+def _resolve_model_name(model_name: str = None) -> str:
     target_model = model_name if model_name else manager._active_model_name
     if not target_model:
         # Default to first available if none active
@@ -40,29 +41,530 @@ async def process_ocr(
             target_model = available[0]["name"]
         else:
             raise HTTPException(status_code=500, detail="No models available")
-            
+    return target_model
+
+def _admission_error(e: AdmissionRejected) -> HTTPException:
+    return HTTPException(status_code=e.status_code, detail=e.detail, headers={"Retry-After": str(e.retry_after)})
+
+def _check_admission(target_model: str, priority: str) -> None:
+    """Reject up front, before the upload is saved or preprocessed, when the model's queue is full."""
+    if priority not in PRIORITIES:
+        raise HTTPException(status_code=400, detail=f"Invalid priority. Expected one of {list(PRIORITIES)}.")
     try:
-        model = await manager.get_model(target_model)
-        
-        # 3. Preprocess Image
-        processed_path = preprocess_image(file_path)
+        admission.check(target_model)
+    except AdmissionRejected as e:
+        raise _admission_error(e)
 
-        # 4. Process
-        start_time = time.time()
-        result = await model.process_image(processed_path, prompt, template)
-        end_time = time.time()
-        
-        # Add extra timing info
-        result.metadata["api_process_time"] = end_time - start_time
-        
-        return result
-        
+async def _receive_upload(file: UploadFile, keep_upload: bool) -> Tuple[ImageInput, Optional[str]]:
+    """
+    Take in an uploaded image. Returns (image, saved path to discard once served).
+    With IN_MEMORY_PIPELINE the image stays as bytes and nothing touches the disk on the request
+    path; PERSIST_UPLOADS (or keep_upload) keeps a copy in UPLOAD_DIR, written in the background.
+    """
+    if settings.IN_MEMORY_PIPELINE:
+        try:
+            data = await read_upload(file, settings.MAX_UPLOAD_BYTES)
+        except UploadTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        if settings.PERSIST_UPLOADS or keep_upload:
+            persist_upload_in_background(data, file.filename)
+        return data, None
+
+    try:
+        file_path = await asyncio.to_thread(save_upload, file)
     except Exception as e:
-        # Clean up file on error
-        if os.path.exists(file_path):
-            os.remove(file_path)
-        raise HTTPException(status_code=500, detail=str(e))
+        raise HTTPException(status_code=500, detail=f"Failed to save file: {str(e)}")
+    return file_path, file_path
+
+def _discard_processed(processed: ImageInput, keep_upload: bool) -> None:
+    # Preprocessing a saved upload writes a `_processed` file next to it
+    if isinstance(processed, str) and not keep_upload:
+        upload_storage.discard(processed)
+
+def _parse_steps(value: Optional[str]) -> Optional[List[str]]:
+    """Per-request preprocessing steps (comma-separated names); None keeps the model's chain."""
+    if value is None:
+        return None
+    try:
+        return parse_steps(value)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _perceptual_hash(preprocess_timings: dict, near_duplicate: bool) -> Optional[str]:
+    # Without a hash the manager skips the near-duplicate lookup (and doesn't index the result)
+    return preprocess_timings.get("perceptual_hash") if near_duplicate else None
+
+async def _process_upload(
+    image: ImageInput, target_model: str, prompt: str, template: str, use_cache: bool, reasoning_model: str, priority: str,
+    keep_upload: bool, near_duplicate: bool = True, steps: Optional[List[str]] = None,
+):
+    # Preprocess Image (off the event loop)
+    processed, preprocess_timings = await preprocessing_stage.run(image, target_model, steps)
+    observe_preprocess(preprocess_timings, target_model, request_mode(prompt, template))
+
+    # Process
+    start_time = time.time()
+    try:
+        result = await manager.process_image(
+            target_model, processed, prompt, template, use_cache=use_cache, reasoning_model=reasoning_model, priority=priority,
+            perceptual_hash=_perceptual_hash(preprocess_timings, near_duplicate),
+        )
     finally:
-        # Optional: Clean up file after successful processing if storage is not needed
-        # For now, we keep it for debugging or future reference
-        pass
+        _discard_processed(processed, keep_upload)
+    end_time = time.time()
+
+    # Add extra timing info
+    result.metadata["api_process_time"] = end_time - start_time
+    result.metadata.update(preprocess_timings)
+    return result
+
+@router.post("/process")
+async def process_ocr(
+    request: Request,
+    file: UploadFile = File(...),
+    model_name: str = Form(None),
+    prompt: str = Form(None),
+    template: str = Form(None),
+    no_cache: bool = Form(False),
+    reasoning_model: str = Form(None),
+    priority: str = Form(PRIORITY_INTERACTIVE),
+    keep_upload: bool = Form(False),
+    no_near_duplicate: bool = Form(False),
+    preprocess_steps: str = Form(None)
+):
+    # Validate file type
+    if file.content_type not in IMAGE_CONTENT_TYPES:
+        raise HTTPException(status_code=400, detail="Invalid file type. Only JPEG, PNG, and WebP are supported.")
+    steps = _parse_steps(preprocess_steps)
+
+    # Get Model and shed load before doing any work
+    target_model = _resolve_model_name(model_name)
+    mode = request_mode(prompt, template)
+    with track_request("process", target_model, mode):
+        _check_admission(target_model, priority)
+        try:
+            await manager.get_model(target_model) # Fail fast on unknown models before doing any work
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        # 1. Receive file (in memory, or saved to UPLOAD_DIR)
+        with stage_timer("upload_save", target_model, mode):
+            image, file_path = await _receive_upload(file, keep_upload)
+
+        try:
+            # 3. Preprocess + process within the request deadline.
+            # If the client goes away the work is cancelled, which aborts the Ollama generation under it.
+            with deadline_scope(settings.REQUEST_DEADLINE_SECONDS):
+                return await cancel_on_disconnect(
+                    request,
+                    _process_upload(image, target_model, prompt, template, not no_cache, reasoning_model, priority, keep_upload, not no_near_duplicate, steps),
+                )
+        
+        except ClientDisconnected as e:
+            # Nobody is listening; 499 (client closed request) is only for the access log
+            raise HTTPException(status_code=499, detail=str(e))
+        except DeadlineExceeded as e:
+            raise HTTPException(status_code=504, detail=str(e))
+        except PreprocessQueueFull as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        except AdmissionRejected as e:
+            raise _admission_error(e)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        finally:
+            # Uploads are only kept (subject to retention) when the request asks for it
+            if not keep_upload:
+                upload_storage.discard(file_path)
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@router.post("/process/stream")
+async def process_ocr_stream(
+    file: UploadFile = File(...),
+    model_name: str = Form(None),
+    prompt: str = Form(None),
+    template: str = Form(None),
+    no_cache: bool = Form(False),
+    reasoning_model: str = Form(None),
+    priority: str = Form(PRIORITY_INTERACTIVE),
+    keep_upload: bool = Form(False),
+    no_near_duplicate: bool = Form(False),
+    preprocess_steps: str = Form(None)
+):
+    """
+    Streaming variant of /process using Server-Sent Events.
+
+    Events: "pass" (a generation pass starts), "token" (generated text chunk), then a final
+    "result" with the OCRResult (including time_to_first_token), or "error".
+    In template mode pass 1 streams the vision text and pass 2 the JSON.
+    """
+    if file.content_type not in IMAGE_CONTENT_TYPES:
+        raise HTTPException(status_code=400, detail="Invalid file type. Only JPEG, PNG, and WebP are supported.")
+    steps = _parse_steps(preprocess_steps)
+
+    target_model = _resolve_model_name(model_name)
+    try:
+        await manager.get_model(target_model)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    mode = request_mode(prompt, template)
+    try:
+        _check_admission(target_model, priority)
+
+        with stage_timer("upload_save", target_model, mode):
+            image, file_path = await _receive_upload(file, keep_upload)
+
+        preprocessed = False
+        try:
+            processed, preprocess_timings = await preprocessing_stage.run(image, target_model, steps)
+            preprocessed = True
+        except PreprocessQueueFull as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        finally:
+            # Once preprocessed, event_stream owns the upload and discards it when done
+            if not preprocessed and not keep_upload:
+                upload_storage.discard(file_path)
+    except HTTPException as e:
+        # Rejected before streaming started; once it has, event_stream records the outcome
+        record_request("process_stream", target_model, mode, str(e.status_code), type(e.__context__ or e).__name__)
+        raise
+    observe_preprocess(preprocess_timings, target_model, mode)
+
+    async def event_stream():
+        # Runs in the response's own task; Starlette cancels it when the client disconnects
+        set_deadline(settings.REQUEST_DEADLINE_SECONDS)
+        start_time = time.time()
+        time_to_first_token = None
+        # Errors are reported in-stream, so the outcome is recorded here rather than by track_request
+        status, error = "200", None
+        try:
+            with IN_FLIGHT.labels(endpoint="process_stream").track_inprogress():
+                async for event in manager.process_image_stream(
+                    target_model, processed, prompt, template, use_cache=not no_cache, reasoning_model=reasoning_model, priority=priority,
+                    perceptual_hash=_perceptual_hash(preprocess_timings, not no_near_duplicate),
+                ):
+                    if event["event"] == "token" and time_to_first_token is None:
+                        time_to_first_token = time.time() - start_time
+                    if event["event"] == "result":
+                        result = event["data"]
+                        result.metadata["api_process_time"] = time.time() - start_time
+                        result.metadata["time_to_first_token"] = time_to_first_token
+                        result.metadata.update(preprocess_timings)
+                        observe_stage("total", target_model, mode, result.metadata["api_process_time"])
+                        yield _sse("result", result.model_dump())
+                    else:
+                        yield _sse(event["event"], event["data"])
+        except AdmissionRejected as e:
+            status, error = str(e.status_code), type(e).__name__
+            yield _sse("error", {"detail": e.detail, "status_code": e.status_code, "retry_after": e.retry_after})
+        except DeadlineExceeded as e:
+            status, error = "504", type(e).__name__
+            yield _sse("error", {"detail": str(e), "status_code": 504})
+        except asyncio.CancelledError as e:
+            status, error = "499", type(e).__name__
+            cancellation_counters["client_disconnects"] += 1
+            raise
+        except Exception as e:
+            status, error = "500", type(e).__name__
+            yield _sse("error", {"detail": str(e)})
+        finally:
+            record_request("process_stream", target_model, mode, status, error)
+            if not keep_upload:
+                upload_storage.discard(file_path)
+            _discard_processed(processed, keep_upload)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        # Stop nginx-style proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def _extract_zip(file: UploadFile, max_files: int, max_total_bytes: int) -> List[Tuple[str, str]]:
+    """
+    Extract the images of an uploaded zip into UPLOAD_DIR. Returns (original name, saved path) pairs.
+    Limits are checked against the archive's directory before anything is written, and each entry is
+    copied with a byte cap since the sizes in the directory can lie (zip bombs).
+    Raises UploadTooLarge past `max_files` images, MAX_UPLOAD_BYTES per image or `max_total_bytes` in all.
+    """
+    with zipfile.ZipFile(file.file) as archive:
+        entries = [
+            info for info in archive.infolist()
+            if not info.is_dir() and info.filename.lower().endswith(IMAGE_EXTENSIONS)
+        ]
+        if len(entries) > max_files:
+            raise UploadTooLarge(f"Too many images in batch (more than {settings.BATCH_MAX_FILES})")
+        oversized = next((info for info in entries if info.file_size > settings.MAX_UPLOAD_BYTES), None)
+        if oversized is not None:
+            raise UploadTooLarge(f"{oversized.filename} exceeds the {settings.MAX_UPLOAD_BYTES} byte limit")
+        if sum(info.file_size for info in entries) > max_total_bytes:
+            raise UploadTooLarge(f"Batch exceeds the {settings.BATCH_MAX_TOTAL_BYTES} byte limit")
+
+        items = []
+        try:
+            for info in entries:
+                file_path = new_upload_path(info.filename)
+                items.append((info.filename, file_path))
+                with archive.open(info) as src, open(file_path, "wb") as dst:
+                    max_total_bytes -= copy_limited(src, dst, min(settings.MAX_UPLOAD_BYTES, max_total_bytes))
+        except BaseException:
+            upload_storage.discard(*(path for _, path in items))
+            raise
+    return items
+
+async def _collect_batch_items(files: List[UploadFile]) -> List[Tuple[str, str]]:
+    items = []
+    total_bytes = 0
+    try:
+        for file in files:
+            is_zip = file.content_type in ZIP_CONTENT_TYPES or file.filename.lower().endswith(".zip")
+            if is_zip:
+                try:
+                    extracted = await asyncio.to_thread(
+                        _extract_zip, file, settings.BATCH_MAX_FILES - len(items), settings.BATCH_MAX_TOTAL_BYTES - total_bytes,
+                    )
+                except zipfile.BadZipFile:
+                    raise HTTPException(status_code=400, detail=f"Invalid zip archive: {file.filename}")
+                items.extend(extracted)
+                total_bytes += sum(os.path.getsize(path) for _, path in extracted)
+            elif file.content_type in IMAGE_CONTENT_TYPES:
+                items.append((file.filename, await asyncio.to_thread(save_upload, file)))
+                total_bytes += os.path.getsize(items[-1][1])
+            else:
+                raise HTTPException(status_code=400, detail=f"Invalid file type for {file.filename}. Only JPEG, PNG, WebP and zip archives are supported.")
+            if total_bytes > settings.BATCH_MAX_TOTAL_BYTES:
+                raise UploadTooLarge(f"Batch exceeds the {settings.BATCH_MAX_TOTAL_BYTES} byte limit")
+    except UploadTooLarge as e:
+        upload_storage.discard(*(path for _, path in items))
+        raise HTTPException(status_code=413, detail=str(e))
+    except HTTPException:
+        upload_storage.discard(*(path for _, path in items))
+        raise
+    return items
+
+@router.post("/batch")
+async def process_batch(
+    files: List[UploadFile] = File(...),
+    model_name: str = Form(None),
+    prompt: str = Form(None),
+    template: str = Form(None),
+    no_cache: bool = Form(False),
+    reasoning_model: str = Form(None),
+    keep_upload: bool = Form(False),
+    no_near_duplicate: bool = Form(False),
+    preprocess_steps: str = Form(None)
+):
+    """
+    OCR many images (or zip archives of images) with a shared model/prompt/template.
+
+    Streams NDJSON: one {"type": "item"} line per image in completion order, then a
+    {"type": "summary"} line with throughput and latency percentiles.
+    Per-item failures are reported inline and never abort the batch.
+    Items are admitted at batch priority, so interactive requests go ahead of them.
+    """
+    steps = _parse_steps(preprocess_steps)
+    target_model = _resolve_model_name(model_name)
+    try:
+        await manager.get_model(target_model)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Save everything before streaming; upload handles are not usable once the response starts
+    items = await _collect_batch_items(files)
+    if not items:
+        raise HTTPException(status_code=400, detail="No images found in the upload")
+    if len(items) > settings.BATCH_MAX_FILES:
+        upload_storage.discard(*(path for _, path in items))
+        raise HTTPException(status_code=413, detail=f"Too many images in batch ({len(items)} > {settings.BATCH_MAX_FILES})")
+
+    in_flight = asyncio.Semaphore(settings.BATCH_MAX_IN_FLIGHT)
+    mode = request_mode(prompt, template)
+
+    async def process_item(index: int, filename: str, file_path: str) -> dict:
+        processed_path = None
+        try:
+            # Each item gets its own deadline, counted from when it starts
+            async with in_flight:
+                set_deadline(settings.REQUEST_DEADLINE_SECONDS)
+                start_time = time.time()
+                try:
+                    with IN_FLIGHT.labels(endpoint="batch").track_inprogress():
+                        processed_path, preprocess_timings = await preprocessing_stage.run(file_path, target_model, steps)
+                        observe_preprocess(preprocess_timings, target_model, mode)
+                        result = await manager.process_image(
+                            target_model, processed_path, prompt, template, use_cache=not no_cache, reasoning_model=reasoning_model, priority=PRIORITY_BATCH,
+                            perceptual_hash=_perceptual_hash(preprocess_timings, not no_near_duplicate),
+                        )
+                    result.metadata.update(preprocess_timings)
+                    latency = time.time() - start_time
+                    result.metadata["api_process_time"] = latency
+                    observe_stage("total", target_model, mode, latency)
+                    record_request("batch", target_model, mode, "200")
+                    return {"type": "item", "index": index, "filename": filename, "status": "ok", "latency": latency, "result": result.model_dump()}
+                except Exception as e:
+                    record_request("batch", target_model, mode, "500", type(e).__name__)
+                    return {"type": "item", "index": index, "filename": filename, "status": "error", "latency": time.time() - start_time, "error": str(e)}
+        finally:
+            # Also runs for items cancelled before they started
+            if not keep_upload:
+                upload_storage.discard(file_path, processed_path)
+
+    async def stream():
+        batch_start = time.time()
+        tasks = [asyncio.create_task(process_item(i, name, path)) for i, (name, path) in enumerate(items)]
+        latencies = []
+        failed = 0
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                item = await next_done
+                if item["status"] == "ok":
+                    latencies.append(item["latency"])
+                else:
+                    failed += 1
+                yield json.dumps(item) + "\n"
+        finally:
+            # Client went away mid-stream: don't keep burning GPU time on the rest
+            pending = [task for task in tasks if not task.done()]
+            if pending:
+                cancellation_counters["client_disconnects"] += 1
+            for task in pending:
+                task.cancel()
+
+        elapsed = time.time() - batch_start
+        summary = {
+            "type": "summary",
+            "model": target_model,
+            "total": len(items),
+            "succeeded": len(items) - failed,
+            "failed": failed,
+            "elapsed": elapsed,
+            "throughput_images_per_sec": len(items) / elapsed if elapsed > 0 else None,
+            **latency_summary(latencies),
+        }
+        yield json.dumps(summary) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+@router.post("/document")
+async def process_document(
+    file: UploadFile = File(...),
+    model_name: str = Form(None),
+    prompt: str = Form(None),
+    no_cache: bool = Form(False),
+    priority: str = Form(PRIORITY_INTERACTIVE),
+    keep_upload: bool = Form(False)
+):
+    """
+    OCR a multi-page PDF or a large single-page scan.
+
+    PDFs are rendered page by page. Pages too large for the model are split into overlapping
+    tiles, OCR'd concurrently and stitched back in reading order with the overlap de-duplicated.
+    Streams NDJSON: one {"type": "page"} line per page in completion order, then a
+    {"type": "document"} line with the text of all pages in page order.
+    Per-page failures are reported inline and never abort the document.
+    """
+    if file.content_type not in IMAGE_CONTENT_TYPES + PDF_CONTENT_TYPES:
+        raise HTTPException(status_code=400, detail="Invalid file type. Only PDF, JPEG, PNG, and WebP are supported.")
+
+    target_model = _resolve_model_name(model_name)
+    try:
+        await manager.get_model(target_model)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    _check_admission(target_model, priority)
+
+    try:
+        data = await read_upload(file, settings.MAX_UPLOAD_BYTES)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    if keep_upload:
+        persist_upload_in_background(data, file.filename)
+    if is_pdf(data):
+        try:
+            pages = await asyncio.to_thread(render_pdf_pages, data, settings.DOCUMENT_PDF_DPI, settings.DOCUMENT_MAX_PAGES)
+        except DocumentError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    else:
+        pages = [data]
+    del data
+
+    tiles_in_flight = asyncio.Semaphore(settings.DOCUMENT_MAX_IN_FLIGHT)
+    mode = request_mode(prompt, None)
+
+    async def process_page(index: int, page: bytes) -> dict:
+        # Each page gets its own deadline, counted from when the document starts
+        set_deadline(settings.REQUEST_DEADLINE_SECONDS)
+        start_time = time.time()
+        try:
+            with IN_FLIGHT.labels(endpoint="document").track_inprogress():
+                result = await ocr_page(page, target_model, tiles_in_flight, prompt, use_cache=not no_cache, priority=priority)
+            latency = time.time() - start_time
+            observe_stage("total", target_model, mode, latency)
+            record_request("document", target_model, mode, "200")
+            return {"type": "page", "page": index + 1, "status": "ok", "latency": latency, **result}
+        except Exception as e:
+            record_request("document", target_model, mode, "500", type(e).__name__)
+            return {"type": "page", "page": index + 1, "status": "error", "latency": time.time() - start_time, "error": str(e)}
+
+    async def stream():
+        document_start = time.time()
+        tasks = [asyncio.create_task(process_page(i, page)) for i, page in enumerate(pages)]
+        texts = [""] * len(pages)
+        failed = 0
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                item = await next_done
+                if item["status"] == "ok":
+                    texts[item["page"] - 1] = item["text"]
+                else:
+                    failed += 1
+                yield json.dumps(item) + "\n"
+        finally:
+            # Client went away mid-stream: don't keep burning GPU time on the rest
+            pending = [task for task in tasks if not task.done()]
+            if pending:
+                cancellation_counters["client_disconnects"] += 1
+            for task in pending:
+                task.cancel()
+
+        summary = {
+            "type": "document",
+            "model": target_model,
+            "pages": len(pages),
+            "succeeded": len(pages) - failed,
+            "failed": failed,
+            "elapsed": time.time() - document_start,
+            "text": "\n\n".join(texts),
+        }
+        yield json.dumps(summary) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+@router.get("/cancellations")
+async def get_cancellation_stats():
+    """Work cancelled because the client disconnected or the request deadline passed."""
+    return cancellation_stats()
+
+@router.get("/storage")
+async def get_storage_stats():
+    """UPLOAD_DIR usage as of the last retention sweep, and what retention has removed so far."""
+    return upload_storage.stats()
+
+@router.get("/cache")
+async def get_cache_stats():
+    return {
+        **result_cache.stats(),
+        "vision_text": vision_text_cache.stats(),
+        "near_duplicates": near_duplicates.stats(),
+        "single_flight": single_flight.stats(),
+    }
+
+@router.delete("/cache")
+async def clear_cache():
+    await result_cache.clear()
+    vision_text_cache.clear()
+    near_duplicates.clear()
+    return {"message": "OCR result cache cleared"}
@@ -0,0 +1,194 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, List, Tuple
+
+from app.core.cancellation import deadline_exceeded, remaining
+from app.core.config import settings
+from app.core.metrics import GENERATIONS_IN_FLIGHT
+from app.utils.stats import percentile
+
+logger = logging.getLogger(__name__)
+
+# Priority classes; lower value is served first
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_BATCH = "batch"
+PRIORITIES = {PRIORITY_INTERACTIVE: 0, PRIORITY_BATCH: 1}
+
+
+class AdmissionRejected(Exception):
+    """A request was turned away: 429 when the wait queue is full, 503 when it waited too long."""
+
+    def __init__(self, model_name: str, status_code: int, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.model_name = model_name
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class ModelGate:
+    """
+    Concurrency slots of one model with a bounded priority wait queue.
+    A released slot is handed directly to the highest-priority (then oldest) waiter.
+    """
+
+    def __init__(self, model_name: str, limit: int, max_queue: int):
+        self.model_name = model_name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._queued = {name: 0 for name in PRIORITIES}
+        self._waits: Deque[float] = deque(maxlen=1000)
+        self._service_time = None  # EMA of slot hold time, for Retry-After estimates
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+
+    @property
+    def queued(self) -> int:
+        return sum(self._queued.values())
+
+    def retry_after(self) -> int:
+        """Rough seconds until a new request would get a slot."""
+        service_time = self._service_time or 5.0
+        return max(1, math.ceil(service_time * (self.queued + 1) / max(self.limit, 1)))
+
+    def check(self) -> None:
+        """Fail fast, before any work is done for a request that would be rejected anyway."""
+        if self.in_flight >= self.limit and self.queued >= self.max_queue:
+            self.rejected_queue_full += 1
+            raise AdmissionRejected(
+                self.model_name, 429,
+                f"Too many requests queued for {self.model_name} ({self.queued}/{self.max_queue})",
+                self.retry_after(),
+            )
+
+    async def acquire(self, priority: str, timeout: float, deadline_bound: bool = False) -> float:
+        """
+        Wait for a slot. Returns the time spent waiting.
+        `deadline_bound` means the timeout is what is left of the request deadline, so running out
+        of it raises DeadlineExceeded (retrying won't help) instead of AdmissionRejected.
+        """
+        if self.in_flight < self.limit and not self._waiters:
+            self.in_flight += 1
+            self._record_admit(0.0)
+            return 0.0
+
+        self.check()
+        start = time.perf_counter()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (PRIORITIES[priority], next(self._seq), future))
+        self._queued[priority] += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=timeout or None)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as we gave up: pass it on
+                self.release()
+            else:
+                future.cancel()
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            if deadline_bound:
+                raise deadline_exceeded(f"the queue wait for {self.model_name}")
+            self.rejected_timeout += 1
+            raise AdmissionRejected(
+                self.model_name, 503,
+                f"Timed out after {timeout}s waiting for {self.model_name}",
+                self.retry_after(),
+            )
+        finally:
+            self._queued[priority] -= 1
+
+        waited = time.perf_counter() - start
+        self._record_admit(waited)
+        return waited
+
+    def release(self) -> None:
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                # The slot moves to the waiter; in_flight stays the same
+                future.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def record_service_time(self, seconds: float) -> None:
+        self._service_time = seconds if self._service_time is None else 0.8 * self._service_time + 0.2 * seconds
+
+    def _record_admit(self, waited: float) -> None:
+        self.admitted += 1
+        self._waits.append(waited)
+
+    def stats(self) -> Dict[str, Any]:
+        waits = list(self._waits)
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "queued": dict(self._queued),
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+            "wait_p50": percentile(waits, 50),
+            "wait_p95": percentile(waits, 95),
+            "wait_max": max(waits) if waits else None,
+            "service_time_avg": self._service_time,
+        }
+
+
+class AdmissionController:
+    """Per-model admission in front of ModelManager's generations."""
+
+    def __init__(self):
+        self._gates: Dict[str, ModelGate] = {}
+
+    def gate(self, model_name: str) -> ModelGate:
+        if model_name not in self._gates:
+            self._gates[model_name] = ModelGate(
+                model_name,
+                limit=settings.MODEL_MAX_CONCURRENCY_OVERRIDES.get(model_name, settings.MODEL_MAX_CONCURRENCY),
+                max_queue=settings.ADMISSION_MAX_QUEUE,
+            )
+        return self._gates[model_name]
+
+    def check(self, model_name: str) -> None:
+        self.gate(model_name).check()
+
+    @asynccontextmanager
+    async def slot(self, model_name: str, priority: str = PRIORITY_INTERACTIVE) -> AsyncIterator[float]:
+        """Hold one of the model's concurrency slots; yields the queue wait time."""
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority {priority!r}, expected one of {list(PRIORITIES)}")
+        timeout = (
+            settings.ADMISSION_BATCH_QUEUE_TIMEOUT_SECONDS if priority == PRIORITY_BATCH
+            else settings.ADMISSION_QUEUE_TIMEOUT_SECONDS
+        )
+        # Never queue past the request deadline
+        left = remaining()
+        deadline_bound = left is not None and (not timeout or left < timeout)
+        if deadline_bound:
+            timeout = max(left, 0.001)
+        gate = self.gate(model_name)
+        waited = await gate.acquire(priority, timeout, deadline_bound)
+        start = time.perf_counter()
+        try:
+            with GENERATIONS_IN_FLIGHT.labels(model=model_name).track_inprogress():
+                yield waited
+        finally:
+            gate.record_service_time(time.perf_counter() - start)
+            gate.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {name: gate.stats() for name, gate in self._gates.items()}
+
+
+admission = AdmissionController()
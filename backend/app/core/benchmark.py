@@ -0,0 +1,304 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Sequence
+
+from app.core.config import settings
+from app.core.preprocessing import preprocessing_stage
+from app.models.manager import ModelManager, manager
+from app.utils.evaluation import score_sample, summarize_scores
+from app.utils.preprocess_steps import parse_steps
+from app.utils.stats import percentile
+from app.utils.uploads import IMAGE_EXTENSIONS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CORPUS_DIR = settings.BENCHMARK_CORPUS_DIR
+
+
+def load_corpus(directories: Sequence[str]) -> List[Dict[str, Any]]:
+    """
+    Collect benchmark images from the given directories.
+
+    Ground truth is optional and read from a sidecar next to each image:
+    `<name>.txt` for plain text or `<name>.json` for template output.
+    """
+    corpus = []
+    for directory in directories:
+        for filename in sorted(os.listdir(directory)):
+            stem, ext = os.path.splitext(filename)
+            if ext.lower() not in IMAGE_EXTENSIONS or stem.endswith("_processed"):
+                continue
+
+            ground_truth = None
+            for sidecar in (f"{stem}.txt", f"{stem}.json"):
+                sidecar_path = os.path.join(directory, sidecar)
+                if os.path.exists(sidecar_path):
+                    with open(sidecar_path, "r", encoding="utf-8") as f:
+                        ground_truth = f.read()
+                    break
+
+            corpus.append({"name": filename, "path": os.path.join(directory, filename), "ground_truth": ground_truth})
+    return corpus
+
+
+def _summarize(values: List[float]) -> Dict[str, Optional[float]]:
+    return {
+        "mean": sum(values) / len(values) if values else None,
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+    }
+
+
+class BenchmarkRunner:
+    """
+    Replays an image corpus through registered models and persists one JSON report per run.
+    The result cache is bypassed so every request measures real preprocessing + inference.
+    Images with a ground truth sidecar are scored for accuracy on the first warm pass.
+    """
+
+    def __init__(self, results_dir: str):
+        self.results_dir = results_dir
+        os.makedirs(results_dir, exist_ok=True)
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def _run_path(self, run_id: str) -> str:
+        return os.path.join(self.results_dir, f"{run_id}.json")
+
+    def _save(self, run: Dict[str, Any]) -> None:
+        tmp_path = f"{self._run_path(run['id'])}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(run, f, indent=2)
+        os.replace(tmp_path, self._run_path(run["id"]))
+
+    def list_runs(self) -> List[Dict[str, Any]]:
+        runs = []
+        for filename in os.listdir(self.results_dir):
+            if filename.endswith(".json"):
+                with open(os.path.join(self.results_dir, filename), "r", encoding="utf-8") as f:
+                    runs.append(json.load(f))
+        return sorted(runs, key=lambda run: run["started_at"], reverse=True)
+
+    def get_run(self, run_id: str) -> Optional[Dict[str, Any]]:
+        path = self._run_path(run_id)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def start(self, **kwargs) -> Dict[str, Any]:
+        """Start a run in the background and return its initial record."""
+        run = self._new_run(**kwargs)
+        self._tasks[run["id"]] = asyncio.create_task(self._execute(run, **kwargs))
+        self._tasks[run["id"]].add_done_callback(lambda _: self._tasks.pop(run["id"], None))
+        return run
+
+    async def run(self, **kwargs) -> Dict[str, Any]:
+        """Run a benchmark to completion (used by the CLI)."""
+        run = self._new_run(**kwargs)
+        return await self._execute(run, **kwargs)
+
+    def _new_run(
+        self,
+        models: Optional[List[str]] = None,
+        corpus_dirs: Optional[List[str]] = None,
+        concurrency_levels: Sequence[int] = (1, 2, 4),
+        warm_passes: int = 1,
+        prompt: Optional[str] = None,
+        template: Optional[str] = None,
+        preprocess_steps: Optional[List[str]] = None,
+        ollama_host: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        run = {
+            "id": time.strftime("%Y%m%d-%H%M%S") + "-" + uuid.uuid4().hex[:6],
+            "status": "running",
+            "started_at": time.time(),
+            "finished_at": None,
+            "config": {
+                "models": models,
+                "corpus_dirs": corpus_dirs or [DEFAULT_CORPUS_DIR],
+                "concurrency_levels": list(concurrency_levels),
+                "warm_passes": warm_passes,
+                "prompt": prompt,
+                "template": template,
+                "preprocess_steps": preprocess_steps,  # None: each model's configured chain
+                "ollama_host": ollama_host or settings.OLLAMA_BASE_URL,
+                "model_max_concurrency": settings.MODEL_MAX_CONCURRENCY,
+            },
+            "results": [],
+            "error": None,
+        }
+        self._save(run)
+        return run
+
+    async def _execute(self, run: Dict[str, Any], ollama_host: Optional[str] = None, **_) -> Dict[str, Any]:
+        config = run["config"]
+        # A dedicated manager lets a run target a stub/other Ollama host without touching the live one
+        mgr = ModelManager(ollama_host=ollama_host) if ollama_host else manager
+        model_names = config["models"] or [m["name"] for m in mgr.list_models()]
+
+        try:
+            corpus = load_corpus(config["corpus_dirs"])
+            if not corpus:
+                raise ValueError(f"No images found in {config['corpus_dirs']}")
+
+            # Work on copies: preprocessing writes `_processed` files next to its input
+            with tempfile.TemporaryDirectory(prefix="ocr-bench-") as workdir:
+                for item in corpus:
+                    item["work_path"] = os.path.join(workdir, item["name"])
+                    shutil.copy(item["path"], item["work_path"])
+
+                for model_name in model_names:
+                    logger.info(f"Benchmark {run['id']}: running {len(corpus)} images through {model_name}")
+                    run["results"].append(await self._benchmark_model(mgr, model_name, corpus, config))
+                    self._save(run)
+
+            run["status"] = "completed"
+        except Exception as e:
+            logger.error(f"Benchmark {run['id']} failed: {e}", exc_info=True)
+            run["status"] = "failed"
+            run["error"] = str(e)
+
+        run["finished_at"] = time.time()
+        self._save(run)
+        return run
+
+    async def _timed_request(self, mgr: ModelManager, model_name: str, item: Dict[str, Any], config: Dict[str, Any]) -> Dict[str, Any]:
+        start = time.perf_counter()
+        try:
+            processed_path, timings = await preprocessing_stage.run(item["work_path"], model_name, steps=config["preprocess_steps"])
+            result = await mgr.process_image(model_name, processed_path, config["prompt"], config["template"], use_cache=False)
+        except Exception as e:
+            return {"name": item["name"], "ok": False, "error": str(e), "latency": time.perf_counter() - start}
+
+        metadata = result.metadata
+        tokens_per_sec = None
+        if metadata.get("eval_count") and metadata.get("eval_duration"):
+            tokens_per_sec = metadata["eval_count"] / (metadata["eval_duration"] / 1e9)
+        return {
+            "name": item["name"],
+            "ok": True,
+            "text": result.text,
+            "latency": time.perf_counter() - start,
+            "preprocess_time": timings["preprocess_time"],
+            "load_duration": (metadata.get("load_duration") or 0) / 1e9,
+            "tokens_per_sec": tokens_per_sec,
+        }
+
+    async def _benchmark_model(self, mgr: ModelManager, model_name: str, corpus: List[Dict[str, Any]], config: Dict[str, Any]) -> Dict[str, Any]:
+        errors: List[str] = []
+
+        # Cold: force the model out of memory, then time the load and the first request. The request
+        # path loads the model itself before generating, so the load is timed here rather than read
+        # from the response's load_duration (which is ~0 by then).
+        await mgr.evict(model_name)
+        load_start = time.perf_counter()
+        await mgr.ensure_resident(model_name)
+        load_duration = time.perf_counter() - load_start
+        cold = await self._timed_request(mgr, model_name, corpus[0], config)
+        if not cold["ok"]:
+            errors.append(cold["error"])
+
+        # Warm: sequential passes over the corpus
+        warm = []
+        scores = []
+        for warm_pass in range(config["warm_passes"]):
+            for item in corpus:
+                sample = await self._timed_request(mgr, model_name, item, config)
+                if sample["ok"]:
+                    warm.append(sample)
+                    if warm_pass == 0 and item["ground_truth"] is not None:
+                        scores.append({"name": item["name"], **score_sample(sample["text"], item["ground_truth"])})
+                else:
+                    errors.append(sample["error"])
+
+        # Throughput: at least two requests per slot at each concurrency level
+        throughput = []
+        for level in config["concurrency_levels"]:
+            items = [corpus[i % len(corpus)] for i in range(max(len(corpus), level * 2))]
+            semaphore = asyncio.Semaphore(level)
+
+            async def bounded(item):
+                async with semaphore:
+                    return await self._timed_request(mgr, model_name, item, config)
+
+            start = time.perf_counter()
+            samples = await asyncio.gather(*(bounded(item) for item in items))
+            elapsed = time.perf_counter() - start
+            failed = sum(1 for sample in samples if not sample["ok"])
+            throughput.append({
+                "concurrency": level,
+                "requests": len(items),
+                "errors": failed,
+                "elapsed": elapsed,
+                "images_per_sec": (len(items) - failed) / elapsed if elapsed > 0 else None,
+            })
+
+        model = await mgr.get_model(model_name)
+        return {
+            "model": model_name,
+            "images": len(corpus),
+            "cold": {
+                "latency": load_duration + cold["latency"] if cold["ok"] else None,
+                "load_duration": load_duration + (cold.get("load_duration") or 0),
+            },
+            "warm_latency": _summarize([s["latency"] for s in warm]),
+            "preprocess_time": _summarize([s["preprocess_time"] for s in warm]),
+            "tokens_per_sec": _summarize([s["tokens_per_sec"] for s in warm if s["tokens_per_sec"]]),
+            "throughput": throughput,
+            "accuracy": {**summarize_scores(scores), "samples": scores},
+            "memory_bytes": model.memory_bytes,
+            "errors": len(errors),
+            "error_samples": errors[:5],
+        }
+
+
+benchmark_runner = BenchmarkRunner(results_dir=settings.BENCHMARK_DIR)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Replay an image corpus through the registered OCR models.")
+    parser.add_argument("--corpus", action="append", help="Image directory (repeatable). Defaults to sample-images.")
+    parser.add_argument("--model", action="append", help="Model to benchmark (repeatable). Defaults to all registered.")
+    parser.add_argument("--host", help="Ollama host to run against, e.g. a local stub server.")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--warm-passes", type=int, default=1)
+    parser.add_argument("--prompt")
+    parser.add_argument("--template", help="Path to a JSON template file.")
+    parser.add_argument("--preprocess-steps", help="Comma-separated preprocessing steps. Defaults to each model's chain.")
+    args = parser.parse_args()
+
+    template = None
+    if args.template:
+        with open(args.template, "r", encoding="utf-8") as f:
+            template = f.read()
+
+    async def _run():
+        try:
+            return await benchmark_runner.run(
+                models=args.model,
+                corpus_dirs=args.corpus,
+                concurrency_levels=args.concurrency,
+                warm_passes=args.warm_passes,
+                prompt=args.prompt,
+                template=template,
+                preprocess_steps=parse_steps(args.preprocess_steps) if args.preprocess_steps else None,
+                ollama_host=args.host,
+            )
+        finally:
+            preprocessing_stage.shutdown()
+
+    run = asyncio.run(_run())
+    print(json.dumps(run, indent=2))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,223 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.models.base import OCRResult
+from app.utils.templates import minify_template
+
+logger = logging.getLogger(__name__)
+
+
+def request_scope(
+    model_name: str,
+    prompt: Optional[str],
+    template: Optional[str],
+    options: Optional[Dict[str, Any]] = None,
+) -> str:
+    """Every generation input of an OCR request except the image, as a canonical string."""
+    return json.dumps(
+        {
+            "model": model_name,
+            "prompt": prompt or "",
+            "template": minify_template(template) if template else "",
+            "options": options or {},
+        },
+        sort_keys=True,
+        default=str,
+    )
+
+
+def make_cache_key(
+    image_bytes: bytes,
+    model_name: str,
+    prompt: Optional[str],
+    template: Optional[str],
+    options: Optional[Dict[str, Any]] = None,
+) -> str:
+    """
+    Content-addressed key for an OCR request.
+    Two requests share a key only if the preprocessed image bytes and every generation input match.
+    """
+    h = hashlib.sha256()
+    h.update(hashlib.sha256(image_bytes).digest())
+    h.update(request_scope(model_name, prompt, template, options).encode("utf-8"))
+    return h.hexdigest()
+
+
+class LRUCache:
+    """In-memory LRU with a max entry count and a per-entry TTL."""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self.evictions = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        stored_at, value = item
+        if self.ttl_seconds and time.time() - stored_at > self.ttl_seconds:
+            del self._data[key]
+            self.evictions += 1
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any, stored_at: Optional[float] = None) -> None:
+        self._data[key] = (stored_at or time.time(), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._data), "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+class DiskCache:
+    """
+    JSON-file cache tier that survives restarts.
+    Files are sharded by the first two hex chars of the key to keep directories small.
+    """
+
+    def __init__(self, directory: str, ttl_seconds: float):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> Optional[Tuple[float, Dict[str, Any]]]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Dropping unreadable cache entry {path}: {e}")
+            self._remove(path)
+            return None
+
+        if self.ttl_seconds and time.time() - entry["stored_at"] > self.ttl_seconds:
+            self._remove(path)
+            return None
+        return entry["stored_at"], entry["result"]
+
+    def set(self, key: str, value: Dict[str, Any], stored_at: float) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename so a crash never leaves a half-written entry behind
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"stored_at": stored_at, "result": value}, f)
+        os.replace(tmp_path, path)
+
+    def clear(self) -> None:
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                self._remove(os.path.join(root, name))
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class ResultCache:
+    """
+    Two-tier OCR result cache: a memory LRU in front of an optional disk tier.
+    Results are stored and returned as deep copies so callers can freely mutate metadata.
+    """
+
+    def __init__(self, enabled: bool, max_entries: int, ttl_seconds: float, disk_dir: Optional[str] = None):
+        self.enabled = enabled
+        self._memory = LRUCache(max_entries, ttl_seconds)
+        self._disk = DiskCache(disk_dir, ttl_seconds) if disk_dir else None
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "bypassed": 0}
+
+    async def get(self, key: str) -> Tuple[Optional[OCRResult], str]:
+        """Returns the cached result (if any) and where it came from: 'memory', 'disk' or 'miss'."""
+        result = self._memory.get(key)
+        if result is not None:
+            self._counters["memory_hits"] += 1
+            return result.model_copy(deep=True), "memory"
+
+        if self._disk is not None:
+            entry = await asyncio.to_thread(self._disk.get, key)
+            if entry is not None:
+                stored_at, data = entry
+                result = OCRResult(**data)
+                # Promote to the memory tier
+                self._memory.set(key, result, stored_at=stored_at)
+                self._counters["disk_hits"] += 1
+                return result.model_copy(deep=True), "disk"
+
+        self._counters["misses"] += 1
+        return None, "miss"
+
+    async def set(self, key: str, result: OCRResult) -> None:
+        stored_at = time.time()
+        self._memory.set(key, result.model_copy(deep=True), stored_at=stored_at)
+        self._counters["stores"] += 1
+        if self._disk is not None:
+            try:
+                await asyncio.to_thread(self._disk.set, key, result.model_dump(), stored_at)
+            except Exception as e:
+                logger.warning(f"Failed to write cache entry {key} to disk: {e}")
+
+    def record_bypass(self) -> None:
+        self._counters["bypassed"] += 1
+
+    async def clear(self) -> None:
+        self._memory.clear()
+        if self._disk is not None:
+            await asyncio.to_thread(self._disk.clear)
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self._counters["memory_hits"] + self._counters["disk_hits"]
+        lookups = hits + self._counters["misses"]
+        return {
+            "enabled": self.enabled,
+            **self._counters,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "memory_evictions": self._memory.evictions,
+            "disk_enabled": self._disk is not None,
+        }
+
+
+result_cache = ResultCache(
+    enabled=settings.OCR_CACHE_ENABLED,
+    max_entries=settings.OCR_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.OCR_CACHE_TTL_SECONDS,
+    disk_dir=settings.OCR_CACHE_DIR,
+)
+
+# Pass-1 vision text of two-pass template extraction, keyed by image hash + vision model + vision prompt
+vision_text_cache = LRUCache(
+    max_entries=settings.VISION_TEXT_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.VISION_TEXT_CACHE_TTL_SECONDS,
+)
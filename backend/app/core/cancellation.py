@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from typing import Any, AsyncIterator, Awaitable, Dict, Iterator, Optional, TypeVar
+
+from starlette.requests import Request
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Absolute monotonic deadline of the request being served. Tasks inherit it when they are created.
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+# Cancelled work, by cause
+cancellation_counters: Dict[str, int] = {
+    "client_disconnects": 0,  # Client went away; its work was cancelled
+    "deadline_exceeded": 0,  # Work abandoned because the request deadline passed
+    "cancelled_generations": 0,  # Ollama calls aborted mid-flight (either cause)
+}
+
+
+class DeadlineExceeded(Exception):
+    """The request deadline passed before the work finished."""
+
+
+class ClientDisconnected(Exception):
+    """The client closed the connection while its request was being processed."""
+
+
+def set_deadline(seconds: Optional[float]) -> Token:
+    """Set the deadline of the current task (and the tasks it creates). A tighter existing deadline wins."""
+    deadline = time.monotonic() + seconds if seconds else None
+    current = _deadline.get()
+    if current is not None and (deadline is None or current < deadline):
+        deadline = current
+    return _deadline.set(deadline)
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]) -> Iterator[None]:
+    token = set_deadline(seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the deadline, or None without one."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def deadline_exceeded(what: str) -> DeadlineExceeded:
+    cancellation_counters["deadline_exceeded"] += 1
+    return DeadlineExceeded(f"Request deadline exceeded during {what}")
+
+
+async def with_deadline(awaitable: Awaitable[T], what: str = "generation") -> T:
+    """Await `awaitable`, cancelling it once the deadline passes."""
+    left = remaining()
+    if left is None:
+        return await awaitable
+    if left <= 0:
+        # Close the coroutine we will never await
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise deadline_exceeded(what)
+    try:
+        return await asyncio.wait_for(awaitable, timeout=left)
+    except asyncio.TimeoutError:
+        raise deadline_exceeded(what)
+
+
+async def iterate_with_deadline(iterator: AsyncIterator[T], what: str = "streaming generation") -> AsyncIterator[T]:
+    """Yield from an async iterator, giving up once the deadline passes (even mid-chunk)."""
+    try:
+        while True:
+            try:
+                item = await with_deadline(iterator.__anext__(), what)
+            except StopAsyncIteration:
+                return
+            yield item
+    finally:
+        # Closing an Ollama stream closes its HTTP response, which makes Ollama stop generating
+        aclose = getattr(iterator, "aclose", None)
+        if aclose is not None:
+            try:
+                await aclose()
+            except RuntimeError:
+                # Still unwinding from a cancelled __anext__, which closes the response itself
+                pass
+
+
+async def sleep_within_deadline(delay: float, what: str = "retry backoff") -> None:
+    """Backoff sleep that fails fast when the next attempt could not start before the deadline."""
+    left = remaining()
+    if left is not None and left <= delay:
+        raise deadline_exceeded(what)
+    await asyncio.sleep(delay)
+
+
+async def cancel_on_disconnect(request: Request, awaitable: Awaitable[T]) -> T:
+    """
+    Run `awaitable` while watching the client connection; cancel it if the client goes away.
+    Raises ClientDisconnected in that case.
+    """
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=settings.DISCONNECT_POLL_INTERVAL)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                cancellation_counters["client_disconnects"] += 1
+                logger.info(f"Client disconnected from {request.url.path}, cancelling its work")
+                raise ClientDisconnected("Client closed the connection")
+    finally:
+        if not task.done():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+
+def cancellation_stats() -> Dict[str, Any]:
+    return dict(cancellation_counters)
@@ -0,0 +1,97 @@
+import logging
+import time
+from typing import Any, Dict
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """
+    Per-model circuit breaker.
+
+    closed    -> calls go through; `failure_threshold` consecutive failures open the circuit.
+    open      -> calls are skipped until `cooldown_seconds` have passed.
+    half-open -> one trial call is let through; success closes the circuit, failure re-opens it.
+                 A trial that ends without an outcome (cancelled, out of time) must call release_trial();
+                 one that never reports back is given up on after `cooldown_seconds`.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, cooldown_seconds: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self._consecutive_failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._trial_started_at = None
+        self.total_failures = 0
+        self.total_skipped = 0
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.cooldown_seconds:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and (not self._trial_in_flight or time.monotonic() - self._trial_started_at >= self.cooldown_seconds):
+            self._trial_in_flight = True
+            self._trial_started_at = time.monotonic()
+            return True
+        self.total_skipped += 1
+        return False
+
+    def release_trial(self) -> None:
+        """Let another trial through: the current one ended without telling whether the model works."""
+        self._trial_in_flight = False
+
+    def record_success(self) -> None:
+        if self._opened_at is not None:
+            logger.info(f"Circuit for {self.name} closed again")
+        self._consecutive_failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        self._consecutive_failures += 1
+        self.total_failures += 1
+        self._trial_in_flight = False
+        if self._opened_at is not None or self._consecutive_failures >= self.failure_threshold:
+            logger.warning(f"Circuit for {self.name} opened for {self.cooldown_seconds}s after {self._consecutive_failures} failures")
+            self._opened_at = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self._consecutive_failures,
+            "total_failures": self.total_failures,
+            "total_skipped": self.total_skipped,
+        }
+
+
+class CircuitBreakerRegistry:
+    def __init__(self, failure_threshold: int, cooldown_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def get(self, name: str) -> CircuitBreaker:
+        if name not in self._breakers:
+            self._breakers[name] = CircuitBreaker(name, self.failure_threshold, self.cooldown_seconds)
+        return self._breakers[name]
+
+    def stats(self) -> Dict[str, Any]:
+        return {name: breaker.stats() for name, breaker in self._breakers.items()}
+
+
+circuit_breakers = CircuitBreakerRegistry(
+    failure_threshold=settings.CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+    cooldown_seconds=settings.CIRCUIT_BREAKER_COOLDOWN_SECONDS,
+)
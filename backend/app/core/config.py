@@ -1,5 +1,5 @@
 import os
-from typing import List, Union
+from typing import Any, Dict, List, Optional, Union
 from pydantic import AnyHttpUrl, field_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -21,8 +21,135 @@ class Settings(BaseSettings):
 
     # Model Settings
     OLLAMA_BASE_URL: str = "http://localhost:11434"
+
+    # Ollama backend pool. Comma-separated or JSON list of hosts; empty means just OLLAMA_BASE_URL.
+    OLLAMA_HOSTS: Union[List[str], str] = []
+    OLLAMA_HEALTH_PROBE_INTERVAL: int = 15  # Seconds between health probes; also the re-admit cool-down
+    OLLAMA_HOST_FAILURE_THRESHOLD: int = 3  # Consecutive connection failures before a host is ejected
+    OLLAMA_MAX_CONNECTIONS_PER_HOST: int = 16
+
+    @field_validator("OLLAMA_HOSTS", mode="before")
+    def assemble_ollama_hosts(cls, v: Union[str, List[str]]) -> List[str]:
+        if isinstance(v, str) and not v.startswith("["):
+            return [i.strip() for i in v.split(",") if i.strip()]
+        return v
+
     UPLOAD_DIR: str = os.path.join(os.getcwd(), "uploads")
-    
+
+    # Zero-disk request path for /ocr/process and /ocr/process/stream: uploads are read into memory,
+    # preprocessed and sent to the model as bytes. PERSIST_UPLOADS keeps a copy in UPLOAD_DIR (written async).
+    IN_MEMORY_PIPELINE: bool = True
+    PERSIST_UPLOADS: bool = False
+    MAX_UPLOAD_BYTES: int = 20 * 1024 * 1024
+    # Multipart file parts up to this size stay in RAM instead of a temp file. Starlette only has a
+    # process-wide setting for it, so it applies to every upload endpoint (batch zips, /jobs, documents),
+    # and each concurrent upload can hold this much memory. Uploads above it still work, spooled to disk.
+    UPLOAD_SPOOL_MAX_BYTES: int = 20 * 1024 * 1024
+
+    # Retention of files left in UPLOAD_DIR (kept uploads, PERSIST_UPLOADS copies, crash leftovers).
+    # Request files are removed once served unless the request sets keep_upload. 0 disables a limit.
+    UPLOAD_RETENTION_SECONDS: int = 24 * 3600
+    UPLOAD_MAX_TOTAL_BYTES: int = 5 * 1024**3
+    UPLOAD_MAX_FILES: int = 10000
+    UPLOAD_SWEEP_INTERVAL: int = 300  # Seconds between background sweeps; 0 disables them
+
+    # Preprocessing stage (process pool). 0 workers runs jobs in a thread instead.
+    PREPROCESS_WORKERS: int = 2
+    PREPROCESS_MAX_QUEUE: int = 32
+    # Named cleanup steps run on each image, in order: grayscale, denoise, deskew, border_crop,
+    # binarize, contrast, sharpen (see app/utils/preprocess_steps.py). Requests can pick their own.
+    PREPROCESS_STEPS: List[str] = ["contrast", "sharpen"]
+    PREPROCESS_STEPS_OVERRIDES: Dict[str, List[str]] = {}  # Keyed by model name or family, e.g. {"deepseek-ocr": ["grayscale", "deskew"]}
+
+    # Per-model image sizing, merged over the built-in policies in app/utils/image_sizing.py.
+    # Keyed by model name or family, e.g. {"deepseek-ocr": {"max_side": 1024, "crop_to_document": true}}
+    IMAGE_SIZING_OVERRIDES: Dict[str, Dict[str, Any]] = {}
+
+    # Size num_ctx per generation from the estimated image + prompt tokens (rounded up to a power of two)
+    ADAPTIVE_NUM_CTX: bool = True
+    NUM_CTX_MIN: int = 2048
+    NUM_CTX_MAX: int = 16384
+    NUM_CTX_OUTPUT_RESERVE: int = 2048  # Room left for the generated answer
+
+    # OCR result cache. Set OCR_CACHE_DIR to enable the on-disk tier.
+    OCR_CACHE_ENABLED: bool = True
+    OCR_CACHE_MAX_ENTRIES: int = 512
+    OCR_CACHE_TTL_SECONDS: int = 24 * 60 * 60
+    OCR_CACHE_DIR: Optional[str] = None
+    # Near-duplicate lookup by perceptual hash: re-compressed or resized re-uploads reuse the previous result.
+    # Similarity is 1 - differing bits / 512. Measured: re-uploads of the sample images score 0.969-0.99
+    # (JPEG q60-q90, 0.8x resize), while NID cards differing in a single NID digit score 0.984-0.994.
+    # No threshold separates the two, so a match can return another card's data: off by default, and only
+    # for corpora where that is acceptable (e.g. re-runs of the same scans).
+    NEAR_DUPLICATE_ENABLED: bool = False
+    NEAR_DUPLICATE_MIN_SIMILARITY: float = 0.99
+    NEAR_DUPLICATE_MAX_ENTRIES: int = 4096
+    # Concurrent identical requests (same image, model, prompt, template) share one generation
+    SINGLE_FLIGHT_ENABLED: bool = True
+
+    # Pass-2 reasoning model (overridable per request). Falls back to the vision model.
+    REASONING_MODEL: str = "qwen3:4b-instruct"
+    # Known document types (e.g. the Bangladesh NID) are mapped by rules; pass 2 only runs when mandatory fields are missing
+    RULE_MAPPING_ENABLED: bool = True
+    # Pass 2 output is constrained by the template's JSON Schema (Ollama structured outputs)
+    STRUCTURED_OUTPUT_ENABLED: bool = True
+    # Fields missing from pass 2 output are re-requested on their own instead of retrying the pass
+    REFILL_MISSING_FIELDS: bool = True
+    # Opt-in micro-batching of pass 2 for concurrent requests with the same template: texts arriving within the
+    # window are mapped by one generation returning a JSON array, so the template and instructions are evaluated
+    # once. Every template request then waits the window, so it only pays off under sustained batch traffic.
+    # A request holds its vision model's admission slot through pass 2, so batches never grow past
+    # MODEL_MAX_CONCURRENCY for that model, whatever PASS2_BATCH_MAX_SIZE says. 0 disables batching.
+    PASS2_BATCH_WINDOW_MS: int = 0
+    PASS2_BATCH_MAX_SIZE: int = 4
+    CIRCUIT_BREAKER_FAILURE_THRESHOLD: int = 3
+    CIRCUIT_BREAKER_COOLDOWN_SECONDS: int = 60
+    MODEL_LIST_TTL_SECONDS: int = 30  # How long a host's list of pulled models is trusted
+
+    # Memo of pass-1 vision text so template retries/edits only re-run pass 2
+    VISION_TEXT_CACHE_MAX_ENTRIES: int = 1024
+    VISION_TEXT_CACHE_TTL_SECONDS: int = 6 * 60 * 60
+
+    # Model residency. Keep-alive values use Ollama duration syntax ("10m", "1h", "-1" = forever).
+    MODEL_KEEP_ALIVE: str = "10m"
+    MODEL_KEEP_ALIVE_OVERRIDES: Dict[str, str] = {}  # e.g. {"qwen3-vl:8b": "1h"}
+    MODEL_MEMORY_BUDGET_GB: float = 0  # 0 = no limit on resident models
+    # After a failed load, requests don't retry it for this long, doubling per failure up to 5 minutes
+    MODEL_LOAD_RETRY_SECONDS: float = 5
+    WARMUP_ON_STARTUP: bool = True
+
+    # Concurrency
+    MODEL_MAX_CONCURRENCY: int = 2  # Simultaneous generations per model
+    MODEL_MAX_CONCURRENCY_OVERRIDES: Dict[str, int] = {}  # e.g. {"qwen3-vl:8b": 1}
+    BATCH_MAX_FILES: int = 1000
+    BATCH_MAX_TOTAL_BYTES: int = 2 * 1024 * 1024 * 1024  # Decompressed size of all images in one batch (zip entries included)
+    BATCH_MAX_IN_FLIGHT: int = 8  # Items of one batch being preprocessed/processed at once
+    # Documents (/document): PDFs are rendered per page, pages too large for the model are tiled
+    DOCUMENT_MAX_PAGES: int = 50
+    DOCUMENT_PDF_DPI: int = 200
+    DOCUMENT_MAX_IN_FLIGHT: int = 4  # Tiles of one document being preprocessed/processed at once
+    TILE_MAX_DOWNSCALE: float = 1.5  # Pages that would need more shrinking than this to fit the model are tiled
+    TILE_OVERLAP: float = 0.1  # Fraction of a tile shared with its neighbour, so no line is lost at the cut
+
+    # Admission control: requests waiting for a model slot beyond the concurrency limit
+    ADMISSION_MAX_QUEUE: int = 32  # Per model; more waiters are rejected with 429
+    ADMISSION_QUEUE_TIMEOUT_SECONDS: int = 120  # Interactive requests waiting longer get a 503
+    ADMISSION_BATCH_QUEUE_TIMEOUT_SECONDS: int = 0  # Batch/job requests; 0 = wait as long as it takes
+
+    # Cancellation: total time budget of one OCR request (queueing, retries and backoff included)
+    REQUEST_DEADLINE_SECONDS: int = 600
+    DISCONNECT_POLL_INTERVAL: float = 0.5  # How often /process checks whether the client is still there
+
+    # Async jobs (SQLite-backed queue drained inside the API process)
+    JOBS_DB_PATH: str = os.path.join(os.getcwd(), "jobs.db")
+    JOB_WORKERS: int = 2
+    JOB_MAX_WAIT_SECONDS: int = 60  # Upper bound for long-poll requests
+
+    # Benchmark runs are stored here as one JSON file per run
+    BENCHMARK_DIR: str = os.path.join(os.getcwd(), "benchmarks")
+    # API-started runs may only read corpora inside this directory (the CLI accepts any path)
+    BENCHMARK_CORPUS_DIR: str = os.path.normpath(os.path.join(os.path.dirname(__file__), "..", "..", "sample-images"))
+
     model_config = SettingsConfigDict(
         env_file=".env", 
         env_file_encoding="utf-8",
@@ -0,0 +1,284 @@
+import json
+import re
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from app.utils.templates import parse_template
+
+MAPPING_RULES = "rules"
+MAPPING_LLM = "llm"
+
+_BENGALI = re.compile(r"[ঀ-৿]")
+_BENGALI_DIGITS = str.maketrans("০১২৩৪৫৬৭৮৯", "0123456789")
+
+
+def has_path(obj: Any, path: str) -> bool:
+    for part in path.split("."):
+        if not isinstance(obj, dict) or part not in obj:
+            return False
+        obj = obj[part]
+    return True
+
+
+def get_path(obj: Any, path: str) -> Any:
+    for part in path.split("."):
+        if not isinstance(obj, dict):
+            return None
+        obj = obj.get(part)
+    return obj
+
+
+def set_path(obj: Dict[str, Any], path: str, value: Any) -> bool:
+    """Set a dotted path, but only if the template already has it. Returns whether it was set."""
+    *parents, leaf = path.split(".")
+    for part in parents:
+        obj = obj.get(part) if isinstance(obj, dict) else None
+    if not isinstance(obj, dict) or leaf not in obj:
+        return False
+    obj[leaf] = value
+    return True
+
+
+def is_empty(value: Any) -> bool:
+    return value is None or value == "" or value == []
+
+
+class RuleMapping(BaseModel):
+    """Outcome of mapping vision text onto a template without the LLM."""
+    document_type: str
+    data: Dict[str, Any]
+    fields: List[str]  # Dotted paths filled from the text
+    missing: List[str]  # Mandatory paths still empty
+
+
+class DocumentType:
+    """
+    A known document layout whose template fields can be filled from pass-1 text by rules.
+    Subclasses describe which templates they handle, how to extract fields and how to validate them.
+    """
+
+    name = "generic"
+    # Dotted template paths that must be filled before the pass-2 LLM can be skipped.
+    # A tuple of alternatives (e.g. the English or the Bangla name) counts as filled if any one is.
+    mandatory_fields: Tuple[Any, ...] = ()
+
+    def matches(self, template: Dict[str, Any]) -> bool:
+        raise NotImplementedError
+
+    def extract(self, text: str) -> Dict[str, Any]:
+        """Field values found in the text, keyed by dotted template path."""
+        raise NotImplementedError
+
+    def validate(self, data: Dict[str, Any]) -> None:
+        """Fill the template's validation block (if any) from the extracted values."""
+        pass
+
+    def missing_fields(self, data: Dict[str, Any]) -> List[str]:
+        missing = []
+        for field in self.mandatory_fields:
+            alternatives = field if isinstance(field, tuple) else (field,)
+            present = [path for path in alternatives if has_path(data, path)]
+            if present and all(is_empty(get_path(data, path)) for path in present):
+                missing.append(present[0])
+        return missing
+
+
+class DocumentTypeRegistry:
+    """Registered document types, tried in registration order."""
+
+    def __init__(self):
+        self._types: List[DocumentType] = []
+
+    def register(self, document_type: DocumentType) -> None:
+        self._types.append(document_type)
+
+    def detect(self, template: Dict[str, Any]) -> Optional[DocumentType]:
+        for document_type in self._types:
+            if document_type.matches(template):
+                return document_type
+        return None
+
+    def names(self) -> List[str]:
+        return [document_type.name for document_type in self._types]
+
+
+document_types = DocumentTypeRegistry()
+
+
+def map_with_rules(template: str, text: str, ocr_engine: Optional[str] = None) -> Optional[RuleMapping]:
+    """
+    Fill a template from pass-1 text with the rules of its document type.
+    Returns None when no registered type handles the template.
+    """
+    parsed = parse_template(template)
+    document_type = document_types.detect(parsed) if parsed is not None else None
+    if document_type is None:
+        return None
+
+    fields = []
+    for path, value in document_type.extract(text).items():
+        if set_path(parsed, path, value):
+            fields.append(path)
+    if ocr_engine:
+        set_path(parsed, "extraction.ocr_engine", ocr_engine)
+    _record_extracted(parsed, fields)
+    document_type.validate(parsed)
+    return RuleMapping(document_type=document_type.name, data=parsed, fields=fields, missing=document_type.missing_fields(parsed))
+
+
+def finish_llm_mapping(template: str, text: str, content: str) -> Tuple[str, Optional[str]]:
+    """
+    Post-process the pass-2 LLM output of a known document type: fields the LLM left empty are
+    filled from the rules, and the validation block is recomputed rather than trusted.
+    Returns (content, document type name).
+    """
+    parsed = parse_template(template)
+    document_type = document_types.detect(parsed) if parsed is not None else None
+    if document_type is None:
+        return content, None
+    try:
+        data = json.loads(content)
+    except ValueError:
+        return content, document_type.name
+    if not isinstance(data, dict):
+        return content, document_type.name
+
+    for path, value in document_type.extract(text).items():
+        if has_path(data, path) and is_empty(get_path(data, path)):
+            set_path(data, path, value)
+    document_type.validate(data)
+    return json.dumps(data, ensure_ascii=False), document_type.name
+
+
+def _record_extracted(data: Dict[str, Any], fields: List[str]) -> None:
+    """Fill extraction.fields_extracted / confidence_scores, keyed by top-level holder field (e.g. "name")."""
+    names = {path.split(".")[1] for path in fields if path.startswith("holder.")}
+    if has_path(data, "extraction.fields_extracted"):
+        set_path(data, "extraction.fields_extracted", sorted(names))
+    scores = get_path(data, "extraction.confidence_scores")
+    if isinstance(scores, dict):
+        for name in scores:
+            # Label-anchored matches; there is no model probability to report
+            scores[name] = 1.0 if name in names else 0.0
+
+
+# --- Bangladesh national ID -------------------------------------------------
+
+# Label, optional separator, value on the same line (value may also be on the next line)
+_LABEL_SEP = r"\s*[:\-–：]?\s*"
+_NID_LABELS = {
+    "name": r"(?:name|নাম)",
+    "father_name": r"(?:father(?:'s)?\s*name|father|পিতা)",
+    "mother_name": r"(?:mother(?:'s)?\s*name|mother|মাতা)",
+    "date_of_birth": r"(?:date\s*of\s*birth|birth\s*date|d\.?o\.?b\.?|জন্ম\s*তারিখ)",
+    "nid_number": r"(?:nid\s*(?:no|number)?\.?|id\s*no\.?|national\s*id\s*(?:no|number)?\.?|এনআইডি\s*নং)",
+}
+_DATE_FORMATS = ("%d %b %Y", "%d %B %Y", "%d-%m-%Y", "%d/%m/%Y", "%d.%m.%Y", "%Y-%m-%d", "%d-%b-%Y", "%b %d %Y", "%B %d %Y")
+_DATE_PATTERN = re.compile(
+    r"\b(\d{1,2}[\s\-/.](?:[A-Za-z]{3,9}|\d{1,2})[\s\-/.,]*\d{4}|\d{4}-\d{2}-\d{2})\b"
+)
+# Smart cards carry 10 digits, older laminated cards 13 or 17
+NID_LENGTHS = (10, 13, 17)
+
+
+def parse_date(value: str) -> Optional[date]:
+    cleaned = re.sub(r"[\s,]+", " ", value.translate(_BENGALI_DIGITS)).strip()
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(cleaned, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+_ANY_LABEL = re.compile(rf"^\s*(?:{'|'.join(_NID_LABELS.values())}){_LABEL_SEP}", re.IGNORECASE)
+
+
+def _labelled_values(lines: List[str], label: str) -> List[str]:
+    """Values following `label` at the start of a line, or on the next line when the label stands alone."""
+    pattern = re.compile(rf"^\s*{label}{_LABEL_SEP}(.*)$", re.IGNORECASE)
+    values = []
+    for i, line in enumerate(lines):
+        match = pattern.match(line)
+        if not match:
+            continue
+        value = match.group(1).strip()
+        if not value and i + 1 < len(lines) and not _ANY_LABEL.match(lines[i + 1]):
+            value = lines[i + 1].strip()
+        if value:
+            values.append(value)
+    return values
+
+
+def _split_by_script(values: List[str]) -> Dict[str, str]:
+    """First Bangla and first Latin value."""
+    found = {}
+    for value in values:
+        key = "bn" if _BENGALI.search(value) else "en"
+        found.setdefault(key, value)
+    return found
+
+
+class BangladeshNID(DocumentType):
+    name = "bd_nid"
+    mandatory_fields = (("holder.name.en", "holder.name.bn"), "holder.date_of_birth", "holder.nid_number")
+
+    def matches(self, template: Dict[str, Any]) -> bool:
+        document = template.get("document")
+        if isinstance(document, dict) and document.get("type") == "NATIONAL_ID" and document.get("country", "BD") == "BD":
+            return True
+        return has_path(template, "holder.nid_number")
+
+    def extract(self, text: str) -> Dict[str, Any]:
+        lines = [line for line in text.splitlines() if line.strip()]
+        values: Dict[str, Any] = {}
+
+        for field in ("name", "father_name", "mother_name"):
+            # "Name" must not pick up "Father's Name"/"Mother's Name" lines: those labels start differently
+            for script, value in _split_by_script(_labelled_values(lines, _NID_LABELS[field])).items():
+                values[f"holder.{field}.{script}"] = value
+
+        dob = self._date_of_birth(lines, text)
+        if dob:
+            values["holder.date_of_birth"] = dob
+        nid = self._nid_number(lines, text)
+        if nid:
+            values["holder.nid_number"] = nid
+        return values
+
+    @staticmethod
+    def _date_of_birth(lines: List[str], text: str) -> Optional[str]:
+        for value in _labelled_values(lines, _NID_LABELS["date_of_birth"]):
+            match = _DATE_PATTERN.search(value.translate(_BENGALI_DIGITS))
+            if match:
+                return match.group(1).strip()
+        # Unlabelled: the card carries one date, the birth date
+        dates = _DATE_PATTERN.findall(text.translate(_BENGALI_DIGITS))
+        return dates[0].strip() if len(dates) == 1 else None
+
+    @staticmethod
+    def _nid_number(lines: List[str], text: str) -> Optional[str]:
+        for value in _labelled_values(lines, _NID_LABELS["nid_number"]):
+            digits = re.sub(r"\D", "", value.translate(_BENGALI_DIGITS))
+            if digits:
+                return digits
+        # Unlabelled: a single run of digits of a valid NID length (spaces between groups allowed)
+        candidates = {
+            re.sub(r"\s", "", match)
+            for match in re.findall(r"(?<!\d)\d[\d ]{8,20}\d(?!\d)", text.translate(_BENGALI_DIGITS))
+        }
+        candidates = [c for c in candidates if len(c) in NID_LENGTHS]
+        return candidates[0] if len(candidates) == 1 else None
+
+    def validate(self, data: Dict[str, Any]) -> None:
+        nid = get_path(data, "holder.nid_number")
+        dob = get_path(data, "holder.date_of_birth")
+        parsed_dob = parse_date(dob) if isinstance(dob, str) and dob else None
+        set_path(data, "validation.nid_format_valid", isinstance(nid, str) and nid.isdigit() and len(nid) in NID_LENGTHS)
+        set_path(data, "validation.dob_format_valid", parsed_dob is not None and date(1900, 1, 1) <= parsed_dob <= date.today())
+        set_path(data, "validation.mandatory_fields_present", not self.missing_fields(data))
+
+
+document_types.register(BangladeshNID())
@@ -0,0 +1,63 @@
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+
+from app.core.admission import PRIORITY_INTERACTIVE
+from app.core.config import settings
+from app.core.metrics import observe_preprocess, request_mode
+from app.core.preprocessing import preprocessing_stage
+from app.models.manager import manager
+from app.models.ollama_adapter import VISION_PROMPT
+from app.utils.documents import crop_tiles, stitch_tiles
+from app.utils.image_sizing import sizing_policy
+
+logger = logging.getLogger(__name__)
+
+# Tiles are read as plain text, line by line, so their overlap can be found and stitched
+DOCUMENT_PROMPT = VISION_PROMPT
+
+
+async def ocr_page(
+    page: bytes,
+    model_name: str,
+    tiles_in_flight: asyncio.Semaphore,
+    prompt: Optional[str] = None,
+    use_cache: bool = True,
+    priority: str = PRIORITY_INTERACTIVE,
+) -> Dict[str, Any]:
+    """
+    OCR one page of a document. Pages too large for the model are split into overlapping full-width
+    strips, OCR'd concurrently through the model manager (so admission and per-model concurrency limits
+    apply) and stitched back in reading order. `tiles_in_flight` bounds the tiles of a whole
+    document being preprocessed/processed at once.
+    """
+    prompt = prompt or DOCUMENT_PROMPT
+    mode = request_mode(prompt, None)
+    policy = sizing_policy(model_name)
+    tiles = await asyncio.to_thread(crop_tiles, page, policy.max_side, settings.TILE_MAX_DOWNSCALE, settings.TILE_OVERLAP)
+
+    async def ocr_tile(tile: bytes):
+        async with tiles_in_flight:
+            processed, preprocess_timings = await preprocessing_stage.run(tile, model_name)
+            observe_preprocess(preprocess_timings, model_name, mode)
+            return await manager.process_image(model_name, processed, prompt, use_cache=use_cache, priority=priority)
+
+    tasks: List[asyncio.Task] = [asyncio.create_task(ocr_tile(tile)) for tile in tiles]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        # A failed tile fails the page: stop the rest of its tiles (no-op for finished ones)
+        for task in tasks:
+            task.cancel()
+
+    tile_results = [task.result() for task in tasks]
+    if len(tile_results) > 1:
+        logger.info(f"Page OCR'd as {len(tile_results)} strips with {model_name}")
+    return {
+        "text": stitch_tiles([result.text for result in tile_results]),
+        "tiles": len(tile_results),
+        "grid": [len(tile_results), 1],  # Rows x columns; pages are only cut into full-width strips
+        "prompt_eval_count": sum(result.metadata.get("prompt_eval_count") or 0 for result in tile_results),
+        "eval_count": sum(result.metadata.get("eval_count") or 0 for result in tile_results),
+        "cache_hits": sum(1 for result in tile_results if str(result.metadata.get("cache", "")).startswith("hit")),
+    }
@@ -0,0 +1,310 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from app.core.admission import AdmissionRejected, PRIORITY_BATCH
+from app.core.cancellation import deadline_scope
+from app.core.config import settings
+from app.core.metrics import observe_preprocess, observe_stage, record_request, request_mode
+from app.core.preprocessing import preprocessing_stage
+from app.core.storage import upload_storage
+from app.models.manager import manager
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+FINISHED_STATES = (JOB_SUCCEEDED, JOB_FAILED)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    model_name TEXT NOT NULL,
+    prompt TEXT,
+    template TEXT,
+    use_cache INTEGER NOT NULL DEFAULT 1,
+    image_path TEXT NOT NULL,
+    filename TEXT,
+    reasoning_model TEXT,
+    keep_upload INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs (status, created_at);
+"""
+
+
+class JobStore:
+    """
+    SQLite-backed job table. Calls are blocking; JobQueue runs them in a thread.
+    A single connection guarded by a lock is plenty for one FastAPI process.
+    """
+
+    def __init__(self, db_path: str):
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+            self._migrate()
+            self._conn.commit()
+
+    def _migrate(self) -> None:
+        """Add columns introduced after a job table was first created."""
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "reasoning_model" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN reasoning_model TEXT")
+        if "keep_upload" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN keep_upload INTEGER NOT NULL DEFAULT 0")
+
+    def insert(self, job: Dict[str, Any]) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, model_name, prompt, template, use_cache, image_path, filename, reasoning_model, keep_upload, created_at) "
+                "VALUES (:id, :status, :model_name, :prompt, :template, :use_cache, :image_path, :filename, :reasoning_model, :keep_upload, :created_at)",
+                job,
+            )
+            self._conn.commit()
+
+    def claim_next(self) -> Optional[Dict[str, Any]]:
+        """Atomically move the oldest queued job to running and return it."""
+        with self._lock:
+            row = self._conn.execute(
+                "UPDATE jobs SET status = ?, started_at = ? "
+                "WHERE id = (SELECT id FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1) "
+                "RETURNING *",
+                (JOB_RUNNING, time.time(), JOB_QUEUED),
+            ).fetchone()
+            self._conn.commit()
+        return _row_to_job(row) if row else None
+
+    def finish(self, job_id: str, status: str, result: Optional[Dict[str, Any]] = None, error: Optional[str] = None) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+                (status, json.dumps(result) if result is not None else None, error, time.time(), job_id),
+            )
+            self._conn.commit()
+
+    def requeue(self, job_id: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, started_at = NULL WHERE id = ?", (JOB_QUEUED, job_id)
+            )
+            self._conn.commit()
+
+    def requeue_running(self) -> int:
+        """Jobs left running by a previous process never finished; put them back in the queue."""
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE jobs SET status = ?, started_at = NULL WHERE status = ?", (JOB_QUEUED, JOB_RUNNING)
+            )
+            self._conn.commit()
+            return cur.rowcount
+
+    def active_image_paths(self) -> List[str]:
+        """Images of jobs that have not finished yet; upload retention must leave them alone."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT image_path FROM jobs WHERE status IN (?, ?)", (JOB_QUEUED, JOB_RUNNING)
+            ).fetchall()
+        return [row["image_path"] for row in rows]
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _row_to_job(row) if row else None
+
+    def list(self, status: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        query = "SELECT * FROM jobs"
+        params: List[Any] = []
+        if status:
+            query += " WHERE status = ?"
+            params.append(status)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [_row_to_job(row) for row in rows]
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def _row_to_job(row: sqlite3.Row) -> Dict[str, Any]:
+    job = dict(row)
+    job["use_cache"] = bool(job["use_cache"])
+    job["keep_upload"] = bool(job["keep_upload"])
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    return job
+
+
+class JobQueue:
+    """
+    Drains the job table with a pool of asyncio workers inside the FastAPI process.
+    Every job goes through the same preprocessing + ModelManager.process_image path as /ocr/process.
+    """
+
+    def __init__(self, db_path: str, workers: int):
+        self._db_path = db_path
+        self._worker_count = workers
+        self._store: Optional[JobStore] = None
+        self._workers: List[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+        self._waiters: Dict[str, List[asyncio.Event]] = {}
+        # Queued jobs may wait longer than the upload TTL; their images must survive it.
+        # Looked up on every sweep since the store is replaced across restarts.
+        upload_storage.protect(lambda: self.store.active_image_paths())
+
+    @property
+    def store(self) -> JobStore:
+        if self._store is None:
+            self._store = JobStore(self._db_path)
+        return self._store
+
+    async def start(self) -> None:
+        if self._workers:
+            return
+        requeued = await asyncio.to_thread(self.store.requeue_running)
+        if requeued:
+            logger.info(f"Requeued {requeued} jobs interrupted by the last shutdown")
+        logger.info(f"Starting {self._worker_count} job workers (db: {self._db_path})")
+        self._workers = [asyncio.create_task(self._worker(i)) for i in range(self._worker_count)]
+        self._wakeup.set()
+
+    async def shutdown(self) -> None:
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        if self._store is not None:
+            self._store.close()
+            self._store = None
+
+    async def submit(
+        self,
+        image_path: str,
+        model_name: str,
+        prompt: Optional[str] = None,
+        template: Optional[str] = None,
+        use_cache: bool = True,
+        filename: Optional[str] = None,
+        reasoning_model: Optional[str] = None,
+        keep_upload: bool = False,
+    ) -> Dict[str, Any]:
+        job = {
+            "id": str(uuid.uuid4()),
+            "status": JOB_QUEUED,
+            "model_name": model_name,
+            "prompt": prompt,
+            "template": template,
+            "use_cache": int(use_cache),
+            "image_path": image_path,
+            "filename": filename,
+            "reasoning_model": reasoning_model,
+            "keep_upload": int(keep_upload),
+            "created_at": time.time(),
+        }
+        await asyncio.to_thread(self.store.insert, job)
+        self._wakeup.set()
+        return await self.get(job["id"])
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self.store.get, job_id)
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """Long-poll: return once the job has finished or `timeout` seconds have passed."""
+        event = asyncio.Event()
+        self._waiters.setdefault(job_id, []).append(event)
+        try:
+            job = await self.get(job_id)
+            if job is None or job["status"] in FINISHED_STATES or timeout <= 0:
+                return job
+            try:
+                await asyncio.wait_for(event.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+            return await self.get(job_id)
+        finally:
+            waiters = self._waiters.get(job_id, [])
+            if event in waiters:
+                waiters.remove(event)
+            if not waiters:
+                self._waiters.pop(job_id, None)
+
+    async def list(self, status: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(self.store.list, status, limit)
+
+    async def stats(self) -> Dict[str, Any]:
+        return {"workers": len(self._workers), "counts": await asyncio.to_thread(self.store.counts)}
+
+    async def _worker(self, worker_id: int) -> None:
+        while True:
+            # Clear before claiming so a submit that lands in between is never missed
+            self._wakeup.clear()
+            job = await asyncio.to_thread(self.store.claim_next)
+            if job is None:
+                await self._wakeup.wait()
+                continue
+            # Other workers may still have queued jobs to claim
+            self._wakeup.set()
+
+            logger.info(f"Worker {worker_id} running job {job['id']} on {job['model_name']}")
+            start_time = time.time()
+            mode = request_mode(job["prompt"], job["template"])
+            processed_path = None
+            try:
+                with deadline_scope(settings.REQUEST_DEADLINE_SECONDS):
+                    processed_path, preprocess_timings = await preprocessing_stage.run(job["image_path"], job["model_name"])
+                    observe_preprocess(preprocess_timings, job["model_name"], mode)
+                    result = await manager.process_image(
+                        job["model_name"], processed_path, job["prompt"], job["template"],
+                        use_cache=job["use_cache"], reasoning_model=job["reasoning_model"], priority=PRIORITY_BATCH,
+                        perceptual_hash=preprocess_timings.get("perceptual_hash"),
+                    )
+                result.metadata.update(preprocess_timings)
+                result.metadata["api_process_time"] = time.time() - start_time
+                observe_stage("total", job["model_name"], mode, result.metadata["api_process_time"])
+                record_request("job", job["model_name"], mode, "200")
+                await asyncio.to_thread(self.store.finish, job["id"], JOB_SUCCEEDED, result.model_dump())
+            except AdmissionRejected as e:
+                # The model is saturated: put the job back and give interactive traffic room
+                logger.info(f"Job {job['id']} not admitted ({e.detail}), retrying in {e.retry_after}s")
+                await asyncio.to_thread(self.store.requeue, job["id"])
+                await asyncio.sleep(e.retry_after)
+                continue
+            except asyncio.CancelledError:
+                # Shutting down: leave the job as running so requeue_running() picks it up next start
+                raise
+            except Exception as e:
+                logger.warning(f"Job {job['id']} failed: {e}")
+                record_request("job", job["model_name"], mode, "500", type(e).__name__)
+                await asyncio.to_thread(self.store.finish, job["id"], JOB_FAILED, None, str(e))
+
+            # The result is in the job table now; the image is only kept when asked for
+            if not job["keep_upload"]:
+                upload_storage.discard(job["image_path"], processed_path)
+
+            for event in self._waiters.get(job["id"], []):
+                event.set()
+
+
+job_queue = JobQueue(db_path=settings.JOBS_DB_PATH, workers=settings.JOB_WORKERS)
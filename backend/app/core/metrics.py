@@ -0,0 +1,163 @@
+import asyncio
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+from prometheus_client import Counter, Gauge, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, REGISTRY
+
+from app.core.storage import upload_storage
+
+# Request modes, used as the `mode` label
+MODE_PLAIN = "plain"
+MODE_PROMPT = "prompt"
+MODE_TEMPLATE = "template"
+
+# OCR stages run from tens of milliseconds (upload save) to minutes (cold pass-1 on CPU)
+STAGE_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600)
+
+STAGE_DURATION = Histogram(
+    "ocr_stage_duration_seconds",
+    "Time spent per OCR stage: upload_save, preprocess, pass1_vision, pass2_mapping, generate, retry_backoff, total.",
+    ["stage", "model", "mode"],
+    buckets=STAGE_BUCKETS,
+)
+PREPROCESS_STEP_DURATION = Histogram(
+    "ocr_preprocess_step_duration_seconds",
+    "Time spent per image preprocessing step.",
+    ["step"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+REQUESTS = Counter("ocr_requests_total", "OCR requests by endpoint and outcome.", ["endpoint", "model", "mode", "status"])
+RETRIES = Counter("ocr_retries_total", "Ollama generation attempts that failed and were retried.", ["model", "stage"])
+FALLBACKS = Counter("ocr_reasoning_fallbacks_total", "Pass-2 runs that fell back from the reasoning model to the vision model.", ["model"])
+CACHE_LOOKUPS = Counter("ocr_cache_lookups_total", "Result and vision-text cache lookups by outcome.", ["cache", "result"])
+TEMPLATE_MAPPINGS = Counter("ocr_template_mappings_total", "Template requests by detected document type and the path that mapped them (rules or llm).", ["document_type", "path"])
+TEMPLATE_OUTPUTS = Counter("ocr_template_outputs_total", "Pass-2 JSON outputs by how they were made to fit the template (valid, repaired, refilled or invalid).", ["outcome"])
+COALESCED = Counter("ocr_coalesced_requests_total", "Requests that shared the generation of an identical request already in flight.", ["model"])
+ERRORS = Counter("ocr_errors_total", "Failed OCR requests by endpoint and error type.", ["endpoint", "error"])
+IN_FLIGHT = Gauge("ocr_requests_in_flight", "OCR requests currently being served.", ["endpoint"])
+GENERATIONS_IN_FLIGHT = Gauge("ocr_generations_in_flight", "Model runs holding an admission slot.", ["model"])
+PASS2_BATCH_FALLBACKS = Counter("ocr_pass2_batch_fallbacks_total", "Images whose batched pass-2 output couldn't be used and were mapped on their own.", ["model"])
+PASS2_BATCH_SIZE = Histogram(
+    "ocr_pass2_batch_size",
+    "Images mapped per pass-2 generation.",
+    ["model"],
+    buckets=(1, 2, 3, 4, 6, 8, 12, 16),
+)
+IMAGE_TOKENS = Histogram(
+    "ocr_image_tokens_estimate",
+    "Estimated vision tokens per image sent to a model.",
+    ["model"],
+    buckets=(64, 128, 256, 400, 576, 784, 1024, 1600, 2500, 4096, 8192),
+)
+
+
+def request_mode(prompt: Optional[str], template: Optional[str]) -> str:
+    if template:
+        return MODE_TEMPLATE
+    return MODE_PROMPT if prompt else MODE_PLAIN
+
+
+def observe_stage(stage: str, model: str, mode: str, seconds: float) -> None:
+    STAGE_DURATION.labels(stage=stage, model=model, mode=mode).observe(seconds)
+
+
+@contextmanager
+def stage_timer(stage: str, model: str, mode: str) -> Iterator[None]:
+    """Observe the duration of the block, whether it succeeds or fails."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, model, mode, time.perf_counter() - start)
+
+
+@contextmanager
+def track_request(endpoint: str, model: str, mode: str) -> Iterator[None]:
+    """
+    In-flight gauge, outcome counter and (for successful requests) total latency of one API request.
+    HTTP errors are counted by status code and by the exception that caused them.
+    """
+    start = time.perf_counter()
+    status, error = "200", None
+    try:
+        with IN_FLIGHT.labels(endpoint=endpoint).track_inprogress():
+            yield
+    except BaseException as e:
+        # A cancelled request is a client that went away (nginx's 499)
+        status = "499" if isinstance(e, asyncio.CancelledError) else str(getattr(e, "status_code", 500))
+        cause = e.__context__ if getattr(e, "status_code", None) and e.__context__ else e
+        error = type(cause).__name__
+        raise
+    else:
+        observe_stage("total", model, mode, time.perf_counter() - start)
+    finally:
+        record_request(endpoint, model, mode, status, error)
+
+
+def record_request(endpoint: str, model: str, mode: str, status: str, error: Optional[str] = None) -> None:
+    REQUESTS.labels(endpoint=endpoint, model=model, mode=mode, status=status).inc()
+    if error:
+        ERRORS.labels(endpoint=endpoint, error=error).inc()
+
+
+def observe_preprocess(timings: Dict, model: str, mode: str) -> None:
+    """Record the timings returned by the preprocessing stage (measured inside the pool worker)."""
+    observe_stage("preprocess", model, mode, timings["preprocess_time"])
+    for step, seconds in (timings.get("preprocess_steps") or {}).items():
+        PREPROCESS_STEP_DURATION.labels(step=step).observe(seconds)
+
+
+class _StatsCollector:
+    """
+    Exposes state the app already tracks (model residency, admission queues, backend pool,
+    upload storage, cancellations) as gauges read at scrape time, so there is a single source of truth.
+    """
+
+    def describe(self):
+        # Nothing to describe up front; this keeps registration from calling collect() at import time
+        return []
+
+    def collect(self):
+        # Imported here: these modules import this one
+        from app.core.admission import admission
+        from app.core.cancellation import cancellation_counters
+        from app.models.manager import manager
+
+        residency = manager.residency_stats()
+        yield GaugeMetricFamily("ocr_resident_models", "Models currently loaded.", value=len(residency["resident"]))
+        resident_bytes = GaugeMetricFamily("ocr_resident_model_bytes", "Memory used by each resident model.", labels=["model"])
+        for entry in residency["resident"]:
+            resident_bytes.add_metric([entry["name"]], entry["memory_bytes"])
+        yield resident_bytes
+
+        queued = GaugeMetricFamily("ocr_admission_queue_depth", "Requests waiting for a model slot.", labels=["model", "priority"])
+        for model_name, stats in admission.stats().items():
+            for priority, depth in stats["queued"].items():
+                queued.add_metric([model_name, priority], depth)
+        yield queued
+
+        healthy = GaugeMetricFamily("ocr_ollama_host_healthy", "1 if the Ollama host is in rotation.", labels=["host"])
+        outstanding = GaugeMetricFamily("ocr_ollama_host_outstanding", "Requests in flight per Ollama host.", labels=["host"])
+        for host in manager.pool.stats():
+            healthy.add_metric([host["url"]], 1 if host["healthy"] else 0)
+            outstanding.add_metric([host["url"]], host["outstanding"])
+        yield healthy
+        yield outstanding
+
+        storage = upload_storage.stats()
+        yield GaugeMetricFamily("ocr_upload_storage_bytes", "Bytes in UPLOAD_DIR as of the last retention sweep.", value=storage["bytes"])
+        yield GaugeMetricFamily("ocr_upload_storage_files", "Files in UPLOAD_DIR as of the last retention sweep.", value=storage["files"])
+        removed = CounterMetricFamily("ocr_upload_storage_removed", "Files removed by upload retention.", labels=["unit"])
+        removed.add_metric(["files"], storage["removed_files"])
+        removed.add_metric(["bytes"], storage["removed_bytes"])
+        yield removed
+
+        cancelled = CounterMetricFamily("ocr_cancellations", "Work cancelled since startup, by cause.", labels=["cause"])
+        for cause, count in cancellation_counters.items():
+            cancelled.add_metric([cause], count)
+        yield cancelled
+
+
+REGISTRY.register(_StatsCollector())
@@ -0,0 +1,103 @@
+import asyncio
+import contextvars
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+from app.core.cancellation import deadline_scope, remaining, with_deadline
+
+
+def _consume_outcome(future: asyncio.Future) -> None:
+    # Mark the outcome as retrieved so a failure nobody waited for isn't logged as "never retrieved"
+    if not future.cancelled():
+        future.exception()
+
+
+class Batch:
+    """Calls collected under one key while its window is open."""
+
+    def __init__(self):
+        self.items: List[Any] = []
+        self.futures: List[asyncio.Future] = []
+        self.deadlines: List[Optional[float]] = []  # Absolute (monotonic) deadline of each caller
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.task: Optional[asyncio.Task] = None
+
+
+class MicroBatcher:
+    """
+    Groups calls with the same key that arrive within a short window into one `flush` call.
+
+    The first call of a key opens a batch, which is flushed when the window closes or it holds
+    `max_size` items. `flush(key, items)` returns one outcome per item, in order: a result, or an
+    exception raised to that caller alone; if `flush` itself raises, every caller gets the error.
+
+    The flush runs in its own task under the loosest deadline of its callers. Each caller still
+    gives up at its own deadline, and the flush is cancelled once nobody is waiting for it.
+    """
+
+    def __init__(self, window_seconds: float, max_size: int, flush: Callable[[Hashable, List[Any]], Awaitable[List[Any]]]):
+        self.window_seconds = window_seconds
+        self.max_size = max_size
+        self.flush = flush
+        self._open: Dict[Hashable, Batch] = {}
+
+    async def submit(self, key: Hashable, item: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        batch = self._open.get(key)
+        if batch is None:
+            batch = self._open[key] = Batch()
+            batch.timer = loop.call_later(self.window_seconds, self._close, key, batch)
+
+        future = loop.create_future()
+        future.add_done_callback(_consume_outcome)
+        left = remaining()
+        batch.items.append(item)
+        batch.futures.append(future)
+        batch.deadlines.append(None if left is None else time.monotonic() + left)
+        if len(batch.items) >= self.max_size:
+            self._close(key, batch)
+
+        try:
+            return await with_deadline(asyncio.shield(future), "batched generation")
+        finally:
+            if not future.done():
+                # This caller gave up; its item is dropped from a batch that hasn't flushed yet
+                future.cancel()
+            if batch.task is not None and not batch.task.done() and all(f.done() for f in batch.futures):
+                batch.task.cancel()
+
+    def _close(self, key: Hashable, batch: Batch) -> None:
+        if self._open.get(key) is batch:
+            del self._open[key]
+        batch.timer.cancel()
+        if batch.task is not None or all(f.done() for f in batch.futures):
+            return
+        # A fresh context, so the flush doesn't inherit the deadline of whichever caller opened the batch
+        batch.task = contextvars.Context().run(asyncio.get_running_loop().create_task, self._run(key, batch))
+
+    async def _run(self, key: Hashable, batch: Batch) -> None:
+        live = [i for i, future in enumerate(batch.futures) if not future.done()]
+        futures = [batch.futures[i] for i in live]
+        deadlines = [batch.deadlines[i] for i in live]
+
+        loosest = None if None in deadlines else max(deadlines) - time.monotonic()
+        try:
+            with deadline_scope(loosest):
+                outcomes = await self.flush(key, [batch.items[i] for i in live])
+        except asyncio.CancelledError:
+            for future in futures:
+                future.cancel()
+            raise
+        except Exception as e:
+            outcomes = [e] * len(futures)
+
+        for future, outcome in zip(futures, outcomes):
+            if future.done():
+                continue
+            if isinstance(outcome, BaseException):
+                future.set_exception(outcome)
+            else:
+                future.set_result(outcome)
+        for future in futures:
+            if not future.done():
+                future.set_exception(RuntimeError(f"Batch flush returned {len(outcomes)} outcomes for {len(futures)} items"))
@@ -0,0 +1,96 @@
+import hashlib
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.models.base import OCRResult
+from app.utils.perceptual_hash import HASH_BITS, hamming_distances, hash_words
+
+
+class NearDuplicateIndex:
+    """
+    Recent results indexed by the perceptual hash of their preprocessed image.
+
+    Catches re-uploads the exact-bytes cache misses: the same card re-compressed or resized by
+    the mobile app. A lookup compares the query against every entry at once (Hamming distance
+    over NumPy words) and only considers entries of the same scope, i.e. the same model,
+    prompt, template and options, so a near-duplicate never returns a result for another request.
+
+    Hashes can't tell such a re-upload from a card that differs in a few digits, which would
+    then be served the other card's data. The index is therefore off unless NEAR_DUPLICATE_ENABLED
+    is set (see its comment in config for the measured similarities).
+
+    Entries live in a ring buffer: the oldest is overwritten once `max_entries` is reached.
+    """
+
+    def __init__(self, enabled: bool, max_entries: int, ttl_seconds: float, min_similarity: float):
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.min_similarity = min_similarity
+        self._words = np.zeros((max_entries, HASH_BITS // 64), dtype=np.uint64)
+        self._scopes = np.zeros(max_entries, dtype=np.int64)
+        self._stored_at = np.zeros(max_entries, dtype=np.float64)
+        self._results: List[Optional[OCRResult]] = [None] * max_entries
+        self._next = 0
+        self._size = 0
+        self._counters = {"hits": 0, "misses": 0, "stores": 0}
+
+    @staticmethod
+    def _scope_id(scope: str) -> int:
+        return int.from_bytes(hashlib.sha256(scope.encode("utf-8")).digest()[:8], "big", signed=True)
+
+    def lookup(self, perceptual_hash: str, scope: str) -> Optional[Tuple[OCRResult, float]]:
+        """The closest previous result within the similarity threshold, and its similarity (0-1)."""
+        if not self._size:
+            self._counters["misses"] += 1
+            return None
+        candidates = self._scopes[:self._size] == self._scope_id(scope)
+        if self.ttl_seconds:
+            candidates &= self._stored_at[:self._size] >= time.time() - self.ttl_seconds
+        if not candidates.any():
+            self._counters["misses"] += 1
+            return None
+
+        distances = hamming_distances(self._words[:self._size], hash_words(perceptual_hash))
+        distances = np.where(candidates, distances, HASH_BITS + 1)
+        best = int(np.argmin(distances))
+        similarity = 1 - int(distances[best]) / HASH_BITS
+        if similarity < self.min_similarity:
+            self._counters["misses"] += 1
+            return None
+        self._counters["hits"] += 1
+        return self._results[best].model_copy(deep=True), similarity
+
+    def add(self, perceptual_hash: str, scope: str, result: OCRResult) -> None:
+        slot = self._next
+        self._words[slot] = hash_words(perceptual_hash)
+        self._scopes[slot] = self._scope_id(scope)
+        self._stored_at[slot] = time.time()
+        self._results[slot] = result.model_copy(deep=True)
+        self._next = (slot + 1) % self.max_entries
+        self._size = min(self._size + 1, self.max_entries)
+        self._counters["stores"] += 1
+
+    def clear(self) -> None:
+        self._results = [None] * self.max_entries
+        self._next = 0
+        self._size = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "entries": self._size,
+            "min_similarity": self.min_similarity,
+            **self._counters,
+        }
+
+
+near_duplicates = NearDuplicateIndex(
+    enabled=settings.NEAR_DUPLICATE_ENABLED,
+    max_entries=settings.NEAR_DUPLICATE_MAX_ENTRIES,
+    ttl_seconds=settings.OCR_CACHE_TTL_SECONDS,
+    min_similarity=settings.NEAR_DUPLICATE_MIN_SIMILARITY,
+)
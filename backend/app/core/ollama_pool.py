@@ -0,0 +1,230 @@
+import asyncio
+import logging
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+
+import httpx
+import ollama
+
+from app.core.cancellation import DeadlineExceeded, cancellation_counters, with_deadline
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Errors that say something about the host rather than the request (the host never answered)
+HOST_ERRORS = (ConnectionError, httpx.TransportError)
+
+
+def normalize_model_name(name: str) -> str:
+    return name if ":" in name else f"{name}:latest"
+
+
+class OllamaHost:
+    """One Ollama server: a shared client (and so one HTTP connection pool) plus what we know about it."""
+
+    def __init__(self, url: str):
+        self.url = url
+        # Set a very long timeout (600 seconds) to avoid timeouts on slow generations/loading
+        self.client = ollama.AsyncClient(
+            host=url,
+            timeout=600,
+            limits=httpx.Limits(
+                max_connections=settings.OLLAMA_MAX_CONNECTIONS_PER_HOST,
+                max_keepalive_connections=settings.OLLAMA_MAX_CONNECTIONS_PER_HOST,
+            ),
+        )
+        self.outstanding = 0
+        self.healthy = True
+        self.consecutive_failures = 0
+        self.ejected_at: Optional[float] = None
+        self.resident: Set[str] = set()
+        self.available: Optional[Set[str]] = None  # None until the first successful list()
+        self.available_at = 0.0
+        self.total_requests = 0
+
+    def record_success(self) -> None:
+        self.consecutive_failures = 0
+        if not self.healthy:
+            logger.info(f"Ollama host {self.url} re-admitted")
+        self.healthy = True
+        self.ejected_at = None
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        if self.healthy and self.consecutive_failures >= settings.OLLAMA_HOST_FAILURE_THRESHOLD:
+            logger.warning(f"Ejecting Ollama host {self.url} after {self.consecutive_failures} failures")
+            self.healthy = False
+        if not self.healthy:
+            self.ejected_at = time.monotonic()
+
+    @property
+    def eligible(self) -> bool:
+        """Healthy, or ejected long enough ago that one request may try it again."""
+        if self.healthy:
+            return True
+        return self.ejected_at is not None and time.monotonic() - self.ejected_at >= settings.OLLAMA_HEALTH_PROBE_INTERVAL
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "total_requests": self.total_requests,
+            "consecutive_failures": self.consecutive_failures,
+            "resident": sorted(self.resident),
+            "available": sorted(self.available) if self.available is not None else None,
+        }
+
+
+class OllamaBackendPool:
+    """
+    Routes Ollama calls across several hosts.
+
+    Routing is model-aware least-outstanding-requests: among eligible hosts that have the model
+    pulled, prefer those where it is already resident, then the one with the fewest requests in flight.
+    A host whose last call failed only wins when nothing better is available.
+    Hosts that fail at the transport level are ejected and re-admitted by the health probe
+    (or, without a probe loop, after a cool-down).
+    """
+
+    def __init__(self, urls: List[str]):
+        self.hosts = [OllamaHost(url) for url in urls]
+        self._probe_task: Optional[asyncio.Task] = None
+
+    def pick(self, model: str) -> OllamaHost:
+        model = normalize_model_name(model)
+        candidates = [host for host in self.hosts if host.eligible] or self.hosts
+        with_model = [host for host in candidates if host.available is None or model in host.available]
+        candidates = with_model or candidates
+        resident = [host for host in candidates if model in host.resident]
+        candidates = resident or candidates
+        # Least outstanding requests; a host whose last call failed loses ties so retries fail over
+        best = min((host.consecutive_failures > 0, host.outstanding) for host in candidates)
+        return random.choice([host for host in candidates if (host.consecutive_failures > 0, host.outstanding) == best])
+
+    @asynccontextmanager
+    async def acquire(self, model: str) -> AsyncIterator[OllamaHost]:
+        """Pick a host for `model` and track the request against it."""
+        host = self.pick(model)
+        host.outstanding += 1
+        host.total_requests += 1
+        try:
+            yield host
+        except HOST_ERRORS:
+            host.record_failure()
+            raise
+        except ollama.ResponseError:
+            # The host answered; the error is about the request/model, not the host
+            host.record_success()
+            raise
+        except (asyncio.CancelledError, DeadlineExceeded):
+            # Client gone or out of time; the aborted HTTP request makes Ollama stop generating
+            cancellation_counters["cancelled_generations"] += 1
+            raise
+        else:
+            host.record_success()
+            host.resident.add(normalize_model_name(model))
+        finally:
+            host.outstanding -= 1
+
+    async def generate(self, **kwargs) -> Any:
+        """Non-streaming generate routed through the pool."""
+        async with self.acquire(kwargs.get("model", "")) as host:
+            return await with_deadline(host.client.generate(**kwargs))
+
+    async def unload_everywhere(self, model: str) -> None:
+        """Evict a model from every host that might hold it."""
+        name = normalize_model_name(model)
+        for host in self.hosts:
+            if not host.eligible:
+                continue
+            try:
+                await host.client.generate(model=model, keep_alive=0)
+                host.resident.discard(name)
+            except Exception as e:
+                logger.warning(f"Failed to unload {model} on {host.url}: {e}")
+
+    async def has_model(self, model: str) -> Optional[bool]:
+        """Whether any eligible host has `model` pulled. None if no host could be listed."""
+        name = normalize_model_name(model)
+        known = False
+        for host in self.hosts:
+            if not host.eligible:
+                continue
+            available = await self._available_on(host)
+            if available is None:
+                continue
+            known = True
+            if name in available:
+                return True
+        return False if known else None
+
+    async def _available_on(self, host: OllamaHost) -> Optional[Set[str]]:
+        """TTL-cached client.list() of one host."""
+        if host.available is not None and time.monotonic() - host.available_at < settings.MODEL_LIST_TTL_SECONDS:
+            return host.available
+        try:
+            listing = await host.client.list()
+        except Exception as e:
+            logger.warning(f"Could not list models on {host.url}: {e}")
+            return host.available
+        host.available = {normalize_model_name(m.model) for m in listing.models}
+        host.available_at = time.monotonic()
+        return host.available
+
+    async def resident_size(self, model: str) -> int:
+        """Memory used by `model` on the host holding it, from ps(). 0 if unknown."""
+        name = normalize_model_name(model)
+        for host in self.hosts:
+            if name not in host.resident:
+                continue
+            try:
+                running = await host.client.ps()
+            except Exception as e:
+                logger.warning(f"Could not read resident models on {host.url}: {e}")
+                continue
+            for m in running.models:
+                if normalize_model_name(m.model) == name:
+                    return m.size or 0
+        return 0
+
+    async def probe(self) -> None:
+        """Refresh health, resident models and pulled models of every host."""
+        for host in self.hosts:
+            try:
+                running = await host.client.ps()
+            except Exception as e:
+                if host.healthy:
+                    logger.warning(f"Health probe failed for {host.url}: {e}")
+                host.consecutive_failures = max(host.consecutive_failures, settings.OLLAMA_HOST_FAILURE_THRESHOLD - 1)
+                host.record_failure()
+                continue
+            host.record_success()
+            host.resident = {normalize_model_name(m.model) for m in running.models}
+            await self._available_on(host)
+
+    def start(self) -> None:
+        if self._probe_task is None and settings.OLLAMA_HEALTH_PROBE_INTERVAL > 0:
+            self._probe_task = asyncio.create_task(self._probe_loop())
+
+    async def shutdown(self) -> None:
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+            await asyncio.gather(self._probe_task, return_exceptions=True)
+            self._probe_task = None
+
+    async def _probe_loop(self) -> None:
+        while True:
+            try:
+                await self.probe()
+            except Exception as e:
+                logger.warning(f"Ollama health probe loop error: {e}")
+            await asyncio.sleep(settings.OLLAMA_HEALTH_PROBE_INTERVAL)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [host.stats() for host in self.hosts]
+
+
+ollama_pool = OllamaBackendPool(settings.OLLAMA_HOSTS or [settings.OLLAMA_BASE_URL])
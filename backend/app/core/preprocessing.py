@@ -0,0 +1,124 @@
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from app.core.config import settings
+from app.utils.image_processing import preprocess_image, preprocess_image_bytes
+from app.utils.image_sizing import SizingPolicy, sizing_policy
+from app.utils.preprocess_steps import preprocess_steps
+
+logger = logging.getLogger(__name__)
+
+
+class PreprocessQueueFull(Exception):
+    """Raised when the preprocessing stage has no room for another job."""
+    pass
+
+
+def _run_preprocess_job(image: Union[str, bytes], submitted_at: float, policy: SizingPolicy, steps: List[str]) -> Tuple[Union[str, bytes], Dict[str, Any]]:
+    """
+    Entry point executed inside a pool worker.
+    Must stay a module-level function so it can be pickled for the process pool.
+    Paths come back as the processed file's path, bytes as the processed encoded image.
+    """
+    started_at = time.time()
+    start = time.perf_counter()
+    step_timings: Dict[str, float] = {}
+    sizing: Dict[str, Any] = {}
+    if isinstance(image, bytes):
+        processed = preprocess_image_bytes(image, timings=step_timings, policy=policy, sizing=sizing, steps=steps)
+    else:
+        processed = preprocess_image(image, timings=step_timings, policy=policy, sizing=sizing, steps=steps)
+    duration = time.perf_counter() - start
+
+    timings = {
+        "preprocess_queue_wait": max(0.0, started_at - submitted_at),
+        "preprocess_time": duration,
+        "preprocess_worker_pid": os.getpid(),
+        # Per-step seconds; the parent process turns them into metrics
+        "preprocess_steps": step_timings,
+        # Original/chosen size and estimated vision tokens, to correlate with latency
+        "preprocess_sizing": sizing,
+        # Looked up in the near-duplicate index (app/core/near_duplicates.py)
+        "perceptual_hash": sizing.pop("perceptual_hash", None),
+    }
+    return processed, timings
+
+
+class PreprocessingStage:
+    """
+    Runs CPU-bound image preprocessing in a process pool so the event loop stays free.
+
+    The queue is bounded: at most `workers + max_queue` jobs may be pending at once.
+    Anything beyond that is rejected immediately with `PreprocessQueueFull` instead of
+    piling up behind a slow upload.
+    """
+
+    def __init__(self, workers: int, max_queue: int):
+        self._workers = workers
+        self._max_pending = max(1, workers) + max_queue
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+
+    def start(self) -> None:
+        if self._executor is not None or self._workers <= 0:
+            return
+        logger.info(f"Starting preprocessing pool with {self._workers} workers (max pending: {self._max_pending})")
+        self._executor = ProcessPoolExecutor(max_workers=self._workers)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            logger.info("Shutting down preprocessing pool...")
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    async def run(
+        self, image: Union[str, bytes], model_name: Optional[str] = None, steps: Optional[List[str]] = None
+    ) -> Tuple[Union[str, bytes], Dict[str, Any]]:
+        """
+        Preprocess an image without blocking the event loop.
+
+        Takes an image path or the encoded image bytes and returns the processed image
+        in the same form, plus the timings for this job.
+        The image is sized for `model_name` (see app/utils/image_sizing.py) and cleaned up by
+        `steps`, or the model's configured step chain when not given.
+        """
+        if self._pending >= self._max_pending:
+            raise PreprocessQueueFull(f"Preprocessing queue is full ({self._pending} jobs pending)")
+
+        # Lazy start so scripts that never go through the FastAPI lifespan still work
+        self.start()
+
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            submitted_at = time.time()
+            policy = sizing_policy(model_name)
+            if steps is None:
+                steps = preprocess_steps(model_name)
+            if self._executor is None:
+                # PREPROCESS_WORKERS=0 runs jobs in the default thread pool instead (handy for debugging)
+                return await asyncio.to_thread(_run_preprocess_job, image, submitted_at, policy, steps)
+            return await loop.run_in_executor(self._executor, _run_preprocess_job, image, submitted_at, policy, steps)
+        finally:
+            self._pending -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self._workers,
+            "pending": self._pending,
+            "max_pending": self._max_pending,
+        }
+
+
+preprocessing_stage = PreprocessingStage(
+    workers=settings.PREPROCESS_WORKERS,
+    max_queue=settings.PREPROCESS_MAX_QUEUE,
+)
@@ -0,0 +1,110 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+def _consume_outcome(future: asyncio.Future) -> None:
+    # Mark the outcome as retrieved so a failure nobody waited for isn't logged as "never retrieved"
+    if not future.cancelled():
+        future.exception()
+
+
+class Flight:
+    """One in-flight execution and the number of callers waiting for it."""
+
+    def __init__(self, future: asyncio.Future, task: Optional[asyncio.Task] = None):
+        self.future = future
+        self.task = task  # Set when the flight runs in its own task; None when a caller drives it
+        self.waiters = 0
+        future.add_done_callback(_consume_outcome)
+
+
+class SingleFlight:
+    """
+    Collapses concurrent identical requests into one execution whose result all of them receive.
+
+    Only simultaneous duplicates are shared: a key is forgotten as soon as its flight lands.
+    The work runs in its own task and callers wait on it through asyncio.shield, so a caller
+    that is cancelled (its client disconnected) only stops waiting. The work is cancelled once
+    its last waiter is gone. A waiter whose leader went away without a result runs the work itself.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, Flight] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def get(self, key: str) -> Optional[Flight]:
+        return self._flights.get(key)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """Run `fn` once for all concurrent callers with the same key. Returns (result, shared)."""
+        while True:
+            flight = self._flights.get(key)
+            shared = flight is not None
+            if not shared:
+                task = asyncio.create_task(fn())
+                flight = self._register(key, task, task)
+            try:
+                return await self.wait(key, flight), shared
+            except asyncio.CancelledError:
+                if not self.leader_gone(flight):
+                    raise
+                # The flight was driven by a caller that went away; take over
+
+    def lead(self, key: str) -> Flight:
+        """
+        Register a flight that the caller drives itself (e.g. a streamed generation).
+        The caller must end it with land(), whatever the outcome.
+        """
+        return self._register(key, asyncio.get_running_loop().create_future(), None)
+
+    def land(self, key: str, flight: Flight, result: Any = None, error: Optional[BaseException] = None) -> None:
+        """Publish the outcome of a flight started with lead(). A cancelled leader sends its waiters to run on their own."""
+        self._forget(key, flight)
+        if flight.future.done():
+            return
+        if isinstance(error, (asyncio.CancelledError, GeneratorExit)):
+            flight.future.cancel()
+        elif error is not None:
+            flight.future.set_exception(error)
+        else:
+            flight.future.set_result(result)
+
+    async def wait(self, key: str, flight: Flight) -> Any:
+        """Wait for a flight's result. Raises CancelledError, with leader_gone() true, if it will never come."""
+        flight.waiters += 1
+        if flight.waiters > 1 or flight.task is None:
+            self.coalesced += 1
+        try:
+            return await asyncio.shield(flight.future)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and flight.task is not None and not flight.task.done():
+                # Every caller is gone: nobody wants this result any more
+                self._forget(key, flight)
+                flight.task.cancel()
+
+    @staticmethod
+    def leader_gone(flight: Flight) -> bool:
+        # The flight was cancelled while this caller itself is not being cancelled
+        current = asyncio.current_task()
+        return flight.future.cancelled() and not (current and current.cancelling())
+
+    def _register(self, key: str, future: asyncio.Future, task: Optional[asyncio.Task]) -> Flight:
+        flight = Flight(future, task)
+        self._flights[key] = flight
+        self.leaders += 1
+        future.add_done_callback(lambda _: self._forget(key, flight))
+        return flight
+
+    def _forget(self, key: str, flight: Flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"in_flight": len(self._flights), "leaders": self.leaders, "coalesced": self.coalesced}
+
+
+single_flight = SingleFlight()
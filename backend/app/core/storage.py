@@ -0,0 +1,159 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class UploadStorage:
+    """
+    Lifecycle of the files under UPLOAD_DIR.
+
+    Request files are discarded as soon as the request is served, unless it asked to keep them.
+    Whatever remains (kept uploads, PERSIST_UPLOADS copies, leftovers of crashed requests) is
+    subject to retention, enforced by a background sweep: files older than the TTL go first,
+    then the oldest ones until the directory is under its byte and file-count limits.
+    """
+
+    def __init__(self, directory: str, ttl_seconds: float, max_bytes: int, max_files: int, interval: float):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.interval = interval
+        # Callables returning paths still needed by someone else (e.g. queued jobs)
+        self._protectors: List[Callable[[], Iterable[str]]] = []
+        self._task: Optional[asyncio.Task] = None
+        # Usage as of the last sweep
+        self.files = 0
+        self.bytes = 0
+        self.removed_files = 0
+        self.removed_bytes = 0
+        self.last_sweep_at: Optional[float] = None
+        self.last_sweep_duration: Optional[float] = None
+
+    def protect(self, provider: Callable[[], Iterable[str]]) -> None:
+        """Never remove the paths returned by `provider`, whatever their age."""
+        self._protectors.append(provider)
+
+    def discard(self, *paths: Optional[str]) -> None:
+        """Remove request files that are no longer needed. Missing files are fine."""
+        for path in paths:
+            if not path:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _protected(self) -> Set[str]:
+        # A failing provider fails the sweep: better to keep files one more interval than lose a job's image
+        protected = set()
+        for provider in self._protectors:
+            protected.update(os.path.abspath(path) for path in provider())
+        return protected
+
+    def sweep(self) -> Dict[str, Any]:
+        """Apply retention once (blocking, run it in a thread). Returns what was removed."""
+        start = time.perf_counter()
+        now = time.time()
+        protected = self._protected()
+
+        entries = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue  # Removed by a request in the meantime
+                entries.append((st.st_mtime, st.st_size, path))
+        entries.sort()  # Oldest first
+
+        total_files = len(entries)
+        total_bytes = sum(size for _, size, _ in entries)
+        removed_files = removed_bytes = 0
+        for mtime, size, path in entries:
+            if os.path.abspath(path) in protected:
+                continue
+            age = now - mtime
+            expired = self.ttl_seconds and age > self.ttl_seconds
+            over_quota = (self.max_bytes and total_bytes > self.max_bytes) or (self.max_files and total_files > self.max_files)
+            if not expired and not over_quota:
+                break
+            if not expired and age < settings.REQUEST_DEADLINE_SECONDS:
+                # Young enough to still be in use by a request; the quota has to wait
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total_files -= 1
+            total_bytes -= size
+            removed_files += 1
+            removed_bytes += size
+
+        self._remove_empty_shards()
+        self.files = total_files
+        self.bytes = total_bytes
+        self.removed_files += removed_files
+        self.removed_bytes += removed_bytes
+        self.last_sweep_at = now
+        self.last_sweep_duration = time.perf_counter() - start
+        if removed_files:
+            logger.info(f"Upload retention removed {removed_files} files ({removed_bytes} bytes), {total_files} left ({total_bytes} bytes)")
+        return {"removed_files": removed_files, "removed_bytes": removed_bytes}
+
+    def _remove_empty_shards(self) -> None:
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if os.path.isdir(path):
+                try:
+                    os.rmdir(path)  # Only succeeds when empty
+                except OSError:
+                    pass
+
+    def start(self) -> None:
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._sweep_loop())
+
+    async def shutdown(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _sweep_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(self.sweep)
+            except Exception as e:
+                logger.warning(f"Upload retention sweep failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "directory": self.directory,
+            "files": self.files,
+            "bytes": self.bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "max_bytes": self.max_bytes,
+            "max_files": self.max_files,
+            "removed_files": self.removed_files,
+            "removed_bytes": self.removed_bytes,
+            "last_sweep_at": self.last_sweep_at,
+            "last_sweep_duration": self.last_sweep_duration,
+        }
+
+
+upload_storage = UploadStorage(
+    settings.UPLOAD_DIR,
+    ttl_seconds=settings.UPLOAD_RETENTION_SECONDS,
+    max_bytes=settings.UPLOAD_MAX_TOTAL_BYTES,
+    max_files=settings.UPLOAD_MAX_FILES,
+    interval=settings.UPLOAD_SWEEP_INTERVAL,
+)
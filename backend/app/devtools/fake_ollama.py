@@ -0,0 +1,347 @@
+"""
+Stand-in for the Ollama HTTP API so benchmarks and load tests can run on a CPU-only box.
+
+    uvicorn app.devtools.fake_ollama:app --port 11435
+
+then point the backend (OLLAMA_BASE_URL) or a benchmark run (--host) at http://localhost:11435.
+
+Modes (FAKE_OLLAMA_MODE):
+- synthetic (default): canned NID text / echoed templates with synthetic timing.
+- record: proxy every request to FAKE_OLLAMA_UPSTREAM (a real Ollama) and append each
+  generate request/response pair to FAKE_OLLAMA_FIXTURES (JSONL).
+- replay: serve generate responses from FAKE_OLLAMA_FIXTURES. Requests are matched on
+  model + prompt + format + images, then on model + format, then fall back to synthetic.
+
+Knobs (env or POST /fake/config at runtime):
+- FAKE_OLLAMA_LATENCY / FAKE_OLLAMA_LOAD_DURATION: synthetic prompt latency and cold load (seconds).
+- FAKE_OLLAMA_TIME_SCALE: replay sleeps for the recorded durations times this factor (0 = no delay).
+- FAKE_OLLAMA_FAILURE_RATE / FAKE_OLLAMA_FAILURE_STATUS: fraction of generate calls that fail, and with which status.
+- FAKE_OLLAMA_MODELS (comma separated): restrict which models exist; by default every model does.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+CONFIG: Dict[str, Any] = {
+    "mode": os.getenv("FAKE_OLLAMA_MODE", "synthetic"),
+    "fixtures": os.getenv("FAKE_OLLAMA_FIXTURES", "ollama_fixtures.jsonl"),
+    "upstream": os.getenv("FAKE_OLLAMA_UPSTREAM", "http://localhost:11434"),
+    "latency": float(os.getenv("FAKE_OLLAMA_LATENCY", "0.5")),
+    "load_duration": float(os.getenv("FAKE_OLLAMA_LOAD_DURATION", "2.0")),
+    "time_scale": float(os.getenv("FAKE_OLLAMA_TIME_SCALE", "1.0")),
+    "failure_rate": float(os.getenv("FAKE_OLLAMA_FAILURE_RATE", "0")),
+    "failure_status": int(os.getenv("FAKE_OLLAMA_FAILURE_STATUS", "500")),
+    "models": [m.strip() for m in os.getenv("FAKE_OLLAMA_MODELS", "").split(",") if m.strip()],
+}
+MODEL_SIZE = int(os.getenv("FAKE_OLLAMA_MODEL_SIZE", str(4 * 1024**3)))
+TOKENS_PER_SEC = 40.0
+STAT_KEYS = ("total_duration", "load_duration", "prompt_eval_count", "prompt_eval_duration", "eval_count", "eval_duration")
+
+CANNED_TEXT = (
+    "GOVERNMENT OF THE PEOPLE'S REPUBLIC OF BANGLADESH\n"
+    "NATIONAL ID CARD\n"
+    "Name: AL-AMIN ISLAM\n"
+    "Date of Birth: 03 Apr 1999\n"
+    "NID No: 1234567890"
+)
+
+app = FastAPI(title="Fake Ollama")
+
+# Models currently "loaded" (name -> expiry timestamp, None = forever)
+_loaded: Dict[str, Optional[float]] = {}
+# Models seen so far, reported by /api/tags when FAKE_OLLAMA_MODELS is not set
+_seen: Dict[str, None] = {}
+# Replay fixtures indexed by exact request key and by (model, format kind)
+_fixtures_by_key: Dict[str, Dict[str, Any]] = {}
+_fixtures_by_model: Dict[str, List[Dict[str, Any]]] = {}
+_counters = {"requests": 0, "replay_exact": 0, "replay_model": 0, "synthetic": 0, "recorded": 0, "injected_failures": 0}
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _request_key(body: Dict[str, Any]) -> str:
+    """Stable key for a generate request. Images are hashed so fixtures stay small."""
+    h = hashlib.sha256()
+    h.update(json.dumps(
+        {
+            "model": body.get("model", ""),
+            "prompt": body.get("prompt") or "",
+            "format": body.get("format") or "",
+            "images": [hashlib.sha256(str(image).encode()).hexdigest() for image in body.get("images") or []],
+        },
+        sort_keys=True,
+    ).encode())
+    return h.hexdigest()
+
+
+def _format_kind(body: Dict[str, Any]) -> str:
+    return "json" if body.get("format") else "text"
+
+
+def _load_fixtures() -> None:
+    _fixtures_by_key.clear()
+    _fixtures_by_model.clear()
+    path = CONFIG["fixtures"]
+    if not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                _index_fixture(json.loads(line))
+
+
+def _index_fixture(fixture: Dict[str, Any]) -> None:
+    _fixtures_by_key[fixture["key"]] = fixture
+    _fixtures_by_model.setdefault(f"{fixture['model']}|{fixture['format_kind']}", []).append(fixture)
+
+
+def _record_fixture(body: Dict[str, Any], response: Dict[str, Any]) -> None:
+    fixture = {
+        "key": _request_key(body),
+        "model": body.get("model", ""),
+        "format_kind": _format_kind(body),
+        "prompt_preview": (body.get("prompt") or "")[:200],
+        "image_count": len(body.get("images") or []),
+        "response": response.get("response", ""),
+        **{key: response.get(key) for key in STAT_KEYS},
+    }
+    with open(CONFIG["fixtures"], "a", encoding="utf-8") as f:
+        f.write(json.dumps(fixture) + "\n")
+    _index_fixture(fixture)
+    _counters["recorded"] += 1
+
+
+def _keep_alive_seconds(value: Any) -> Optional[float]:
+    """Parse Ollama keep_alive values: numbers are seconds, strings like '10m'/'1h', negative = forever."""
+    if value is None:
+        return 300.0
+    if isinstance(value, (int, float)):
+        return None if value < 0 else float(value)
+    value = str(value).strip()
+    units = {"s": 1, "m": 60, "h": 3600}
+    if value[-1:] in units:
+        seconds = float(value[:-1]) * units[value[-1]]
+    else:
+        seconds = float(value)
+    return None if seconds < 0 else seconds
+
+
+def _touch_model(model: str, keep_alive: Any) -> float:
+    """Mark a model as loaded and return the synthetic load duration it cost (0 if already warm)."""
+    expiry = _loaded.get(model, 0.0)
+    warm = model in _loaded and (expiry is None or expiry > time.time())
+    seconds = _keep_alive_seconds(keep_alive)
+    if seconds == 0:
+        _loaded.pop(model, None)
+    else:
+        _loaded[model] = None if seconds is None else time.time() + seconds
+    return 0.0 if warm else CONFIG["load_duration"]
+
+
+def _canned_response(body: Dict[str, Any]) -> str:
+    if body.get("format"):
+        # Pass-2 mapping (or a re-request of missing fields): hand back the JSON the prompt asked us to fill
+        prompt = body.get("prompt") or ""
+        for marker in ("JSON Template:\n", "JSON Fields:\n"):
+            if marker in prompt:
+                filled = prompt.split(marker, 1)[1].strip()
+                # Batched pass 2 asks for one object per document
+                batch = re.search(r"a JSON array of (\d+)", prompt)
+                return f"[{', '.join([filled] * int(batch.group(1)))}]" if batch else filled
+        return "{}"
+    return CANNED_TEXT
+
+
+def _synthetic_generation(body: Dict[str, Any], load_duration: float) -> Dict[str, Any]:
+    text = _canned_response(body)
+    eval_count = len(text.split(" "))
+    eval_duration = eval_count / TOKENS_PER_SEC
+    latency = CONFIG["latency"]
+    return {
+        "response": text,
+        "total_duration": int((load_duration + latency + eval_duration) * 1e9),
+        "load_duration": int(load_duration * 1e9),
+        "prompt_eval_count": len((body.get("prompt") or "").split()) + 256 * len(body.get("images") or []),
+        "prompt_eval_duration": int(latency * 1e9),
+        "eval_count": eval_count,
+        "eval_duration": int(eval_duration * 1e9),
+    }
+
+
+def _replayed_generation(body: Dict[str, Any], load_duration: float) -> Optional[Dict[str, Any]]:
+    fixture = _fixtures_by_key.get(_request_key(body))
+    if fixture is not None:
+        _counters["replay_exact"] += 1
+    else:
+        candidates = _fixtures_by_model.get(f"{body.get('model', '')}|{_format_kind(body)}")
+        if not candidates:
+            return None
+        fixture = random.choice(candidates)
+        _counters["replay_model"] += 1
+
+    generation = {key: fixture.get(key) or 0 for key in STAT_KEYS}
+    generation["response"] = fixture["response"]
+    # Load cost follows our own residency simulation rather than whatever the recording saw
+    generation["total_duration"] = generation["total_duration"] - generation["load_duration"] + int(load_duration * 1e9)
+    generation["load_duration"] = int(load_duration * 1e9)
+    return generation
+
+
+def _split_tokens(text: str) -> List[str]:
+    words = text.split(" ")
+    return [word if i == 0 else " " + word for i, word in enumerate(words)]
+
+
+@app.post("/api/generate")
+async def generate(request: Request):
+    body = await request.json()
+    model = body.get("model", "")
+    _counters["requests"] += 1
+
+    if CONFIG["mode"] == "record":
+        return await _proxy_generate(body)
+
+    if CONFIG["models"] and model not in CONFIG["models"]:
+        return JSONResponse({"error": f"model '{model}' not found"}, status_code=404)
+    _seen[model] = None
+
+    if body.get("keep_alive") in (0, "0", "0s") and not body.get("prompt"):
+        _loaded.pop(model, None)
+        return JSONResponse({"model": model, "created_at": _now(), "response": "", "done": True, "done_reason": "unload"})
+
+    if CONFIG["failure_rate"] and random.random() < CONFIG["failure_rate"]:
+        _counters["injected_failures"] += 1
+        return JSONResponse({"error": "injected failure"}, status_code=CONFIG["failure_status"])
+
+    load_duration = _touch_model(model, body.get("keep_alive"))
+    if not body.get("prompt") and not body.get("images"):
+        await asyncio.sleep(load_duration)
+        return JSONResponse({"model": model, "created_at": _now(), "response": "", "done": True, "done_reason": "load"})
+
+    generation = None
+    if CONFIG["mode"] == "replay":
+        generation = _replayed_generation(body, load_duration)
+    if generation is None:
+        _counters["synthetic"] += 1
+        generation = _synthetic_generation(body, load_duration)
+
+    text = generation.pop("response")
+    stats = generation
+    # Synthetic timings are already in seconds terms; recorded ones get scaled
+    scale = CONFIG["time_scale"] if CONFIG["mode"] == "replay" else 1.0
+    time_to_first_token = (stats["total_duration"] - stats["eval_duration"]) / 1e9 * scale
+    eval_seconds = stats["eval_duration"] / 1e9 * scale
+
+    if not body.get("stream", True):
+        await asyncio.sleep(time_to_first_token + eval_seconds)
+        return JSONResponse({"model": model, "created_at": _now(), "response": text, "done": True, "done_reason": "stop", **stats})
+
+    async def stream():
+        await asyncio.sleep(time_to_first_token)
+        tokens = _split_tokens(text)
+        for token in tokens:
+            await asyncio.sleep(eval_seconds / len(tokens))
+            yield json.dumps({"model": model, "created_at": _now(), "response": token, "done": False}) + "\n"
+        yield json.dumps({"model": model, "created_at": _now(), "response": "", "done": True, "done_reason": "stop", **stats}) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+async def _proxy_generate(body: Dict[str, Any]):
+    """Record mode: forward to the real Ollama, record the full response, and pass it back."""
+    async with httpx.AsyncClient(base_url=CONFIG["upstream"], timeout=600) as client:
+        if not body.get("stream", True):
+            response = await client.post("/api/generate", json=body)
+            data = response.json()
+            if response.status_code == 200 and body.get("prompt"):
+                _record_fixture(body, data)
+            return JSONResponse(data, status_code=response.status_code)
+
+        # Buffer the upstream stream so the recorded fixture has the merged text and final stats
+        chunks = []
+        async with client.stream("POST", "/api/generate", json=body) as response:
+            status_code = response.status_code
+            async for line in response.aiter_lines():
+                if line.strip():
+                    chunks.append(json.loads(line))
+
+    if status_code != 200:
+        return JSONResponse(chunks[-1] if chunks else {"error": "upstream error"}, status_code=status_code)
+    if body.get("prompt") and chunks:
+        merged = dict(chunks[-1])
+        merged["response"] = "".join(chunk.get("response", "") for chunk in chunks)
+        _record_fixture(body, merged)
+
+    async def stream():
+        for chunk in chunks:
+            yield json.dumps(chunk) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+async def _proxy_get(path: str):
+    async with httpx.AsyncClient(base_url=CONFIG["upstream"], timeout=60) as client:
+        response = await client.get(path)
+        return JSONResponse(response.json(), status_code=response.status_code)
+
+
+@app.get("/api/tags")
+async def tags():
+    if CONFIG["mode"] == "record":
+        return await _proxy_get("/api/tags")
+    names = CONFIG["models"] or list(_seen)
+    return {"models": [{"name": name, "model": name, "modified_at": _now(), "size": MODEL_SIZE} for name in names]}
+
+
+@app.get("/api/ps")
+async def ps():
+    if CONFIG["mode"] == "record":
+        return await _proxy_get("/api/ps")
+    now = time.time()
+    for name, expiry in list(_loaded.items()):
+        if expiry is not None and expiry <= now:
+            _loaded.pop(name, None)
+    return {"models": [{"name": name, "model": name, "size": MODEL_SIZE, "size_vram": MODEL_SIZE} for name in _loaded]}
+
+
+@app.post("/api/pull")
+async def pull(request: Request):
+    return {"status": "success"}
+
+
+@app.get("/api/version")
+async def version():
+    return {"version": "0.0.0-fake"}
+
+
+@app.get("/fake/config")
+async def get_config():
+    return {**CONFIG, "fixtures_loaded": len(_fixtures_by_key), "counters": _counters}
+
+
+@app.post("/fake/config")
+async def update_config(request: Request):
+    """Change knobs at runtime, e.g. {"failure_rate": 0.2, "latency": 1.5}. Changing fixtures reloads them."""
+    updates = await request.json()
+    unknown = set(updates) - set(CONFIG)
+    if unknown:
+        return JSONResponse({"error": f"unknown keys: {sorted(unknown)}"}, status_code=400)
+    CONFIG.update(updates)
+    if "fixtures" in updates or "mode" in updates:
+        _load_fixtures()
+    return await get_config()
+
+
+_load_fixtures()
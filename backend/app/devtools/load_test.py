@@ -0,0 +1,82 @@
+"""
+Fire concurrent OCR requests at a running API and report throughput and latency.
+
+    python -m app.devtools.load_test --url http://localhost:8000 --requests 50 --concurrency 8
+
+Pair it with the fake Ollama server (app.devtools.fake_ollama) to load-test on a CPU-only box.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from collections import Counter
+
+import httpx
+
+from app.utils.stats import latency_summary
+
+DEFAULT_IMAGE = os.path.join(os.path.dirname(__file__), "..", "..", "sample-images", "nid-test.png")
+
+
+async def run_load_test(url: str, image_path: str, requests: int, concurrency: int, endpoint: str, form: dict) -> dict:
+    with open(image_path, "rb") as f:
+        image = f.read()
+    filename = os.path.basename(image_path)
+    content_type = "image/png" if filename.lower().endswith(".png") else "image/jpeg"
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    statuses = Counter()
+
+    async with httpx.AsyncClient(base_url=url, timeout=900) as client:
+        async def one_request():
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    response = await client.post(endpoint, files={"file": (filename, image, content_type)}, data=form)
+                    statuses[response.status_code] += 1
+                    if response.status_code == 200:
+                        latencies.append(time.perf_counter() - start)
+                except httpx.HTTPError as e:
+                    statuses[type(e).__name__] += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one_request() for _ in range(requests)))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "elapsed": elapsed,
+        "throughput_images_per_sec": len(latencies) / elapsed if elapsed > 0 else None,
+        "statuses": {str(k): v for k, v in statuses.items()},
+        **latency_summary(latencies),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load-test the OCR API.")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--endpoint", default="/api/v1/ocr/process")
+    parser.add_argument("--image", default=DEFAULT_IMAGE)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--model")
+    parser.add_argument("--template", help="Path to a JSON template file.")
+    parser.add_argument("--cache", action="store_true", help="Allow result cache hits (bypassed by default).")
+    args = parser.parse_args()
+
+    form = {"no_cache": "false" if args.cache else "true"}
+    if args.model:
+        form["model_name"] = args.model
+    if args.template:
+        with open(args.template, "r", encoding="utf-8") as f:
+            form["template"] = f.read()
+
+    report = asyncio.run(run_load_test(args.url, args.image, args.requests, args.concurrency, args.endpoint, form))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Micro-benchmark of the preprocessing steps: milliseconds per step on sample images.
+
+    python -m app.devtools.preprocess_bench --model deepseek-ocr:latest --repeat 5
+
+Each step is timed on its own on the sized image (what adding it to a chain costs), then each
+--chain runs end to end through the real preprocessing (decode, sizing, steps, hashing, encoding)
+and reports its per-stage times and encoded size. Pair it with the benchmark runner's accuracy
+numbers to pick the cheapest chain that keeps accuracy.
+"""
+import argparse
+import glob
+import io
+import json
+import os
+import statistics
+import time
+from typing import Dict, List
+
+import numpy as np
+from PIL import Image
+
+from app.utils.image_processing import preprocess_image_bytes
+from app.utils.image_sizing import sizing_policy
+from app.utils.preprocess_steps import STEPS, parse_steps
+
+DEFAULT_IMAGES = os.path.join(os.path.dirname(__file__), "..", "..", "sample-images", "*")
+DEFAULT_CHAINS = ["contrast,sharpen", "grayscale", "grayscale,denoise,binarize", "grayscale,deskew,contrast,sharpen"]
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 2)
+
+
+def bench_steps(pixels: np.ndarray, repeat: int) -> Dict[str, float]:
+    """Median milliseconds of each step applied alone to the sized image."""
+    report = {}
+    for name, step in STEPS.items():
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            step(pixels)
+            samples.append(time.perf_counter() - start)
+        report[name] = _ms(statistics.median(samples))
+    return report
+
+
+def bench_chain(data: bytes, model: str, steps: List[str], repeat: int) -> Dict:
+    """Median milliseconds per stage of the full preprocessing with `steps`, and the output size."""
+    policy = sizing_policy(model)
+    runs = []
+    output = b""
+    for _ in range(repeat):
+        timings: Dict[str, float] = {}
+        start = time.perf_counter()
+        output = preprocess_image_bytes(data, timings=timings, policy=policy, steps=steps)
+        runs.append((time.perf_counter() - start, timings))
+    return {
+        "total_ms": _ms(statistics.median(total for total, _ in runs)),
+        "stages_ms": {stage: _ms(statistics.median(timings[stage] for _, timings in runs)) for stage in runs[0][1]},
+        "output_bytes": len(output),
+    }
+
+
+def run_benchmark(paths: List[str], model: str, chains: List[List[str]], repeat: int) -> Dict:
+    report = {"model": model, "repeat": repeat, "images": {}}
+    for path in paths:
+        with open(path, "rb") as f:
+            data = f.read()
+        # The sized image every step sees after resize (no steps applied)
+        sized = preprocess_image_bytes(data, policy=sizing_policy(model), steps=[])
+        with Image.open(io.BytesIO(sized)) as img:
+            pixels = np.asarray(img.convert("RGB"))
+        report["images"][os.path.basename(path)] = {
+            "size": [pixels.shape[1], pixels.shape[0]],
+            "steps_ms": bench_steps(pixels, repeat),
+            "chains": {",".join(steps): bench_chain(data, model, steps, repeat) for steps in chains},
+        }
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Time the image preprocessing steps.")
+    parser.add_argument("--images", nargs="+", default=sorted(glob.glob(DEFAULT_IMAGES)))
+    parser.add_argument("--model", default="deepseek-ocr:latest", help="Model whose sizing policy to apply.")
+    parser.add_argument("--chain", action="append", help=f"Comma-separated steps to run end to end (repeatable). Default: {DEFAULT_CHAINS}")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    chains = [parse_steps(chain) for chain in (args.chain or DEFAULT_CHAINS)]
+    report = run_benchmark(args.images, args.model, chains, args.repeat)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,42 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
-from app.api.endpoints import ocr, models, benchmark
+from app.api.endpoints import ocr, models, benchmark, jobs
 from app.core.config import settings
+from app.core.preprocessing import preprocessing_stage
+from app.core.jobs import job_queue
+from app.core.ollama_pool import ollama_pool
+from app.core.storage import upload_storage
+from app.models.manager import manager
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from starlette.formparsers import MultiPartParser
+
+if settings.IN_MEMORY_PIPELINE:
+    # Starlette spools multipart files over 1MB to a temp file. This is a class attribute, so the
+    # larger in-RAM limit applies to every endpoint's uploads, not just the in-memory pipeline's.
+    MultiPartParser.spool_max_size = settings.UPLOAD_SPOOL_MAX_BYTES
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Startup
+    preprocessing_stage.start()
+    ollama_pool.start()
+    upload_storage.start()
+    if settings.WARMUP_ON_STARTUP:
+        manager.start_warmup()
+    await job_queue.start()
+    yield
+    # Shutdown
+    await upload_storage.shutdown()
+    await job_queue.shutdown()
+    await ollama_pool.shutdown()
+    preprocessing_stage.shutdown()
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
     version=settings.PROJECT_VERSION,
-    description="High-performance OCR API using VLM models"
+    description="High-performance OCR API using VLM models",
+    lifespan=lifespan
 )
 
 # Set all CORS enabled origins
@@ -24,6 +54,12 @@ if settings.BACKEND_CORS_ORIGINS:
 app.include_router(ocr.router, prefix="/api/v1/ocr", tags=["ocr"])
 app.include_router(models.router, prefix="/api/v1/models", tags=["models"])
 app.include_router(benchmark.router, prefix="/api/v1/benchmark", tags=["benchmark"])
+app.include_router(jobs.router, prefix="/api/v1/jobs", tags=["jobs"])
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus scrape endpoint."""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
 @app.get("/")
 def root():
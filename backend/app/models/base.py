@@ -1,7 +1,17 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, AsyncIterator, Union
 from pydantic import BaseModel
 
+# An image handed to a model: a file path, or the encoded image bytes (JPEG/PNG/WebP) kept in memory
+ImageInput = Union[str, bytes]
+
+def read_image_bytes(image: ImageInput) -> bytes:
+    """The encoded bytes of an image input (blocking for paths, run it in a thread from async code)."""
+    if isinstance(image, (bytes, bytearray)):
+        return bytes(image)
+    with open(image, "rb") as f:
+        return f.read()
+
 class OCRResult(BaseModel):
     text: str
     format: str  # 'plain', 'json', 'markdown'
@@ -9,9 +19,13 @@ class OCRResult(BaseModel):
     bounding_boxes: Optional[List[Dict[str, Any]]] = None  # For polygon visualization
 
 class BaseOCRModel(ABC):
+    # How long the backend should keep the model resident after a request (None = backend default).
+    # Set by ModelManager from its residency policy.
+    keep_alive: Optional[str] = None
+
     @abstractmethod
     async def load(self) -> None:
-        """Load the model into memory."""
+        """Load the model into memory. Raises if the model cannot be loaded."""
         pass
 
     @abstractmethod
@@ -19,18 +33,39 @@ class BaseOCRModel(ABC):
         """Unload the model to free resources."""
         pass
 
+    @property
+    def memory_bytes(self) -> int:
+        """Memory used by the model while resident, as last observed by load(). 0 if unknown."""
+        return 0
+
     @abstractmethod
-    async def process_image(self, image_path: str, prompt: Optional[str] = None, template: Optional[str] = None) -> OCRResult:
+    async def process_image(self, image: ImageInput, prompt: Optional[str] = None, template: Optional[str] = None, reasoning_model: Optional[str] = None, use_cache: bool = True) -> OCRResult:
         """
         Process an image and return extracted text/data.
         
         Args:
-            image_path: Path to the image file.
+            image: Path to the image file, or the encoded image bytes.
             prompt: Optional specific prompt to guide the model.
             template: Optional JSON template/schema to structure the output.
+            reasoning_model: Optional model for the template-mapping pass (models without one ignore it).
+            use_cache: False asks for a fresh run: no model-level memo is read or written.
         """
         pass
 
+    async def process_image_stream(self, image: ImageInput, prompt: Optional[str] = None, template: Optional[str] = None, reasoning_model: Optional[str] = None, use_cache: bool = True) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream OCR progress as events: {"event": "pass" | "token" | "result", "data": ...}.
+        The last event is always "result" carrying the full OCRResult.
+
+        Models without token streaming just emit the final result.
+        """
+        result = await self.process_image(image, prompt, template, reasoning_model, use_cache)
+        yield {"event": "result", "data": result}
+
+    def generation_options(self) -> Dict[str, Any]:
+        """Generation options that influence the output (used to build cache keys)."""
+        return {}
+
     @property
     @abstractmethod
     def model_name(self) -> str:
@@ -1,24 +1,72 @@
-from typing import Dict, List, Optional
-from app.models.base import BaseOCRModel
+import asyncio
+import logging
+import re
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from app.models.base import BaseOCRModel, ImageInput, OCRResult, read_image_bytes
 from app.models.ollama_adapter import OllamaAdapter
+from app.core.admission import PRIORITY_INTERACTIVE, admission
+from app.core.cache import result_cache, make_cache_key, request_scope
+from app.core.config import settings
+from app.core.metrics import CACHE_LOOKUPS, COALESCED
+from app.core.near_duplicates import near_duplicates
+from app.core.ollama_pool import OllamaBackendPool, ollama_pool
+from app.core.singleflight import single_flight
+
+logger = logging.getLogger(__name__)
+
+MODEL_LOAD_RETRY_MAX_SECONDS = 300
+_DURATION_UNITS = {"h": 3600, "m": 60, "s": 1, "ms": 0.001}
+
+def _keep_alive_seconds(keep_alive: str) -> Optional[float]:
+    """Seconds an idle model stays loaded for an Ollama keep_alive ("10m", "1h30m", "300"); None = forever."""
+    value = str(keep_alive).strip()
+    try:
+        seconds = float(value)
+    except ValueError:
+        parts = re.findall(r"(-?[\d.]+)(ms|h|m|s)", value)
+        if not parts:
+            return None  # Unparseable: don't guess that the model is gone
+        seconds = sum(float(number) * _DURATION_UNITS[unit] for number, unit in parts)
+    return None if seconds < 0 else seconds
 
 class ModelManager:
-    def __init__(self):
+    def __init__(self, ollama_host: Optional[str] = None):
         self._models: Dict[str, BaseOCRModel] = {}
         self._active_model_name: Optional[str] = None
+
+        # Residency: LRU of loaded models (name -> bytes), bounded by MODEL_MEMORY_BUDGET_GB
+        self._resident: "OrderedDict[str, int]" = OrderedDict()
+        self._last_used: Dict[str, float] = {}
+        # Failed loads: model -> (consecutive failures, monotonic time before which it isn't retried)
+        self._load_failures: Dict[str, Tuple[int, float]] = {}
+        self._residency_lock = asyncio.Lock()
+        self._memory_budget = int(settings.MODEL_MEMORY_BUDGET_GB * 1024**3)
+        self._warmup_task: Optional[asyncio.Task] = None
+
+        # Ollama backends: the shared multi-host pool, or a dedicated one when a host is given
+        self.pool = OllamaBackendPool([ollama_host]) if ollama_host else ollama_pool
         
         # Register default models
-        self.register_model(OllamaAdapter("deepseek-ocr:latest")) 
-        self.register_model(OllamaAdapter("qwen3-vl:8b"))
+        self.register_model(OllamaAdapter("deepseek-ocr:latest", pool=self.pool)) 
+        self.register_model(OllamaAdapter("qwen3-vl:8b", pool=self.pool))
         self._active_model_name = "deepseek-ocr:latest" # Set default active model
         # self.register_model(OllamaAdapter("llama3.2:3b")) # Text only, but good for testing
 
     def register_model(self, model: BaseOCRModel):
+        model.keep_alive = settings.MODEL_KEEP_ALIVE_OVERRIDES.get(model.model_name, settings.MODEL_KEEP_ALIVE)
         self._models[model.model_name] = model
 
-    def list_models(self) -> List[Dict[str, str]]:
+    def list_models(self) -> List[Dict[str, Any]]:
+        self._expire_idle()
         return [
-            {"name": name, "provider": model.provider, "active": name == self._active_model_name}
+            {
+                "name": name,
+                "provider": model.provider,
+                "active": name == self._active_model_name,
+                "resident": name in self._resident,
+            }
             for name, model in self._models.items()
         ]
 
@@ -37,6 +85,278 @@ class ModelManager:
              raise ValueError(f"Model {model_name} not registered")
         
         self._active_model_name = model_name
-        # Ideally, we load here or lazy load
+        # Warm the new active model in the background so the next request doesn't pay the load
+        self.start_warmup()
+
+    async def ensure_resident(self, model_name: str) -> None:
+        """
+        Make sure a model is loaded, evicting least-recently-used models if the memory budget is exceeded.
+        Load failures are logged, not raised: the request itself will surface the real error. A model
+        that failed to load isn't retried until its backoff passes, so a missing or broken model doesn't
+        hold the residency lock on every request.
+        """
+        self._expire_idle()
+        if self._mark_used(model_name) or self._load_backing_off(model_name):
+            return
+
+        async with self._residency_lock:
+            if self._mark_used(model_name) or self._load_backing_off(model_name):
+                return
+
+            model = await self.get_model(model_name)
+            try:
+                await model.load()
+            except Exception as e:
+                failures = self._load_failures.get(model_name, (0, 0.0))[0] + 1
+                delay = min(settings.MODEL_LOAD_RETRY_SECONDS * 2 ** (failures - 1), MODEL_LOAD_RETRY_MAX_SECONDS)
+                self._load_failures[model_name] = (failures, time.monotonic() + delay)
+                logger.warning(f"Failed to load model {model_name} ({failures} in a row), not retrying for {delay:.0f}s: {e}")
+                return
+
+            self._load_failures.pop(model_name, None)
+            self._resident[model_name] = model.memory_bytes
+            self._last_used[model_name] = time.monotonic()
+            await self._enforce_memory_budget(keep=model_name)
+
+    def _mark_used(self, model_name: str) -> bool:
+        """Refresh a resident model's LRU position and idle clock. False if it isn't resident."""
+        if model_name not in self._resident:
+            return False
+        self._resident.move_to_end(model_name)
+        self._last_used[model_name] = time.monotonic()
+        return True
+
+    def _load_backing_off(self, model_name: str) -> bool:
+        failure = self._load_failures.get(model_name)
+        return failure is not None and time.monotonic() < failure[1]
+
+    def _expire_idle(self) -> None:
+        """Forget models idle past their keep_alive: Ollama has unloaded them by now."""
+        now = time.monotonic()
+        for name in list(self._resident):
+            keep_alive = _keep_alive_seconds(self._models[name].keep_alive)
+            if keep_alive is not None and now - self._last_used.get(name, now) > keep_alive:
+                logger.info(f"Model {name} idle for longer than its keep_alive, no longer resident")
+                del self._resident[name]
+
+    async def evict(self, model_name: str) -> None:
+        # Unload even if we never tracked it: the backend may have loaded it on its own
+        self._resident.pop(model_name, None)
+        self._last_used.pop(model_name, None)
+        try:
+            await self._models[model_name].unload()
+        except Exception as e:
+            logger.warning(f"Failed to unload model {model_name}: {e}")
+
+    async def _enforce_memory_budget(self, keep: str) -> None:
+        if not self._memory_budget:
+            return
+        while sum(self._resident.values()) > self._memory_budget:
+            victim = next((name for name in self._resident if name != keep), None)
+            if victim is None:
+                logger.warning(f"Model {keep} alone exceeds the memory budget of {settings.MODEL_MEMORY_BUDGET_GB} GB")
+                return
+            logger.info(f"Evicting {victim} to stay within the {settings.MODEL_MEMORY_BUDGET_GB} GB memory budget")
+            await self.evict(victim)
+
+    def start_warmup(self) -> None:
+        """Load the active model in the background (called at startup and when the active model changes)."""
+        if not self._active_model_name:
+            return
+        self._warmup_task = asyncio.create_task(self.ensure_resident(self._active_model_name))
+
+    def residency_stats(self) -> Dict[str, Any]:
+        self._expire_idle()
+        return {
+            "resident": [
+                {"name": name, "memory_bytes": size, "keep_alive": self._models[name].keep_alive}
+                for name, size in self._resident.items()
+            ],
+            "resident_bytes": sum(self._resident.values()),
+            "memory_budget_bytes": self._memory_budget,
+        }
+
+    async def process_image(
+        self,
+        model_name: str,
+        image: ImageInput,
+        prompt: Optional[str] = None,
+        template: Optional[str] = None,
+        use_cache: bool = True,
+        reasoning_model: Optional[str] = None,
+        priority: str = PRIORITY_INTERACTIVE,
+        perceptual_hash: Optional[str] = None,
+    ) -> OCRResult:
+        """
+        Run OCR through the result cache.
+        Identical (image bytes, model, prompt, template, options) requests are served from cache,
+        and concurrent identical misses share one generation.
+        With a `perceptual_hash` (from preprocessing), a near-duplicate image of an earlier
+        request with the same inputs is served that request's result.
+        Misses wait for a model slot in the admission queue under `priority`.
+        """
+        model = await self.get_model(model_name)
+        key, cached = await self._lookup(model, image, prompt, template, use_cache, reasoning_model, perceptual_hash)
+        if cached is not None:
+            return cached
+        cache_status = "miss" if use_cache and result_cache.enabled else "bypass"
+
+        async def run() -> OCRResult:
+            result = await self._run(model, image, prompt, template, reasoning_model, priority, use_cache)
+            if cache_status == "miss":
+                await result_cache.set(key, result)
+            self._remember_near_duplicate(model, prompt, template, use_cache, reasoning_model, perceptual_hash, result)
+            return result
+
+        shared = False
+        if key is not None and settings.SINGLE_FLIGHT_ENABLED:
+            result, shared = await single_flight.do(key, run)
+            # Every caller gets its own copy: endpoints add their own timings to the metadata
+            result = result.model_copy(deep=True)
+            if shared:
+                COALESCED.labels(model=model_name).inc()
+        else:
+            result = await run()
+        result.metadata["cache"] = cache_status
+        result.metadata["coalesced"] = shared
+        return result
+
+    async def process_image_stream(
+        self,
+        model_name: str,
+        image: ImageInput,
+        prompt: Optional[str] = None,
+        template: Optional[str] = None,
+        use_cache: bool = True,
+        reasoning_model: Optional[str] = None,
+        priority: str = PRIORITY_INTERACTIVE,
+        perceptual_hash: Optional[str] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streaming counterpart of process_image.
+        A cache or near-duplicate hit, or the result of an identical request already in flight, is emitted as a single 'result' event.
+        """
+        model = await self.get_model(model_name)
+        key, cached = await self._lookup(model, image, prompt, template, use_cache, reasoning_model, perceptual_hash)
+        if cached is not None:
+            yield {"event": "result", "data": cached}
+            return
+        cache_status = "miss" if use_cache and result_cache.enabled else "bypass"
+
+        flight = None
+        while key is not None and settings.SINGLE_FLIGHT_ENABLED and flight is None:
+            existing = single_flight.get(key)
+            if existing is None:
+                # Lead: identical requests arriving while this one streams wait for its result
+                flight = single_flight.lead(key)
+                break
+            try:
+                result = await single_flight.wait(key, existing)
+            except asyncio.CancelledError:
+                if not single_flight.leader_gone(existing):
+                    raise
+                continue  # The leader's client went away; look again, maybe lead ourselves
+            result = result.model_copy(deep=True)
+            result.metadata["cache"] = cache_status
+            result.metadata["coalesced"] = True
+            COALESCED.labels(model=model_name).inc()
+            yield {"event": "result", "data": result}
+            return
+
+        try:
+            async with admission.slot(model_name, priority) as queue_wait:
+                await self.ensure_resident(model_name)
+                async for event in model.process_image_stream(image, prompt, template, reasoning_model, use_cache):
+                    if event["event"] == "result":
+                        result = event["data"]
+                        if cache_status == "miss":
+                            await result_cache.set(key, result)
+                        self._remember_near_duplicate(model, prompt, template, use_cache, reasoning_model, perceptual_hash, result)
+                        result.metadata["cache"] = cache_status
+                        result.metadata["coalesced"] = False
+                        result.metadata["queue_wait"] = queue_wait
+                        if flight:
+                            single_flight.land(key, flight, result.model_copy(deep=True))
+                    yield event
+        except BaseException as e:
+            if flight:
+                single_flight.land(key, flight, error=e)
+            raise
+        finally:
+            if flight:
+                # Ended without a result (no-op once landed): waiters run on their own
+                single_flight.land(key, flight, error=asyncio.CancelledError())
+
+    async def _lookup(
+        self,
+        model: BaseOCRModel,
+        image: ImageInput,
+        prompt: Optional[str],
+        template: Optional[str],
+        use_cache: bool,
+        reasoning_model: Optional[str],
+        perceptual_hash: Optional[str] = None,
+    ) -> Tuple[Optional[str], Optional[OCRResult]]:
+        """
+        The request's key, and its cached (or near-duplicate) result if there is one.
+        The key is None when the request must neither be cached nor shared (use_cache=False asks for a fresh run).
+        """
+        use_result_cache = use_cache and result_cache.enabled
+        use_near_duplicates = use_cache and near_duplicates.enabled and perceptual_hash is not None
+        if not use_result_cache:
+            result_cache.record_bypass()
+            CACHE_LOOKUPS.labels(cache="result", result="bypass").inc()
+            if not (use_cache and (settings.SINGLE_FLIGHT_ENABLED or use_near_duplicates)):
+                return None, None
+
+        image_bytes = await asyncio.to_thread(read_image_bytes, image)
+        options = _cache_options(model, template, reasoning_model)
+        key = make_cache_key(image_bytes, model.model_name, prompt, template, options)
+        if use_result_cache:
+            cached, source = await result_cache.get(key)
+            CACHE_LOOKUPS.labels(cache="result", result=source).inc()
+            if cached is not None:
+                cached.metadata["cache"] = f"hit_{source}"
+                return key, cached
+
+        if use_near_duplicates:
+            # Same inputs, different bytes: a re-compressed or resized re-upload of an earlier image
+            match = near_duplicates.lookup(perceptual_hash, request_scope(model.model_name, prompt, template, options))
+            CACHE_LOOKUPS.labels(cache="near_duplicate", result="hit" if match else "miss").inc()
+            if match is not None:
+                cached, similarity = match
+                cached.metadata["cache"] = "hit_near_duplicate"
+                cached.metadata["near_duplicate_similarity"] = similarity
+                return key, cached
+        return key, None
+
+    def _remember_near_duplicate(
+        self,
+        model: BaseOCRModel,
+        prompt: Optional[str],
+        template: Optional[str],
+        use_cache: bool,
+        reasoning_model: Optional[str],
+        perceptual_hash: Optional[str],
+        result: OCRResult,
+    ) -> None:
+        if use_cache and near_duplicates.enabled and perceptual_hash is not None:
+            scope = request_scope(model.model_name, prompt, template, _cache_options(model, template, reasoning_model))
+            near_duplicates.add(perceptual_hash, scope, result)
+
+    async def _run(self, model: BaseOCRModel, image: ImageInput, prompt: Optional[str], template: Optional[str], reasoning_model: Optional[str], priority: str, use_cache: bool) -> OCRResult:
+        # Admission caps simultaneous generations per model (Ollama serializes them internally anyway)
+        async with admission.slot(model.model_name, priority) as queue_wait:
+            await self.ensure_resident(model.model_name)
+            result = await model.process_image(image, prompt, template, reasoning_model, use_cache)
+        result.metadata["queue_wait"] = queue_wait
+        return result
+
+def _cache_options(model: BaseOCRModel, template: Optional[str], reasoning_model: Optional[str]) -> Dict[str, Any]:
+    options = model.generation_options()
+    if template:
+        # The mapping model changes template output, so it is part of the key
+        options["reasoning_model"] = reasoning_model or settings.REASONING_MODEL
+    return options
 
 manager = ModelManager()
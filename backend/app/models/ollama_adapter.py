@@ -1,17 +1,137 @@
 import logging
 import asyncio
-from typing import Dict, Any, List
+import base64
+import io
+import json
+from typing import Dict, Any, List, AsyncIterator, Optional, Tuple
 import ollama
-from app.models.base import BaseOCRModel, OCRResult
+from PIL import Image
+from app.models.base import BaseOCRModel, ImageInput, OCRResult, read_image_bytes
 from app.core.config import settings
+from app.core.cache import vision_text_cache
+from app.core.cancellation import DeadlineExceeded, iterate_with_deadline, sleep_within_deadline, with_deadline
+from app.core.circuit_breaker import circuit_breakers
+from app.core.micro_batch import MicroBatcher
+from app.core.document_types import MAPPING_LLM, MAPPING_RULES, RuleMapping, finish_llm_mapping, map_with_rules
+from app.core.metrics import CACHE_LOOKUPS, FALLBACKS, IMAGE_TOKENS, MODE_PLAIN, MODE_TEMPLATE, PASS2_BATCH_FALLBACKS, PASS2_BATCH_SIZE, RETRIES, TEMPLATE_MAPPINGS, TEMPLATE_OUTPUTS, request_mode, stage_timer
+from app.core.ollama_pool import OllamaBackendPool, normalize_model_name, ollama_pool
+from app.utils.hashing import sha256_bytes
+from app.utils.image_sizing import context_size, estimate_image_tokens, estimate_text_tokens, sizing_policy
+from app.utils.templates import conform_to_template, merge_fields, minify_template, parse_json_lenient, parse_template, subtemplate, template_schema
 
 logger = logging.getLogger(__name__)
 
+# DeepSeek specific optimization parameters
+DEFAULT_OPTIONS = {
+    "num_ctx": 4096, # Increased to handle complex templates + image (sized per request when ADAPTIVE_NUM_CTX is on)
+    "num_keep": 0, # CRITICAL: Fixes 'SameBatch' error by disabling system prompt caching
+    "temperature": 0.1,
+    "top_k": 50,
+    "top_p": 0.95,
+    "repeat_penalty": 1.1, # Prevent repetition loops
+}
+
+# "Describe" works better for DeepSeek-OCR to get all details including layout context without looping
+VISION_PROMPT = "Read all text in this image line by line. Output the text exactly as written. Do not summarize or describe. Just list the text found."
+
+# Optimized prompt for DeepSeek - "Describe" yields the best structural results
+DEFAULT_PROMPT = "Describe this image in detail."
+
+def _mapping_instructions(return_instruction: str) -> str:
+    return (
+        f"CRITICAL INSTRUCTIONS:\n"
+        f"1. FILL THE FIELDS. Do not return empty strings if data exists in the text.\n"
+        f"2. Map 'Name' or similar -> holder.name.en\n"
+        f"3. Map 'Date of Birth' -> holder.date_of_birth\n"
+        f"4. Map 'NID' or 10-17 digit number -> holder.nid_number\n"
+        f"5. Map 'Father Name' -> holder.father_name.en\n"
+        f"6. Map 'Mother Name' -> holder.mother_name.en\n"
+        f"7. {return_instruction}\n"
+        f"8. IMPORTANT: Return ONLY the JSON code. No markdown formatting.\n"
+        f"9. IF YOU SEE 'AL-AMIN ISLAM', PUT IT IN holder.name.en\n"
+        f"10. IF YOU SEE '03 Apr 1999' OR SIMILAR, PUT IT IN holder.date_of_birth\n"
+        f"11. IF YOU SEE '1234567890', PUT IT IN holder.nid_number\n\n"
+    )
+
+def _build_mapping_prompt(raw_text: str, minified_template: str) -> str:
+    return (
+        f"You are a smart data extractor.\n"
+        f"I have extracted text from an ID card:\n"
+        f"\"\"\"\n{raw_text}\n\"\"\"\n\n"
+        f"Your goal is to populate the following JSON template with the data above.\n"
+        f"{_mapping_instructions('Return the COMPLETE JSON with the values filled in.')}"
+        f"JSON Template:\n{minified_template}"
+    )
+
+def _build_batch_mapping_prompt(raw_texts: List[str], minified_template: str) -> str:
+    """One pass-2 prompt for several images: the template and instructions are sent (and evaluated) once."""
+    count = len(raw_texts)
+    documents = "".join(f"Document {i}:\n\"\"\"\n{text}\n\"\"\"\n\n" for i, text in enumerate(raw_texts, 1))
+    return (
+        f"You are a smart data extractor.\n"
+        f"I have extracted text from {count} ID cards, one document each:\n\n"
+        f"{documents}"
+        f"Your goal is to populate the following JSON template separately for each document above.\n"
+        f"{_mapping_instructions(f'Return a JSON array of {count} COMPLETE JSON objects with the values filled in, one per document, in document order.')}"
+        f"JSON Template:\n{minified_template}"
+    )
+
+def _build_fill_prompt(raw_text: str, fields_template: str) -> str:
+    return (
+        f"I have extracted text from an ID card:\n"
+        f"\"\"\"\n{raw_text}\n\"\"\"\n\n"
+        f"Fill in the following JSON fields with the data above. Leave a field empty if the text does not contain it.\n"
+        f"Return ONLY the JSON.\n\n"
+        f"JSON Fields:\n{fields_template}"
+    )
+
+def _output_format(template: str) -> Any:
+    """Ollama `format` for a template: its JSON Schema (structured output), or plain JSON mode."""
+    schema = template_schema(template) if settings.STRUCTURED_OUTPUT_ENABLED else None
+    return schema or "json"
+
+def _batch_output_format(output_format: Any, count: int) -> Any:
+    """Ollama `format` for a batched pass 2: an array of exactly `count` template objects."""
+    if output_format == "json":
+        return "json"
+    return {"type": "array", "items": output_format, "minItems": count, "maxItems": count}
+
+class BatchMappingError(ValueError):
+    """Raised to one image of a batched pass 2 whose output has no usable object for it."""
+    pass
+
+# Ollama generation counters surfaced in OCRResult.metadata (durations in nanoseconds)
+STAT_KEYS = ("total_duration", "load_duration", "prompt_eval_count", "prompt_eval_duration", "eval_count", "eval_duration")
+
+def _generation_stats(*responses) -> Dict[str, Any]:
+    """Sum Ollama's counters over one or more generate responses (e.g. both passes of a template run)."""
+    return {key: sum((response.get(key) or 0) for response in responses) for key in STAT_KEYS}
+
+def _encode_image(image: ImageInput) -> Tuple[str, str, Optional[Tuple[int, int]]]:
+    """
+    Base64 payload, content hash and pixel size of an image, computed once per request.
+    The ollama client passes a str through as-is, so retries and both passes reuse the
+    same payload instead of re-reading/re-encoding the file on every generate call.
+    """
+    data = read_image_bytes(image)
+    try:
+        # Only parses the header; the pixels are never decoded here
+        with Image.open(io.BytesIO(data)) as img:
+            size = img.size
+    except Exception:
+        size = None
+    return base64.b64encode(data).decode("ascii"), sha256_bytes(data), size
+
 class OllamaAdapter(BaseOCRModel):
-    def __init__(self, model_name: str):
+    def __init__(self, model_name: str, host: str = None, pool: OllamaBackendPool = None):
         self._model_name = model_name
-        # Set a very long timeout (600 seconds) to avoid timeouts on slow generations/loading
-        self.client = ollama.AsyncClient(host=settings.OLLAMA_BASE_URL, timeout=600)
+        # Every Ollama call goes through a backend pool; a single `host` gets a pool of its own
+        self.pool = pool or (OllamaBackendPool([host]) if host else ollama_pool)
+        self.options = dict(DEFAULT_OPTIONS)
+        self.keep_alive = settings.MODEL_KEEP_ALIVE
+        self._memory_bytes = 0
+        # Pass 2 of concurrent requests with the same template share one generation
+        self._mapping_batcher = MicroBatcher(settings.PASS2_BATCH_WINDOW_MS / 1000, settings.PASS2_BATCH_MAX_SIZE, self._flush_mappings)
 
     @property
     def model_name(self) -> str:
@@ -22,129 +142,369 @@ class OllamaAdapter(BaseOCRModel):
         return "ollama"
 
     async def load(self) -> None:
-        # Ollama loads models on demand usually, but we can pull it to ensure it exists
+        # A generate call without a prompt makes Ollama load the model and keep it for `keep_alive`
+        async with self.pool.acquire(self._model_name) as host:
+            logger.info(f"Loading model {self._model_name} on {host.url} (keep_alive={self.keep_alive})...")
+            try:
+                await host.client.generate(model=self._model_name, keep_alive=self.keep_alive)
+            except ollama.ResponseError as e:
+                if e.status_code != 404:
+                    raise
+                # Not pulled on this host yet
+                logger.info(f"Model {self._model_name} not found on {host.url}, pulling...")
+                await host.client.pull(self._model_name)
+                await host.client.generate(model=self._model_name, keep_alive=self.keep_alive)
+
+        self._memory_bytes = await self.pool.resident_size(self._model_name)
+        logger.info(f"Model {self._model_name} resident ({self._memory_bytes / 1024**3:.2f} GB).")
+
+    async def unload(self) -> None:
+        # keep_alive=0 tells Ollama to evict the model immediately
+        logger.info(f"Unloading model {self._model_name}...")
+        await self.pool.unload_everywhere(self._model_name)
+
+    @property
+    def memory_bytes(self) -> int:
+        return self._memory_bytes
+
+    async def _reset_after_same_batch(self, error: Exception) -> None:
+        """
+        Ollama's runner occasionally ends up in a bad batch state ('SameBatch' errors) after
+        image prompts. Instead of unloading after every request, only reset the runner when it happens.
+        """
+        if "samebatch" not in str(error).lower():
+            return
+        logger.warning(f"SameBatch error on {self._model_name}, reloading model before retrying")
         try:
-            logger.info(f"Pulling model {self._model_name} from {settings.OLLAMA_BASE_URL}...")
-            await self.client.pull(self._model_name)
-            logger.info(f"Model {self._model_name} ready.")
+            await self.unload()
         except Exception as e:
-            logger.error(f"Error pulling model {self._model_name}: {e}", exc_info=True)
+            logger.warning(f"Failed to unload {self._model_name} after SameBatch error: {e}")
 
-    async def unload(self) -> None:
-        # Ollama manages its own memory
-        pass
+    def generation_options(self) -> Dict[str, Any]:
+        return dict(self.options)
 
-    async def process_image(self, image_path: str, prompt: str = None, template: str = None) -> OCRResult:
-        format_type = "html" # Default
-        
-        # DeepSeek specific optimization parameters
-        options = {
-            "num_ctx": 4096, # Increased to handle complex templates + image
-            "num_keep": 0, # CRITICAL: Fixes 'SameBatch' error by disabling system prompt caching
-            "temperature": 0.1,
-            "top_k": 50,
-            "top_p": 0.95,
-            "repeat_penalty": 1.1, # Prevent repetition loops
+    def _image_tokens(self, image_size: Optional[Tuple[int, int]]) -> int:
+        """Estimated vision tokens of the request's image (0 when its size is unknown)."""
+        if not image_size:
+            return 0
+        tokens = estimate_image_tokens(*image_size, sizing_policy(self._model_name))
+        IMAGE_TOKENS.labels(model=self._model_name).observe(tokens)
+        return tokens
+
+    def _sized_options(self, options: Dict[str, Any], image_tokens: int, *texts: str) -> Dict[str, Any]:
+        """Options for one generation, with num_ctx sized for its image and prompt instead of a fixed 4096."""
+        if not settings.ADAPTIVE_NUM_CTX:
+            return options
+        return {**options, "num_ctx": context_size(image_tokens + estimate_text_tokens(*texts))}
+
+    def _rule_mapping(self, template: str, raw_text: str) -> Optional[RuleMapping]:
+        """Map pass-1 text onto a known document type's template by rules. None if no type handles it."""
+        if not settings.RULE_MAPPING_ENABLED:
+            return None
+        rules = map_with_rules(template, raw_text, ocr_engine=self._model_name)
+        if rules and rules.missing:
+            logger.info(f"Rules for {rules.document_type} left {rules.missing} empty, running pass 2")
+        return rules
+
+    def _finish_mapping(self, template: str, raw_text: str, content: str, rules: Optional[RuleMapping]) -> Tuple[str, Dict[str, Any]]:
+        """Final JSON and mapping metadata: which path produced it, and what the rules could not fill."""
+        if rules is not None and not rules.missing:
+            path, document_type = MAPPING_RULES, rules.document_type
+        else:
+            path, document_type = MAPPING_LLM, None
+            if settings.RULE_MAPPING_ENABLED:
+                content, document_type = finish_llm_mapping(template, raw_text, content)
+        TEMPLATE_MAPPINGS.labels(document_type=document_type or "unknown", path=path).inc()
+        return content, {
+            "mapping_path": path,
+            "document_type": document_type,
+            "rules_missing": rules.missing if rules is not None else None,
         }
 
+    def _vision_cache_key(self, image_hash: str) -> str:
+        return f"{image_hash}|{self._model_name}|{VISION_PROMPT}"
+
+    async def _vision_pass(self, image_b64: str, image_hash: str, options: Dict[str, Any], use_cache: bool = True):
+        """
+        Pass 1 of template extraction: read all text from the image.
+        Returns (text, generation stats, cache hit). Results are memoized so retries and
+        template edits on the same image only pay for pass 2; use_cache=False bypasses the memo.
+        """
+        cache_key = self._vision_cache_key(image_hash)
+        cached = vision_text_cache.get(cache_key) if use_cache else None
+        CACHE_LOOKUPS.labels(cache="vision_text", result="bypass" if not use_cache else "miss" if cached is None else "hit").inc()
+        if cached is not None:
+            logger.info(f"Pass 1 cache hit for {self._model_name}, skipping vision extraction")
+            # No generation happened, so nothing to add to the stats
+            return cached, {}, True
+
+        retries = 3
+        last_exception = None
+        for attempt in range(retries):
+            try:
+                logger.info(f"Starting Pass 1: Vision Extraction (Attempt {attempt + 1})...")
+                with stage_timer("pass1_vision", self._model_name, MODE_TEMPLATE):
+                    vision_response = await self.pool.generate(
+                        model=self._model_name,
+                        prompt=VISION_PROMPT,
+                        images=[image_b64],
+                        options=options,
+                        keep_alive=self.keep_alive,
+                    )
+                raw_text = vision_response['response']
+                logger.info(f"Pass 1 Complete. Extracted text length: {len(raw_text)}")
+                if use_cache and raw_text.strip():
+                    vision_text_cache.set(cache_key, raw_text)
+                return raw_text, vision_response, False
+            except DeadlineExceeded:
+                # Out of time: neither retry nor fall back
+                raise
+            except Exception as e:
+                logger.warning(f"Pass 1 attempt {attempt + 1} failed: {repr(e)}")
+                last_exception = e
+                await self._reset_after_same_batch(e)
+                if attempt < retries - 1:
+                    await self._backoff(attempt, "pass1_vision", MODE_TEMPLATE)
+
+        logger.error(f"Vision extraction failed after {retries} attempts: {repr(last_exception)}", exc_info=True)
+        raise RuntimeError(f"Ollama two-pass inference failed: {repr(last_exception)}")
+
+    async def _backoff(self, attempt: int, stage: str, mode: str) -> None:
+        """Exponential backoff (1s, 2s, 4s) before retrying `stage`, bounded by the request deadline."""
+        RETRIES.labels(model=self._model_name, stage=stage).inc()
+        with stage_timer("retry_backoff", self._model_name, mode):
+            await sleep_within_deadline(2 ** attempt)
+
+    async def _reasoning_candidates(self, reasoning_model: str = None) -> List[str]:
+        """
+        Models to try for pass 2, in order. The reasoning model is skipped up front when it is
+        not pulled on any backend host or its circuit breaker is open; the vision model is always the last resort.
+        """
+        preferred = reasoning_model or settings.REASONING_MODEL
+        if normalize_model_name(preferred) == normalize_model_name(self._model_name):
+            return [self._model_name]
+
+        if await self.pool.has_model(preferred) is False:
+            logger.info(f"Reasoning model {preferred} is not pulled on any backend, using {self._model_name}")
+            return [self._model_name]
+        if not circuit_breakers.get(preferred).allow():
+            logger.info(f"Circuit for {preferred} is open, using {self._model_name}")
+            return [self._model_name]
+        return [preferred, self._model_name]
+
+    async def _mapping_pass(self, mapping_prompt: str, options: Dict[str, Any], reasoning_model: str = None, output_format: Any = "json"):
+        """Pass 2 of template extraction: map the vision text onto the JSON template. Returns (response, model used)."""
+        candidates = await self._reasoning_candidates(reasoning_model)
+        for model in candidates:
+            logger.info(f"Starting Pass 2: JSON Mapping using {model}...")
+            try:
+                with stage_timer("pass2_mapping", model, MODE_TEMPLATE):
+                    response = await self.pool.generate(
+                        model=model,
+                        prompt=mapping_prompt,
+                        format=output_format,
+                        options=options,
+                        keep_alive=self.keep_alive,
+                    )
+            except DeadlineExceeded:
+                raise
+            except Exception as e:
+                if model == candidates[-1]:
+                    raise
+                circuit_breakers.get(model).record_failure()
+                FALLBACKS.labels(model=model).inc()
+                logger.warning(f"Failed to use {model}, falling back to {candidates[-1]}: {e}")
+                continue
+            finally:
+                if model != self._model_name:
+                    # Cancelled or out of time: no verdict on the model, so a half-open circuit may try again
+                    circuit_breakers.get(model).release_trial()
+            if model != self._model_name:
+                circuit_breakers.get(model).record_success()
+            return response, model
+
+    async def _batched_mapping_pass(self, raw_text: str, template: str, reasoning_model: str = None) -> Optional[Tuple[Dict[str, Any], str, int, int]]:
+        """
+        Pass 2 through the micro-batcher. Returns (response, model used, batch size, num_ctx), where
+        the response holds this image's JSON and its share of the generation's counters and num_ctx
+        is that of the batch generation. None when the batch output had nothing usable for this
+        image (the caller maps it on its own).
+        Generation failures are raised like those of a per-image pass.
+        """
+        try:
+            return await self._mapping_batcher.submit((template, reasoning_model), raw_text)
+        except BatchMappingError as e:
+            PASS2_BATCH_FALLBACKS.labels(model=self._model_name).inc()
+            logger.warning(f"{e}, mapping this image on its own")
+            return None
+
+    async def _flush_mappings(self, key: Tuple[str, Optional[str]], raw_texts: List[str]) -> List[Any]:
+        """Run one pass-2 generation for the texts collected by the batcher and split its JSON array per image."""
+        template, reasoning_model = key
+        minified_template = minify_template(template)
+        output_format = _output_format(template)
+        count = len(raw_texts)
+        if count == 1:
+            prompt = _build_mapping_prompt(raw_texts[0], minified_template)
+        else:
+            prompt = _build_batch_mapping_prompt(raw_texts, minified_template)
+            output_format = _batch_output_format(output_format, count)
+        # Room for one answer is reserved by default; each further answer is about one template long
+        options = self._sized_options(dict(self.options), 0, prompt, *[minified_template] * (count - 1))
+        response, model = await self._mapping_pass(prompt, options, reasoning_model, output_format)
+        PASS2_BATCH_SIZE.labels(model=model).observe(count)
+        if count == 1:
+            return [(response, model, 1, options["num_ctx"])]
+
+        logger.info(f"Pass 2 mapped {count} images in one generation using {model}")
+        items = parse_json_lenient(response["response"])
+        if not isinstance(items, list):
+            return [BatchMappingError("Batched pass 2 output is not a JSON array")] * count
+        # Each image is charged an equal share of the generation
+        share = {stat: (response.get(stat) or 0) // count for stat in STAT_KEYS}
+        return [
+            ({**share, "response": json.dumps(items[i], ensure_ascii=False)}, model, count, options["num_ctx"])
+            if i < len(items) and isinstance(items[i], dict)
+            else BatchMappingError(f"Batched pass 2 output has no object for image {i + 1} of {count}")
+            for i in range(count)
+        ]
+
+    async def _complete_mapping(self, content: str, template: str, raw_text: str, options: Dict[str, Any], model: str) -> Tuple[str, List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        Validate pass-2 output against the template and repair it locally. Fields the output
+        lacks are re-requested on their own in one small generation instead of re-running the pass.
+        Returns (JSON text, extra responses, metadata). Raises ValueError if the output isn't JSON at all.
+        """
+        data = parse_json_lenient(content)
+        if data is None:
+            TEMPLATE_OUTPUTS.labels(outcome="invalid").inc()
+            raise ValueError("Pass 2 output is not valid JSON")
+        parsed_template = parse_template(template)
+        if parsed_template is None:
+            # Free-form template: nothing to validate against
+            return json.dumps(data, ensure_ascii=False), [], {}
+
+        try:
+            json.loads(content)
+            outcome = "valid"
+        except ValueError:
+            outcome = "repaired"
+        data, missing = conform_to_template(data, parsed_template)
+        refilled, responses = list(missing), []
+        if missing and settings.REFILL_MISSING_FIELDS:
+            outcome = "refilled"
+            fields_template = json.dumps(subtemplate(parsed_template, missing), ensure_ascii=False)
+            fill_prompt = _build_fill_prompt(raw_text, fields_template)
+            logger.info(f"Pass 2 output lacks {len(missing)} fields, re-requesting only those from {model}")
+            try:
+                with stage_timer("pass2_refill", model, MODE_TEMPLATE):
+                    response = await self.pool.generate(
+                        model=model,
+                        prompt=fill_prompt,
+                        format=_output_format(fields_template),
+                        options=self._sized_options(options, 0, fill_prompt),
+                        keep_alive=self.keep_alive,
+                    )
+                responses.append(response)
+                filled, missing = conform_to_template(parse_json_lenient(response["response"]), json.loads(fields_template))
+                merge_fields(data, filled, [path for path in refilled if path not in missing])
+            except DeadlineExceeded:
+                raise
+            except Exception as e:
+                # The template's own values stay in place; not worth failing the request over
+                logger.warning(f"Re-requesting missing fields failed: {repr(e)}")
+        TEMPLATE_OUTPUTS.labels(outcome=outcome).inc()
+        return json.dumps(data, ensure_ascii=False), responses, {"fields_refilled": refilled, "fields_missing": missing}
+
+    async def process_image(self, image: ImageInput, prompt: str = None, template: str = None, reasoning_model: str = None, use_cache: bool = True) -> OCRResult:
+        format_type = "html" # Default
+        options = dict(self.options)
+        mode = request_mode(prompt, template)
+        image_b64, image_hash, image_size = await asyncio.to_thread(_encode_image, image)
+        image_tokens = self._image_tokens(image_size)
+        sizing = {"image_size": image_size, "image_tokens_estimate": image_tokens}
+
         if template:
             # Minify template to save tokens
-            minified_template = "".join(line.strip() for line in template.splitlines())
+            minified_template = minify_template(template)
             
+            # Pass 1: Vision Extraction (memoized per image + vision model + prompt)
+            vision_options = self._sized_options(options, image_tokens, VISION_PROMPT)
+            raw_text, vision_stats, vision_cache_hit = await self._vision_pass(image_b64, image_hash, vision_options, use_cache)
+
+            # Known document types are mapped by rules; the LLM only runs when mandatory fields are missing
+            rules = self._rule_mapping(template, raw_text)
+            if rules is not None and not rules.missing:
+                content, mapping = self._finish_mapping(template, raw_text, json.dumps(rules.data, ensure_ascii=False), rules)
+                return OCRResult(
+                    text=content,
+                    format="json",
+                    metadata={
+                        **_generation_stats(vision_stats),
+                        "vision_text": raw_text,
+                        "vision_cache_hit": vision_cache_hit,
+                        "reasoning_model": None,
+                        **mapping,
+                        **sizing,
+                        "num_ctx": vision_options["num_ctx"],
+                    }
+                )
+
+            # Pass 2: Reasoning - Map text to JSON. Retries only re-run this pass.
+            mapping_prompt = _build_mapping_prompt(raw_text, minified_template)
+            mapping_options = self._sized_options(options, 0, mapping_prompt)
+            output_format = _output_format(template)
             retries = 3
             last_exception = None
-            
+
             for attempt in range(retries):
                 try:
-                    # Pass 1: Vision Extraction
-                    logger.info(f"Starting Pass 1: Vision Extraction (Attempt {attempt + 1})...")
-                    # "Describe" works better for DeepSeek-OCR to get all details including layout context without looping
-                    vision_prompt = "Read all text in this image line by line. Output the text exactly as written. Do not summarize or describe. Just list the text found."
-                    
-                    vision_response = await self.client.generate(
-                        model=self._model_name,
-                        prompt=vision_prompt,
-                        images=[image_path],
-                        options=options,
-                    )
-                    raw_text = vision_response['response']
-                    logger.info(f"Pass 1 Complete. Extracted text length: {len(raw_text)}")
-                    
-                    # Pass 2: Reasoning - Map text to JSON
-                    # Use a specialized reasoning model if available, otherwise fall back to the same model
-                    # qwen3:4b is a strong text model for structured extraction
-                    reasoning_model = "qwen3:4b-instruct" 
-                    logger.info(f"Starting Pass 2: JSON Mapping using {reasoning_model}...")
-                    
-                    mapping_prompt = (
-                        f"You are a smart data extractor.\n"
-                        f"I have extracted text from an ID card:\n"
-                        f"\"\"\"\n{raw_text}\n\"\"\"\n\n"
-                        f"Your goal is to populate the following JSON template with the data above.\n"
-                        f"CRITICAL INSTRUCTIONS:\n"
-                        f"1. FILL THE FIELDS. Do not return empty strings if data exists in the text.\n"
-                        f"2. Map 'Name' or similar -> holder.name.en\n"
-                        f"3. Map 'Date of Birth' -> holder.date_of_birth\n"
-                        f"4. Map 'NID' or 10-17 digit number -> holder.nid_number\n"
-                        f"5. Map 'Father Name' -> holder.father_name.en\n"
-                        f"6. Map 'Mother Name' -> holder.mother_name.en\n"
-                        f"7. Return the COMPLETE JSON with the values filled in.\n"
-                        f"8. IMPORTANT: Return ONLY the JSON code. No markdown formatting.\n"
-                        f"9. IF YOU SEE 'AL-AMIN ISLAM', PUT IT IN holder.name.en\n"
-                        f"10. IF YOU SEE '03 Apr 1999' OR SIMILAR, PUT IT IN holder.date_of_birth\n"
-                        f"11. IF YOU SEE '1234567890', PUT IT IN holder.nid_number\n\n"
-                        f"JSON Template:\n{minified_template}"
-                    )
-                    
-                    # Ensure the reasoning model is available (pull if needed, but we assume it's there or will failover)
-                    # We'll try using the specified reasoning model
-                    try:
-                        response = await self.client.generate(
-                            model=reasoning_model,
-                            prompt=mapping_prompt,
-                            format="json", 
-                            options=options,
-                        )
-                    except Exception as e:
-                        logger.warning(f"Failed to use {reasoning_model}, falling back to {self._model_name}: {e}")
-                        response = await self.client.generate(
-                            model=self._model_name,
-                            prompt=mapping_prompt,
-                            format="json",
-                            options=options,
-                        )
-
-                    content = response['response']
-                    # Clean up potential markdown code blocks
-                    if "```json" in content:
-                        content = content.split("```json")[1].split("```")[0].strip()
-                    elif "```" in content:
-                        content = content.split("```")[1].strip()
-                    
-                    # Combine stats
-                    total_duration = (vision_response.get('total_duration') or 0) + (response.get('total_duration') or 0)
-                    
+                    # The first attempt joins a pass-2 batch; retries and unusable batch outputs run on their own
+                    batched = None
+                    if attempt == 0 and settings.PASS2_BATCH_WINDOW_MS > 0:
+                        batched = await self._batched_mapping_pass(raw_text, template, reasoning_model)
+                    if batched is not None:
+                        response, used_model, batch_size, mapping_num_ctx = batched
+                    else:
+                        response, used_model = await self._mapping_pass(mapping_prompt, mapping_options, reasoning_model, output_format)
+                        batch_size, mapping_num_ctx = 1, mapping_options["num_ctx"]
+                    # Output that isn't JSON at all is worth a retry of this pass; anything else is repaired
+                    content, refill_responses, repair = await self._complete_mapping(response['response'], template, raw_text, options, used_model)
+                    content, mapping = self._finish_mapping(template, raw_text, content, rules)
+
                     return OCRResult(
                         text=content,
                         format="json",
                         metadata={
-                            "total_duration": total_duration,
-                            "vision_text": raw_text # Store intermediate text for debugging
+                            **_generation_stats(vision_stats, response, *refill_responses), # Combine stats
+                            "vision_text": raw_text, # Store intermediate text for debugging
+                            "vision_cache_hit": vision_cache_hit,
+                            "reasoning_model": used_model,
+                            "structured_output": output_format != "json",
+                            **repair,
+                            **mapping,
+                            **sizing,
+                            "num_ctx": vision_options["num_ctx"],
+                            "mapping_num_ctx": mapping_num_ctx,
+                            "mapping_batch_size": batch_size,
                         }
                     )
+                except DeadlineExceeded:
+                    raise
                 except Exception as e:
-                    logger.warning(f"Two-pass attempt {attempt + 1} failed: {repr(e)}")
+                    logger.warning(f"Pass 2 attempt {attempt + 1} failed: {repr(e)}")
                     last_exception = e
+                    await self._reset_after_same_batch(e)
                     if attempt < retries - 1:
-                        await asyncio.sleep(2 ** attempt) # Exponential backoff
+                        await self._backoff(attempt, "pass2_mapping", mode)
             
             logger.error(f"Two-pass extraction failed after {retries} attempts: {repr(last_exception)}", exc_info=True)
             raise RuntimeError(f"Ollama two-pass inference failed: {repr(last_exception)}")
 
         elif not prompt:
-            # Optimized prompt for DeepSeek - "Describe" yields the best structural results
-            prompt = "Describe this image in detail."
+            prompt = DEFAULT_PROMPT
             format_type = "text" # Returns Markdown-formatted text
+        options = self._sized_options(options, image_tokens, prompt)
         
         retries = 3
         last_exception = None
@@ -153,34 +513,202 @@ class OllamaAdapter(BaseOCRModel):
             try:
                 logger.info(f"Processing image with model {self._model_name} (Attempt {attempt + 1}/{retries})...")
                 
-                # Use Generate API instead of Chat to avoid context state issues (SameBatch error)
-                response = await self.client.generate(
-                    model=self._model_name,
-                    prompt=prompt,
-                    images=[image_path],
-                    options=options,
-                    format="json" if format_type == "json" else None,
-                    keep_alive=0 # Force model unload to prevent bad context state
-                )
+                # Use Generate API instead of Chat to avoid context state issues (SameBatch error).
+                # The model stays warm; SameBatch errors are handled by resetting the runner on retry.
+                with stage_timer("generate", self._model_name, mode):
+                    response = await self.pool.generate(
+                        model=self._model_name,
+                        prompt=prompt,
+                        images=[image_b64],
+                        options=options,
+                        format="json" if format_type == "json" else None,
+                        keep_alive=self.keep_alive
+                    )
                 
                 content = response['response']
                 
                 return OCRResult(
                     text=content,
                     format=format_type,
-                    metadata={
-                        "total_duration": response.get('total_duration'),
-                        "load_duration": response.get('load_duration'),
-                        "prompt_eval_count": response.get('prompt_eval_count'),
-                        "eval_count": response.get('eval_count')
-                    }
+                    metadata={**_generation_stats(response), **sizing, "num_ctx": options["num_ctx"]}
                 )
+            except DeadlineExceeded:
+                raise
             except Exception as e:
                 logger.warning(f"Attempt {attempt + 1} failed: {e}")
                 last_exception = e
+                await self._reset_after_same_batch(e)
                 # Retry on connection errors or timeouts
                 if attempt < retries - 1:
-                    await asyncio.sleep(2 ** attempt)  # Exponential backoff: 1s, 2s, 4s
+                    await self._backoff(attempt, "generate", mode)
                 
         logger.error(f"Ollama inference failed after {retries} attempts: {str(last_exception)}", exc_info=True)
         raise RuntimeError(f"Ollama inference failed: {str(last_exception)}")
+
+    async def process_image_stream(self, image: ImageInput, prompt: str = None, template: str = None, reasoning_model: str = None, use_cache: bool = True) -> AsyncIterator[Dict[str, Any]]:
+        options = dict(self.options)
+        image_b64, image_hash, image_size = await asyncio.to_thread(_encode_image, image)
+        image_tokens = self._image_tokens(image_size)
+        sizing = {"image_size": image_size, "image_tokens_estimate": image_tokens}
+
+        if template:
+            minified_template = minify_template(template)
+
+            # Pass 1: Vision Extraction, streamed as plain text (or replayed from the memo in one chunk)
+            cache_key = self._vision_cache_key(image_hash)
+            raw_text = vision_text_cache.get(cache_key) if use_cache else None
+            vision_cache_hit = raw_text is not None
+            CACHE_LOOKUPS.labels(cache="vision_text", result="bypass" if not use_cache else "hit" if vision_cache_hit else "miss").inc()
+            yield {"event": "pass", "data": {"pass": 1, "model": self._model_name, "cached": vision_cache_hit}}
+            vision = {}
+            vision_options = self._sized_options(options, image_tokens, VISION_PROMPT)
+            if vision_cache_hit:
+                yield {"event": "token", "data": {"pass": 1, "text": raw_text}}
+            else:
+                async for event in self._stream_generate(
+                    vision, 1, stage="pass1_vision", mode=MODE_TEMPLATE,
+                    model=self._model_name, prompt=VISION_PROMPT, images=[image_b64], options=vision_options
+                ):
+                    yield event
+                raw_text = vision["response"]
+                if use_cache and raw_text.strip():
+                    vision_text_cache.set(cache_key, raw_text)
+
+            rules = self._rule_mapping(template, raw_text)
+            if rules is not None and not rules.missing:
+                content, mapping = self._finish_mapping(template, raw_text, json.dumps(rules.data, ensure_ascii=False), rules)
+                yield {"event": "pass", "data": {"pass": 2, "model": MAPPING_RULES}}
+                yield {
+                    "event": "result",
+                    "data": OCRResult(
+                        text=content,
+                        format="json",
+                        metadata={
+                            **_generation_stats(vision),
+                            "vision_text": raw_text,
+                            "vision_cache_hit": vision_cache_hit,
+                            "reasoning_model": None,
+                            **mapping,
+                            **sizing,
+                            "num_ctx": vision_options["num_ctx"],
+                        },
+                    ),
+                }
+                return
+
+            # Pass 2: JSON mapping, streamed as it is generated
+            mapping_prompt = _build_mapping_prompt(raw_text, minified_template)
+            mapping_options = self._sized_options(options, 0, mapping_prompt)
+            output_format = _output_format(template)
+            candidates = await self._reasoning_candidates(reasoning_model)
+            for model in candidates:
+                is_fallback = model != candidates[0]
+                yield {"event": "pass", "data": {"pass": 2, "model": model, "fallback": is_fallback}}
+                mapping = {}
+                try:
+                    async for event in self._stream_generate(
+                        mapping, 2, retries=1 if model != candidates[-1] else 3, stage="pass2_mapping", mode=MODE_TEMPLATE,
+                        model=model, prompt=mapping_prompt, format=output_format, options=mapping_options
+                    ):
+                        yield event
+                except DeadlineExceeded:
+                    raise
+                except Exception as e:
+                    # Tokens already sent can't be taken back, so only fall back if nothing was streamed
+                    if mapping.get("streamed") or model == candidates[-1]:
+                        raise
+                    circuit_breakers.get(model).record_failure()
+                    FALLBACKS.labels(model=model).inc()
+                    logger.warning(f"Failed to use {model}, falling back to {candidates[-1]}: {e}")
+                    continue
+                finally:
+                    if model != self._model_name:
+                        circuit_breakers.get(model).release_trial()
+                if model != self._model_name:
+                    circuit_breakers.get(model).record_success()
+                used_model = model
+                break
+
+            content, refill_responses, repair = await self._complete_mapping(mapping["response"], template, raw_text, options, used_model)
+            content, mapping_info = self._finish_mapping(template, raw_text, content, rules)
+            yield {
+                "event": "result",
+                "data": OCRResult(
+                    text=content,
+                    format="json",
+                    metadata={
+                        **_generation_stats(vision, mapping, *refill_responses),
+                        "vision_text": raw_text,
+                        "vision_cache_hit": vision_cache_hit,
+                        "reasoning_model": used_model,
+                        "structured_output": output_format != "json",
+                        **repair,
+                        **mapping_info,
+                        **sizing,
+                        "num_ctx": vision_options["num_ctx"],
+                        "mapping_num_ctx": mapping_options["num_ctx"],
+                    },
+                ),
+            }
+            return
+
+        format_type = "html"
+        mode = request_mode(prompt, template)
+        if not prompt:
+            prompt = DEFAULT_PROMPT
+            format_type = "text"
+        options = self._sized_options(options, image_tokens, prompt)
+
+        yield {"event": "pass", "data": {"pass": 1, "model": self._model_name}}
+        final = {}
+        async for event in self._stream_generate(
+            final, 1, stage="generate", mode=mode, model=self._model_name, prompt=prompt, images=[image_b64], options=options
+        ):
+            yield event
+
+        yield {
+            "event": "result",
+            "data": OCRResult(
+                text=final["response"],
+                format=format_type,
+                metadata={**_generation_stats(final), **sizing, "num_ctx": options["num_ctx"]},
+            ),
+        }
+
+    async def _stream_generate(
+        self, sink: Dict[str, Any], pass_number: int, retries: int = 3, stage: str = "generate", mode: str = MODE_PLAIN, **kwargs
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streaming generate that yields token events and fills `sink` with the full response and final stats.
+        Retries only while nothing has been streamed yet; after the first token an error is raised as-is.
+        `stage` and `mode` label the latency and retry metrics.
+        """
+        last_exception = None
+        for attempt in range(retries):
+            parts = []
+            try:
+                # The host stays acquired for the whole stream so its outstanding count is accurate
+                with stage_timer(stage, kwargs.get("model", self._model_name), mode):
+                    async with self.pool.acquire(kwargs.get("model", self._model_name)) as host:
+                        stream = await with_deadline(host.client.generate(stream=True, keep_alive=self.keep_alive, **kwargs))
+                        async for chunk in iterate_with_deadline(stream):
+                            if chunk.response:
+                                sink["streamed"] = True
+                                parts.append(chunk.response)
+                                yield {"event": "token", "data": {"pass": pass_number, "text": chunk.response}}
+                            if chunk.done:
+                                sink.update({key: chunk.get(key) for key in STAT_KEYS})
+                sink["response"] = "".join(parts)
+                return
+            except DeadlineExceeded:
+                raise
+            except Exception as e:
+                if sink.get("streamed"):
+                    raise
+                logger.warning(f"Streaming attempt {attempt + 1} on {kwargs.get('model')} failed: {e}")
+                last_exception = e
+                await self._reset_after_same_batch(e)
+                if attempt < retries - 1:
+                    await self._backoff(attempt, stage, mode)
+
+        raise RuntimeError(f"Ollama streaming inference failed: {str(last_exception)}")
@@ -0,0 +1,138 @@
+import io
+import math
+import re
+from difflib import SequenceMatcher
+from typing import List, Tuple
+
+from PIL import Image
+
+PDF_CONTENT_TYPES = ["application/pdf"]
+
+# (left, top, right, bottom) in page pixels
+Box = Tuple[int, int, int, int]
+
+# Lines compared when looking for text repeated across the overlap of two tiles
+OVERLAP_MAX_LINES = 8
+# Lines cut by a tile edge are read slightly differently on each side; this close counts as the same line
+OVERLAP_LINE_SIMILARITY = 0.85
+
+
+class DocumentError(Exception):
+    """Raised for documents that can't be split into pages (corrupt, too many pages, no PDF support)."""
+    pass
+
+
+def is_pdf(data: bytes) -> bool:
+    return data[:5] == b"%PDF-"
+
+
+def render_pdf_pages(data: bytes, dpi: int, max_pages: int) -> List[bytes]:
+    """
+    Render each page of a PDF to PNG bytes (blocking, run it in a thread).
+    PNG keeps the render lossless; pages are sized and re-encoded by preprocessing anyway.
+    """
+    try:
+        import pypdfium2 as pdfium
+    except ImportError:
+        raise DocumentError("PDF support requires pypdfium2 (pip install pypdfium2)")
+
+    try:
+        pdf = pdfium.PdfDocument(data)
+    except pdfium.PdfiumError as e:
+        raise DocumentError(f"Invalid PDF: {e}")
+    try:
+        if len(pdf) > max_pages:
+            raise DocumentError(f"Too many pages ({len(pdf)} > {max_pages})")
+        pages = []
+        for index in range(len(pdf)):
+            page = pdf[index]
+            try:
+                image = page.render(scale=dpi / 72).to_pil()
+            finally:
+                page.close()
+            out = io.BytesIO()
+            image.save(out, format="PNG")
+            pages.append(out.getvalue())
+        return pages
+    finally:
+        pdf.close()
+
+
+def _spans(length: int, tile: int, overlap: int) -> List[Tuple[int, int]]:
+    """
+    As few [start, end) ranges of at most `tile` as cover `length` with neighbours sharing `overlap`.
+    The ranges are shrunk to equal size rather than overlapping more than needed.
+    """
+    if length <= tile:
+        return [(0, length)]
+    count = math.ceil((length - overlap) / (tile - overlap))
+    size = math.ceil((length + (count - 1) * overlap) / count)
+    step = (length - size) / (count - 1)
+    return [(round(i * step), round(i * step) + size) for i in range(count)]
+
+
+def plan_tiles(width: int, height: int, max_side: int, max_downscale: float, overlap: float) -> List[Box]:
+    """
+    Overlapping full-width strips covering a page, top to bottom.
+
+    A page is left whole if the model can take it with at most `max_downscale` shrinking; otherwise
+    it is cut into strips no taller than that. Pages are never cut into columns: a line crossing a
+    vertical cut would come back as two halves in different places. A page wider than that is
+    shrunk to fit instead, its strips being no taller than they are wide.
+    """
+    side = int(max_side * max_downscale)
+    if max(width, height) <= side:
+        return [(0, 0, width, height)]
+    strip_h = min(height, max(side, width))
+    return [(0, top, width, bottom) for top, bottom in _spans(height, strip_h, int(strip_h * overlap))]
+
+
+def crop_tiles(data: bytes, max_side: int, max_downscale: float, overlap: float) -> List[bytes]:
+    """
+    Split an encoded page into strips (blocking, run it in a thread). Returns PNG strips, top to
+    bottom; a page that needs no tiling comes back as-is.
+    """
+    with Image.open(io.BytesIO(data)) as img:
+        boxes = plan_tiles(*img.size, max_side, max_downscale, overlap)
+        if len(boxes) == 1:
+            return [data]
+        img.load()
+        tiles = []
+        for box in boxes:
+            out = io.BytesIO()
+            img.crop(box).save(out, format="PNG")
+            tiles.append(out.getvalue())
+        return tiles
+
+
+def _normalize(line: str) -> str:
+    return re.sub(r"\s+", " ", line).strip().lower()
+
+
+def _same_line(a: str, b: str) -> bool:
+    a, b = _normalize(a), _normalize(b)
+    return a == b or SequenceMatcher(None, a, b).ratio() >= OVERLAP_LINE_SIMILARITY
+
+
+def merge_overlap(first: str, second: str) -> str:
+    """
+    Join the text of two vertically adjacent strips, dropping the lines at the top of `second`
+    that repeat the bottom of `first` (both tiles read the strip they share).
+    """
+    a = [line for line in first.splitlines() if line.strip()]
+    b = [line for line in second.splitlines() if line.strip()]
+    for count in range(min(OVERLAP_MAX_LINES, len(a), len(b)), 0, -1):
+        if all(_same_line(x, y) for x, y in zip(a[-count:], b[:count])):
+            # Keep the longer reading of each shared line: the tile that saw it whole read more of it
+            shared = [x if len(x) >= len(y) else y for x, y in zip(a[-count:], b[:count])]
+            return "\n".join(a[:-count] + shared + b[count:])
+    return "\n".join(a + b)
+
+
+def stitch_tiles(tiles: List[str]) -> str:
+    """Text of a page tiled into strips, top to bottom, without the lines read twice in the overlaps."""
+    text = ""
+    for tile in tiles:
+        if tile.strip():
+            text = merge_overlap(text, tile) if text else tile.strip()
+    return text
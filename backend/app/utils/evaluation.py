@@ -0,0 +1,131 @@
+import re
+from typing import Any, Dict, Hashable, List, Optional, Sequence
+
+from app.utils.templates import leaf_paths, parse_template
+
+
+def edit_distance(a: Sequence[Hashable], b: Sequence[Hashable]) -> int:
+    """
+    Levenshtein distance between two sequences (characters or words).
+
+    Bit-parallel (Myers/Hyyrö): one column of the DP matrix is a pair of bit vectors held in a
+    Python int, so each element of `b` costs a handful of integer operations instead of a loop
+    over `a`. Two pages of OCR text compare in a few milliseconds.
+    """
+    # The shorter sequence is the pattern, so the bit vectors stay as small as possible
+    if len(a) > len(b):
+        a, b = b, a
+    if not a:
+        return len(b)
+    m = len(a)
+    mask = (1 << m) - 1
+    high = 1 << (m - 1)
+
+    peq: Dict[Hashable, int] = {}
+    for i, item in enumerate(a):
+        peq[item] = peq.get(item, 0) | (1 << i)
+
+    pv, mv, score = mask, 0, m
+    for item in b:
+        eq = peq.get(item, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | (~(xh | pv) & mask)
+        mh = pv & xh
+        if ph & high:
+            score += 1
+        elif mh & high:
+            score -= 1
+        ph = ((ph << 1) | 1) & mask
+        mh = (mh << 1) & mask
+        pv = mh | (~(xv | ph) & mask)
+        mv = ph & xv
+    return score
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace so line wrapping and indentation don't count as errors."""
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def text_errors(prediction: str, reference: str) -> Dict[str, int]:
+    """Character and word edit counts against a reference, with the reference lengths they are rates of."""
+    prediction, reference = normalize_text(prediction), normalize_text(reference)
+    predicted_words, reference_words = prediction.split(), reference.split()
+    return {
+        "char_errors": edit_distance(prediction, reference),
+        "chars": len(reference),
+        "word_errors": edit_distance(predicted_words, reference_words),
+        "words": len(reference_words),
+    }
+
+
+def _lookup(data: Any, path: str) -> Any:
+    for part in path.split("."):
+        if not isinstance(data, dict) or part not in data:
+            return None
+        data = data[part]
+    return data
+
+
+def _field_value(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, list):
+        return " ".join(_field_value(item) for item in value)
+    return normalize_text(str(value)).casefold()
+
+
+def field_matches(prediction: str, reference: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """
+    Per-field comparison of a template output with its labelled JSON. Fields match exactly after
+    whitespace and case normalization; `char_errors` shows how far a mismatched field was off.
+    An output that isn't JSON scores every field as missed.
+    """
+    predicted = parse_template(prediction) or {}
+    fields = {}
+    for path in leaf_paths(reference):
+        expected, actual = _field_value(_lookup(reference, path)), _field_value(_lookup(predicted, path))
+        fields[path] = {
+            "match": actual == expected,
+            "char_errors": edit_distance(actual, expected),
+            "chars": len(expected),
+        }
+    return fields
+
+
+def score_sample(prediction: str, ground_truth: str) -> Dict[str, Any]:
+    """
+    Score one OCR output against its ground truth sidecar: text (`.txt`) gets character and word
+    error counts, a JSON object (`.json`) gets per-field matches.
+    """
+    reference = parse_template(ground_truth)
+    if reference is not None:
+        return {"kind": "fields", "fields": field_matches(prediction, reference)}
+    return {"kind": "text", **text_errors(prediction, ground_truth)}
+
+
+def _rate(errors: int, total: int) -> Optional[float]:
+    return errors / total if total else None
+
+
+def summarize_scores(samples: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Corpus-level accuracy from scored samples. Rates are pooled (total errors over total reference
+    length) rather than averaged per image, so long documents weigh what they contain.
+    """
+    text = [s for s in samples if s["kind"] == "text"]
+    fields: Dict[str, List[Dict[str, Any]]] = {}
+    for sample in samples:
+        for path, field in sample.get("fields", {}).items():
+            fields.setdefault(path, []).append(field)
+    all_fields = [field for scores in fields.values() for field in scores]
+
+    return {
+        "images_scored": len(samples),
+        "cer": _rate(sum(s["char_errors"] for s in text), sum(s["chars"] for s in text)),
+        "wer": _rate(sum(s["word_errors"] for s in text), sum(s["words"] for s in text)),
+        "field_accuracy": _rate(sum(f["match"] for f in all_fields), len(all_fields)),
+        "field_cer": _rate(sum(f["char_errors"] for f in all_fields), sum(f["chars"] for f in all_fields)),
+        "fields": {path: _rate(sum(f["match"] for f in scores), len(scores)) for path, scores in fields.items()},
+    }
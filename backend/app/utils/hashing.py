@@ -0,0 +1,14 @@
+import hashlib
+
+
+def sha256_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def sha256_file(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """Hex SHA-256 of a file's contents (blocking, run it in a thread from async code)."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
@@ -1,56 +1,163 @@
-from PIL import Image, ImageEnhance, ImageOps
+from PIL import Image, ImageOps
+from typing import Any, Callable, Dict, List, Optional
+from app.core.config import settings
+from app.utils.image_sizing import DEFAULT_SIZING_POLICY, SizingPolicy, estimate_image_tokens, target_size
+from app.utils.perceptual_hash import perceptual_hash
+from app.utils.preprocess_steps import BEFORE_SIZING, run_steps
+import numpy as np
+import io
 import os
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
-def preprocess_image(image_path: str) -> str:
+# zlib level of the PNG the model gets
+PNG_COMPRESS_LEVEL = 1
+
+def _step_timer(timings: Dict[str, float]) -> Callable[[str], None]:
+    """Returns a callback that records the seconds since the previous call under the given step name."""
+    step_start = time.perf_counter()
+
+    def step_done(step: str) -> None:
+        nonlocal step_start
+        now = time.perf_counter()
+        timings[step] = now - step_start
+        step_start = now
+
+    return step_done
+
+def _draft(img: Image.Image, policy: SizingPolicy) -> None:
+    """
+    Let the JPEG decoder scale down by 1/2, 1/4 or 1/8 while decoding when the image is far
+    above the policy's band. Much cheaper than decoding 12MP phone photos at full size.
+    The draft never goes below the target size, so the final resize still does the fitting.
+    """
+    if img.format != "JPEG":
+        return
+    width, height = target_size(*img.size, policy)
+    if width < img.size[0]:
+        img.draft(img.mode, (width, height))
+
+def _resample_filter(scale: float) -> Image.Resampling:
+    # LANCZOS keeps glyph edges sharp when enlarging or shrinking a little;
+    # for big reductions a box filter averages away the aliasing LANCZOS would ring on
+    return Image.Resampling.BOX if scale < 0.5 else Image.Resampling.LANCZOS
+
+def _enhance(img: Image.Image, step_done: Callable[[str], None], policy: SizingPolicy, sizing: Dict[str, Any], steps: List[str]) -> Image.Image:
     """
-    Preprocesses the image for better OCR results.
-    - Increases contrast
-    - Sharpening
+    The actual preprocessing, shared by the path and in-memory variants.
     - Auto-orient
-    
+    - Crop to the document (border_crop step, or the policy's crop_to_document)
+    - Resize into the model's resolution band
+    - The remaining steps of the chain on the pixel array, in order (see app/utils/preprocess_steps.py)
+    The original and chosen sizes, the estimated vision tokens and the perceptual hash of the
+    result (for near-duplicate lookups) are recorded into `sizing`.
+    """
+    sizing["original_size"] = list(img.size)
+    _draft(img, policy)
+
+    # Fix orientation (EXIF)
+    img = ImageOps.exif_transpose(img)
+
+    # Convert to RGB if needed
+    if img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+    step_done("decode_orient")
+
+    if policy.crop_to_document and "border_crop" not in steps:
+        steps = ["border_crop", *steps]
+    before = [name for name in steps if name in BEFORE_SIZING]
+    after = [name for name in steps if name not in BEFORE_SIZING]
+    if before:
+        cropped = run_steps(np.asarray(img), before, step_done)
+        sizing["cropped"] = cropped.shape[:2] != (img.size[1], img.size[0])
+        img = Image.fromarray(cropped)
+
+    # Fit the longest side into the model's band: small NID crops are upscaled so they read well,
+    # phone photos downscaled so they don't cost more tokens and latency than they help
+    width, height = img.size
+    new_size = target_size(width, height, policy)
+    if new_size != (width, height):
+        scale = new_size[0] / width
+        if scale < 0.5:
+            # Integer pre-reduction first; the final resample then only covers the last factor < 2
+            img = img.reduce(int(1 / (2 * scale)))
+        img = img.resize(new_size, _resample_filter(new_size[0] / img.size[0]))
+        logger.info(f"Resized image from {width}x{height} to {new_size[0]}x{new_size[1]}")
+    sizing["size"] = list(new_size)
+    sizing["image_tokens_estimate"] = estimate_image_tokens(*new_size, policy)
+    step_done("resize")
+
+    if after:
+        img = Image.fromarray(run_steps(np.asarray(img), after, step_done))
+    sizing["steps"] = steps
+
+    # Hashed after sizing so re-uploads at another resolution are compared at the same scale
+    sizing["perceptual_hash"] = perceptual_hash(img)
+    step_done("perceptual_hash")
+    return img
+
+def _encode(img: Image.Image, out) -> None:
+    # Lossless, and fast: higher zlib levels cost far more time than the bytes they save on localhost
+    img.save(out, format="PNG", compress_level=PNG_COMPRESS_LEVEL)
+
+def preprocess_image(
+    image_path: str,
+    timings: Optional[Dict[str, float]] = None,
+    policy: SizingPolicy = DEFAULT_SIZING_POLICY,
+    sizing: Optional[Dict[str, Any]] = None,
+    steps: Optional[List[str]] = None,
+) -> str:
+    """
+    Preprocesses the image for better OCR results and saves it next to the original as PNG.
+
     Returns the path to the processed image.
+    `steps` is the chain of named steps to run (default: PREPROCESS_STEPS).
+    If `timings` is given, the seconds spent in each step are recorded into it;
+    if `sizing` is given, the chosen image size and estimated vision tokens.
     """
+    step_done = _step_timer(timings if timings is not None else {})
     try:
         with Image.open(image_path) as img:
-            # Fix orientation (EXIF)
-            img = ImageOps.exif_transpose(img)
-            
-            # Convert to RGB if needed
-            if img.mode not in ('RGB', 'L'):
-                img = img.convert('RGB')
-            
-            # Upscale if image is too small (critical for NID/small docs)
-            # Target at least 1000px on the longest side for better OCR
-            width, height = img.size
-            max_dim = max(width, height)
-            if max_dim < 1000:
-                scale_factor = 1000 / max_dim
-                new_size = (int(width * scale_factor), int(height * scale_factor))
-                img = img.resize(new_size, Image.Resampling.LANCZOS)
-                logger.info(f"Upscaled image from {width}x{height} to {new_size[0]}x{new_size[1]}")
-
-            # Enhancement factors
-            # 1. Increase Contrast
-            enhancer = ImageEnhance.Contrast(img)
-            img = enhancer.enhance(1.5) # Increase contrast by 50%
-            
-            # 2. Sharpen
-            enhancer = ImageEnhance.Sharpness(img)
-            img = enhancer.enhance(2.0) # Sharpen significantly
-            
+            img = _enhance(img, step_done, policy, sizing if sizing is not None else {}, settings.PREPROCESS_STEPS if steps is None else steps)
+
             # Save processed image
             directory, filename = os.path.split(image_path)
-            name, ext = os.path.splitext(filename)
-            new_filename = f"{name}_processed{ext}"
+            name, _ = os.path.splitext(filename)
+            new_filename = f"{name}_processed.png"
             new_path = os.path.join(directory, new_filename)
-            
-            img.save(new_path, quality=95)
+
+            with open(new_path, "wb") as f:
+                _encode(img, f)
+            step_done("encode_save")
             logger.info(f"Processed image saved to {new_path}")
             return new_path
-            
+
     except Exception as e:
         logger.error(f"Failed to preprocess image: {e}")
         return image_path # Return original if failure
+
+def preprocess_image_bytes(
+    data: bytes,
+    timings: Optional[Dict[str, float]] = None,
+    policy: SizingPolicy = DEFAULT_SIZING_POLICY,
+    sizing: Optional[Dict[str, Any]] = None,
+    steps: Optional[List[str]] = None,
+) -> bytes:
+    """
+    In-memory variant of preprocess_image: encoded image bytes in, PNG bytes out.
+    """
+    step_done = _step_timer(timings if timings is not None else {})
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            img = _enhance(img, step_done, policy, sizing if sizing is not None else {}, settings.PREPROCESS_STEPS if steps is None else steps)
+
+            out = io.BytesIO()
+            _encode(img, out)
+            step_done("encode")
+            return out.getvalue()
+
+    except Exception as e:
+        logger.error(f"Failed to preprocess image: {e}")
+        return data # Return original if failure
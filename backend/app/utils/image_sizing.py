@@ -0,0 +1,68 @@
+import math
+from typing import Optional, Tuple
+from pydantic import BaseModel
+from app.core.config import settings
+
+# Rough characters per text token, used to budget prompts and templates without a tokenizer
+CHARS_PER_TOKEN = 3
+
+
+class SizingPolicy(BaseModel):
+    """How large an image a vision model should get, and what it costs in prompt tokens."""
+    min_side: int = 1000  # Upscale below this longest side (small NID crops read badly)
+    max_side: int = 1600  # Downscale above this longest side
+    token_pixels: int = 28  # Side of the image square that becomes one vision token
+    token_overhead: int = 64  # Fixed tokens per image (separators, global view, ...)
+    crop_to_document: bool = False  # Crop a uniform background around the document first
+
+
+# Built-in policies per model family (the name before the ":tag")
+SIZING_POLICIES = {
+    # DeepSeek-OCR compresses 16px patches 16x: a 1024px "base" view is 256 tokens, 1280px "large" is 400
+    "deepseek-ocr": SizingPolicy(min_side=1000, max_side=1280, token_pixels=64, token_overhead=16),
+    # Qwen2.5-VL merges 2x2 patches of 14px; Qwen3-VL 2x2 patches of 16px
+    "qwen2.5vl": SizingPolicy(max_side=1600, token_pixels=28),
+    "qwen3-vl": SizingPolicy(max_side=1600, token_pixels=32),
+}
+DEFAULT_SIZING_POLICY = SizingPolicy()
+
+
+def sizing_policy(model_name: Optional[str]) -> SizingPolicy:
+    """Sizing policy of a model: the built-in one for its family, with IMAGE_SIZING_OVERRIDES applied."""
+    if not model_name:
+        return DEFAULT_SIZING_POLICY
+    family = model_name.split(":")[0]
+    policy = SIZING_POLICIES.get(family, DEFAULT_SIZING_POLICY)
+    overrides = settings.IMAGE_SIZING_OVERRIDES.get(model_name) or settings.IMAGE_SIZING_OVERRIDES.get(family)
+    return policy.model_copy(update=overrides) if overrides else policy
+
+
+def target_size(width: int, height: int, policy: SizingPolicy) -> Tuple[int, int]:
+    """Size the image should be resized to so its longest side falls within the policy's band."""
+    longest = max(width, height)
+    if longest < policy.min_side:
+        scale = policy.min_side / longest
+    elif longest > policy.max_side:
+        scale = policy.max_side / longest
+    else:
+        return width, height
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def estimate_image_tokens(width: int, height: int, policy: SizingPolicy) -> int:
+    return math.ceil(width / policy.token_pixels) * math.ceil(height / policy.token_pixels) + policy.token_overhead
+
+
+def estimate_text_tokens(*texts: Optional[str]) -> int:
+    return sum(math.ceil(len(text) / CHARS_PER_TOKEN) for text in texts if text)
+
+
+def context_size(input_tokens: int) -> int:
+    """
+    num_ctx for a generation with `input_tokens` of prompt, plus room for the answer.
+    Rounded up to a power of two: Ollama reloads the runner whenever num_ctx changes,
+    so a handful of sizes keeps that to a minimum.
+    """
+    needed = input_tokens + settings.NUM_CTX_OUTPUT_RESERVE
+    num_ctx = 1 << max(needed - 1, 1).bit_length()
+    return max(settings.NUM_CTX_MIN, min(num_ctx, settings.NUM_CTX_MAX))
@@ -0,0 +1,59 @@
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image
+
+# Side of the hash grids: 16x16 dHash + 16x16 pHash = 512 bits. 8x8 grids cannot tell apart
+# two cards of the same layout that only differ in the holder's details.
+HASH_SIZE = 16
+# pHash keeps the lowest HASH_SIZE x HASH_SIZE frequencies of a DCT over an image this many times larger
+PHASH_FACTOR = 4
+HASH_BITS = 2 * HASH_SIZE * HASH_SIZE
+
+
+def _dhash_bits(gray: Image.Image) -> np.ndarray:
+    """Difference hash: whether each pixel is brighter than its left neighbour, on a (size+1) x size thumbnail."""
+    pixels = np.asarray(gray.resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.BOX), dtype=np.int16)
+    return (pixels[:, 1:] > pixels[:, :-1]).ravel()
+
+
+@lru_cache(maxsize=4)
+def _dct_matrix(n: int) -> np.ndarray:
+    """Orthonormal DCT-II matrix, so the 2D DCT of A is D @ A @ D.T."""
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2 / n)
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+
+def _phash_bits(gray: Image.Image) -> np.ndarray:
+    """Perceptual hash: whether each low-frequency DCT coefficient is above their median (DC excluded)."""
+    n = HASH_SIZE * PHASH_FACTOR
+    pixels = np.asarray(gray.resize((n, n), Image.Resampling.BOX), dtype=np.float64)
+    dct = _dct_matrix(n)
+    coefficients = (dct @ pixels @ dct.T)[:HASH_SIZE, :HASH_SIZE].ravel()
+    return coefficients > np.median(coefficients[1:])
+
+
+def perceptual_hash(img: Image.Image) -> str:
+    """
+    dHash + pHash of an image as a hex string. Both survive re-compression, rescaling and small
+    exposure changes, so re-uploads of the same scan or photo land within a few bits of each other.
+    """
+    gray = img.convert("L")
+    # Hash from a small copy: the grids are tiny and resizing a 12MP photo per hash adds up
+    gray.thumbnail((256, 256), Image.Resampling.BOX)
+    bits = np.concatenate([_dhash_bits(gray), _phash_bits(gray)])
+    return np.packbits(bits).tobytes().hex()
+
+
+def hash_words(value: str) -> np.ndarray:
+    """A hex hash as a row of uint64 words, the layout the index compares."""
+    return np.frombuffer(bytes.fromhex(value), dtype=">u8").astype(np.uint64)
+
+
+def hamming_distances(words: np.ndarray, query: np.ndarray) -> np.ndarray:
+    """Bits differing between `query` and each row of `words`, for all rows at once."""
+    diff = np.bitwise_xor(words, query)
+    return np.unpackbits(diff.view(np.uint8), axis=1).sum(axis=1)
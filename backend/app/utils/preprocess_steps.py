@@ -0,0 +1,207 @@
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from app.core.config import settings
+
+# ITU-R 601 luma, the weights PIL uses for convert("L")
+LUMA = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+CONTRAST_FACTOR = 1.5  # Same as the former ImageEnhance.Contrast(1.5)
+SHARPEN_FACTOR = 2.0  # Same as the former ImageEnhance.Sharpness(2.0)
+BINARIZE_WINDOW = 25  # Sauvola window (pixels, odd); about two text lines at the sized resolution
+BINARIZE_K = 0.2
+DESKEW_MAX_ANGLE = 5.0  # Degrees; larger skews are rotations, not scanning slop
+DESKEW_STEP = 0.25
+BORDER_THRESHOLD = 40  # Gray levels a pixel must differ from the border colour to count as document
+
+Array = np.ndarray
+
+
+def _gray(a: Array) -> Array:
+    return a if a.ndim == 2 else (a[..., :3] @ LUMA).round().astype(np.uint8)
+
+
+def _to_uint8(a: Array) -> Array:
+    return np.clip(np.rint(a), 0, 255).astype(np.uint8)
+
+
+def _shifted(a: Array) -> List[Array]:
+    """The 3x3 neighbourhood of every pixel as nine shifted views (edges replicated)."""
+    h, w = a.shape[:2]
+    padded = np.pad(a, [(1, 1), (1, 1)] + [(0, 0)] * (a.ndim - 2), mode="edge")
+    return [padded[dy:dy + h, dx:dx + w] for dy in range(3) for dx in range(3)]
+
+
+def grayscale(a: Array) -> Array:
+    """Drop colour. A third of the pixels to encode and send, and OCR models read gray text as well."""
+    return _gray(a)
+
+
+def contrast(a: Array) -> Array:
+    """Stretch values away from the mean gray level, like ImageEnhance.Contrast."""
+    mean = float(_gray(a).mean())
+    return _to_uint8(mean + CONTRAST_FACTOR * (a.astype(np.float32) - mean))
+
+
+def sharpen(a: Array) -> Array:
+    """Unsharp mask against PIL's SMOOTH kernel (centre 5, neighbours 1), like ImageEnhance.Sharpness."""
+    pixels = a.astype(np.float32)
+    smooth = (sum(view.astype(np.float32) for view in _shifted(a)) + 4 * pixels) / 13
+    return _to_uint8(smooth + SHARPEN_FACTOR * (pixels - smooth))
+
+
+# Compare-exchange network that leaves the median of nine values at index 4 (Paeth's opt_med9)
+_MEDIAN9_NETWORK = (
+    (1, 2), (4, 5), (7, 8), (0, 1), (3, 4), (6, 7), (1, 2), (4, 5), (7, 8), (0, 3),
+    (5, 8), (4, 7), (3, 6), (1, 4), (2, 5), (4, 7), (4, 2), (6, 4), (4, 2),
+)
+
+
+def denoise(a: Array) -> Array:
+    """
+    3x3 median: removes speckle and JPEG noise while keeping glyph edges.
+    Elementwise min/max over the nine shifted views; several times faster than a sort.
+    """
+    v = _shifted(a)
+    for i, j in _MEDIAN9_NETWORK:
+        v[i], v[j] = np.minimum(v[i], v[j]), np.maximum(v[i], v[j])
+    return v[4]
+
+
+def binarize(a: Array) -> Array:
+    """
+    Sauvola adaptive threshold: black text on white, robust to uneven lighting and shadows.
+    Local mean and deviation come from integral images, so the cost doesn't depend on the window.
+    """
+    gray = _gray(a).astype(np.float64)
+    h, w = gray.shape
+    r = BINARIZE_WINDOW // 2
+    padded = np.pad(gray, r, mode="edge")
+    count = BINARIZE_WINDOW * BINARIZE_WINDOW
+
+    def window_sums(values: Array) -> Array:
+        integral = np.zeros((values.shape[0] + 1, values.shape[1] + 1))
+        integral[1:, 1:] = values.cumsum(0).cumsum(1)
+        n = BINARIZE_WINDOW
+        return integral[n:n + h, n:n + w] - integral[:h, n:n + w] - integral[n:n + h, :w] + integral[:h, :w]
+
+    mean = window_sums(padded) / count
+    std = np.sqrt(np.maximum(window_sums(padded * padded) / count - mean * mean, 0))
+    threshold = mean * (1 + BINARIZE_K * (std / 128 - 1))
+    return np.where(gray > threshold, 255, 0).astype(np.uint8)
+
+
+def _skew_angle(gray: Array) -> float:
+    """
+    Angle (degrees) that best aligns the dark pixels into horizontal lines: the projection
+    profile of text is sharpest when lines are level. All candidate angles are scored at once.
+    """
+    stride = max(1, max(gray.shape) // 800)
+    small = gray[::stride, ::stride].astype(np.float32)
+    ys, xs = np.nonzero(small < small.mean() - small.std())
+    if len(ys) < 100:
+        return 0.0
+    angles = np.arange(-DESKEW_MAX_ANGLE, DESKEW_MAX_ANGLE + DESKEW_STEP / 2, DESKEW_STEP)
+    radians = np.deg2rad(angles)[:, None]
+    rows = np.rint(ys * np.cos(radians) - xs * np.sin(radians)).astype(np.int64)
+    rows -= rows.min()
+    bins = int(rows.max()) + 1
+    counts = np.bincount((rows + np.arange(len(angles))[:, None] * bins).ravel(), minlength=len(angles) * bins)
+    scores = (counts.reshape(len(angles), bins).astype(np.float64) ** 2).sum(axis=1)
+    return float(angles[int(np.argmax(scores))])
+
+
+def deskew(a: Array) -> Array:
+    """Rotate scanned/photographed pages level (up to DESKEW_MAX_ANGLE either way)."""
+    angle = _skew_angle(_gray(a))
+    if abs(angle) < DESKEW_STEP:
+        return a
+    fill = tuple(int(v) for v in np.median(a.reshape(-1, a.shape[2]), axis=0)) if a.ndim == 3 else int(np.median(a))
+    rotated = Image.fromarray(a).rotate(angle, resample=Image.Resampling.BICUBIC, fillcolor=fill)
+    return np.asarray(rotated)
+
+
+def document_bbox(a: Array) -> Optional[Tuple[int, int, int, int]]:
+    """
+    Bounding box of the document on a roughly uniform background, or None if there is nothing to crop.
+    Works on a small grayscale copy: the background is the median of its border, the document
+    is whatever differs from it.
+    """
+    gray = _gray(a)
+    stride = max(1, max(gray.shape) // 256)
+    small = denoise(gray[::stride, ::stride])
+    h, w = small.shape
+    border = np.concatenate([small[0], small[-1], small[:, 0], small[:, -1]])
+    background = int(np.median(border))
+
+    mask = np.abs(small.astype(np.int16) - background) > BORDER_THRESHOLD
+    rows, cols = np.flatnonzero(mask.any(axis=1)), np.flatnonzero(mask.any(axis=0))
+    if not len(rows):
+        return None
+    top, bottom, left, right = rows[0], rows[-1] + 1, cols[0], cols[-1] + 1
+    area = (bottom - top) * (right - left) / (w * h)
+    if area < 0.2 or area > 0.95:
+        # Either noise/a small object, or the document already fills the frame
+        return None
+
+    # Back to full-size coordinates, with a small margin so edge text is never cut
+    full_h, full_w = gray.shape
+    margin = int(0.02 * max(full_h, full_w))
+    return (
+        max(0, left * stride - margin),
+        max(0, top * stride - margin),
+        min(full_w, right * stride + margin),
+        min(full_h, bottom * stride + margin),
+    )
+
+
+def border_crop(a: Array) -> Array:
+    """Crop a uniform background (table, scanner lid) around the document."""
+    bbox = document_bbox(a)
+    if bbox is None:
+        return a
+    left, top, right, bottom = bbox
+    return a[top:bottom, left:right]
+
+
+STEPS: Dict[str, Callable[[Array], Array]] = {
+    "grayscale": grayscale,
+    "denoise": denoise,
+    "deskew": deskew,
+    "border_crop": border_crop,
+    "binarize": binarize,
+    "contrast": contrast,
+    "sharpen": sharpen,
+}
+# Steps that change the framing run before the image is sized, so the document (not the
+# background around it) gets the model's resolution band
+BEFORE_SIZING = ("border_crop",)
+
+
+def parse_steps(value: str) -> List[str]:
+    """Comma-separated step names (e.g. from a form field). Raises ValueError for unknown steps."""
+    steps = [name.strip() for name in value.split(",") if name.strip()]
+    unknown = [name for name in steps if name not in STEPS]
+    if unknown:
+        raise ValueError(f"Unknown preprocessing steps {unknown}. Expected any of {list(STEPS)}.")
+    return steps
+
+
+def preprocess_steps(model_name: Optional[str]) -> List[str]:
+    """Step chain for a model: PREPROCESS_STEPS_OVERRIDES for the model or its family, else PREPROCESS_STEPS."""
+    if model_name:
+        overrides = settings.PREPROCESS_STEPS_OVERRIDES
+        steps = overrides.get(model_name) or overrides.get(model_name.split(":")[0])
+        if steps is not None:
+            return list(steps)
+    return list(settings.PREPROCESS_STEPS)
+
+
+def run_steps(a: Array, steps: List[str], step_done: Callable[[str], None]) -> Array:
+    """Apply `steps` in order, timing each one under its name."""
+    for name in steps:
+        a = STEPS[name](a)
+        step_done(name)
+    return a
@@ -0,0 +1,19 @@
+import math
+from typing import Dict, List, Optional, Sequence
+
+
+def percentile(values: Sequence[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile (pct in 0-100). Returns None for an empty sequence."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def latency_summary(latencies: List[float]) -> Dict[str, Optional[float]]:
+    return {
+        "latency_p50": percentile(latencies, 50),
+        "latency_p95": percentile(latencies, 95),
+        "latency_max": max(latencies) if latencies else None,
+    }
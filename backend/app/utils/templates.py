@@ -0,0 +1,228 @@
+import hashlib
+import json
+import re
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+# Compiled schemas kept per template hash; templates are few and reused across requests
+SCHEMA_CACHE_SIZE = 256
+_schema_cache: "OrderedDict[str, Optional[Dict[str, Any]]]" = OrderedDict()
+
+
+def minify_template(template: str) -> str:
+    """Collapse a JSON template onto one line to save prompt tokens."""
+    return "".join(line.strip() for line in template.splitlines())
+
+
+def template_hash(template: str) -> str:
+    return hashlib.sha256(minify_template(template).encode("utf-8")).hexdigest()
+
+
+def parse_template(template: str) -> Optional[Dict[str, Any]]:
+    """The template as a JSON object, or None if it isn't one (free-form templates are still allowed)."""
+    try:
+        parsed = json.loads(template)
+    except ValueError:
+        return None
+    return parsed if isinstance(parsed, dict) else None
+
+
+def _value_schema(value: Any) -> Dict[str, Any]:
+    if isinstance(value, dict):
+        return {
+            "type": "object",
+            "properties": {key: _value_schema(item) for key, item in value.items()},
+            "required": list(value),
+            "additionalProperties": False,
+        }
+    if isinstance(value, list):
+        return {"type": "array", "items": _value_schema(value[0]) if value else {"type": "string"}}
+    if isinstance(value, bool):
+        return {"type": "boolean"}
+    if isinstance(value, int):
+        return {"type": "integer"}
+    if isinstance(value, float):
+        return {"type": "number"}
+    if value is None:
+        return {"type": ["string", "null"]}
+    return {"type": "string"}
+
+
+def template_schema(template: str) -> Optional[Dict[str, Any]]:
+    """
+    JSON Schema of a template: every key required, no extra keys, leaf types taken from the
+    template's placeholder values. None if the template is not a JSON object.
+    Compiled once per template hash.
+    """
+    key = template_hash(template)
+    if key in _schema_cache:
+        _schema_cache.move_to_end(key)
+        return _schema_cache[key]
+    parsed = parse_template(template)
+    schema = _value_schema(parsed) if parsed is not None else None
+    _schema_cache[key] = schema
+    if len(_schema_cache) > SCHEMA_CACHE_SIZE:
+        _schema_cache.popitem(last=False)
+    return schema
+
+
+def leaf_paths(template: Dict[str, Any], prefix: str = "") -> List[str]:
+    """Dotted paths of a template's leaves (lists count as leaves)."""
+    paths = []
+    for key, value in template.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict) and value:
+            paths.extend(leaf_paths(value, f"{path}."))
+        else:
+            paths.append(path)
+    return paths
+
+
+def subtemplate(template: Dict[str, Any], paths: List[str]) -> Dict[str, Any]:
+    """The part of a template holding only `paths`, with its nesting kept."""
+    result: Dict[str, Any] = {}
+    for path in paths:
+        *parents, leaf = path.split(".")
+        source, target = template, result
+        for part in parents:
+            source = source[part]
+            target = target.setdefault(part, {})
+        target[leaf] = source[leaf]
+    return result
+
+
+def strip_code_fences(content: str) -> str:
+    # Clean up potential markdown code blocks
+    if "```json" in content:
+        content = content.split("```json")[1].split("```")[0].strip()
+    elif "```" in content:
+        content = content.split("```")[1].strip()
+    return content
+
+
+def _close_truncated(content: str) -> str:
+    """
+    Cut truncated JSON back to its last complete member and close the open brackets.
+    Members after the cut are lost; conform_to_template reports them as missing.
+    """
+    stack: List[str] = []
+    in_string = escaped = False
+    cut, cut_stack = None, None
+    for i, char in enumerate(content):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+            cut, cut_stack = i + 1, list(stack)
+        elif char in "}]":
+            if stack:
+                stack.pop()
+            cut, cut_stack = i + 1, list(stack)
+        elif char == ",":
+            cut, cut_stack = i, list(stack)
+    if not stack and not in_string:
+        return content
+    if cut is None:
+        return content
+    return content[:cut] + "".join(reversed(cut_stack))
+
+
+def parse_json_lenient(content: str) -> Optional[Any]:
+    """
+    Parse model output as JSON, repairing what models commonly get wrong: markdown fences,
+    prose around the object, trailing commas and output cut off by the token limit.
+    """
+    content = strip_code_fences(content).strip()
+    try:
+        return json.loads(content)
+    except ValueError:
+        pass
+    start = content.find("{")
+    if start < 0:
+        return None
+    end = content.rfind("}")
+    candidates = [content[start:end + 1]] if end > start else []
+    candidates.append(_close_truncated(content[start:]))
+    for candidate in candidates:
+        candidate = re.sub(r",\s*([}\]])", r"\1", candidate)
+        try:
+            return json.loads(candidate)
+        except ValueError:
+            continue
+    return None
+
+
+def _coerce(value: Any, placeholder: Any) -> Tuple[Any, bool]:
+    """Value converted to the placeholder's type, and whether that was possible."""
+    if isinstance(placeholder, bool):
+        if isinstance(value, bool):
+            return value, True
+        if isinstance(value, str) and value.strip().lower() in ("true", "false", "yes", "no"):
+            return value.strip().lower() in ("true", "yes"), True
+        return value, False
+    if isinstance(placeholder, (int, float)):
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return value, True
+        try:
+            return type(placeholder)(str(value).strip()), True
+        except ValueError:
+            return value, False
+    if isinstance(placeholder, str):
+        if value is None:
+            return "", True
+        if isinstance(value, (str, int, float)) and not isinstance(value, bool):
+            return str(value), True
+        return value, False
+    if isinstance(placeholder, list):
+        if isinstance(value, list):
+            return value, True
+        return ([] if value in (None, "") else [value]), True
+    return value, True
+
+
+def conform_to_template(data: Any, template: Dict[str, Any], prefix: str = "") -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Reshape parsed output onto the template: keys not in the template are dropped, values are
+    coerced to the placeholder's type, and absent or unusable fields keep the template's value.
+    Returns (data, dotted paths of the fields the output did not provide).
+    """
+    if not isinstance(data, dict):
+        return json.loads(json.dumps(template)), leaf_paths(template, prefix)
+    result: Dict[str, Any] = {}
+    missing: List[str] = []
+    for key, placeholder in template.items():
+        path = f"{prefix}{key}"
+        if isinstance(placeholder, dict) and placeholder:
+            result[key], nested = conform_to_template(data.get(key), placeholder, f"{path}.")
+            missing.extend(nested)
+            continue
+        if key not in data:
+            result[key] = json.loads(json.dumps(placeholder))
+            missing.append(path)
+            continue
+        value, ok = _coerce(data[key], placeholder)
+        if ok:
+            result[key] = value
+        else:
+            result[key] = json.loads(json.dumps(placeholder))
+            missing.append(path)
+    return result, missing
+
+
+def merge_fields(data: Dict[str, Any], partial: Dict[str, Any], paths: List[str]) -> None:
+    """Copy `paths` from `partial` (shaped like subtemplate(template, paths)) into `data`."""
+    for path in paths:
+        *parents, leaf = path.split(".")
+        source, target = partial, data
+        for part in parents:
+            source = source[part]
+            target = target[part]
+        target[leaf] = source[leaf]
@@ -0,0 +1,90 @@
+import asyncio
+import logging
+import os
+import shutil
+import uuid
+from typing import BinaryIO, Set
+from fastapi import UploadFile
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+IMAGE_CONTENT_TYPES = ["image/jpeg", "image/png", "image/webp"]
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+UPLOAD_CHUNK_SIZE = 256 * 1024
+
+# Background upload writes still running (kept referenced so they are not garbage collected)
+_pending_writes: Set[asyncio.Task] = set()
+
+
+class UploadTooLarge(Exception):
+    """Raised when an upload exceeds MAX_UPLOAD_BYTES."""
+    pass
+
+
+def new_upload_path(filename: str) -> str:
+    """
+    Unique path in UPLOAD_DIR that keeps the original file extension.
+    Files are sharded by the first two hex chars of their name to keep directories small.
+    """
+    file_ext = filename.split(".")[-1]
+    name = uuid.uuid4().hex
+    directory = os.path.join(settings.UPLOAD_DIR, name[:2])
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f"{name}.{file_ext}")
+
+
+def save_upload(file: UploadFile) -> str:
+    """Copy an uploaded file into UPLOAD_DIR (blocking, run it in a thread). Returns the saved path."""
+    file_path = new_upload_path(file.filename)
+    with open(file_path, "wb") as buffer:
+        shutil.copyfileobj(file.file, buffer)
+    return file_path
+
+
+async def read_upload(file: UploadFile, max_bytes: int) -> bytes:
+    """Read an uploaded file into memory, giving up as soon as it grows past `max_bytes`."""
+    buffer = bytearray()
+    while True:
+        chunk = await file.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        buffer.extend(chunk)
+        if len(buffer) > max_bytes:
+            raise UploadTooLarge(f"Upload exceeds the {max_bytes} byte limit")
+    return bytes(buffer)
+
+
+def copy_limited(src: BinaryIO, dst: BinaryIO, max_bytes: int) -> int:
+    """Copy a stream, giving up as soon as more than `max_bytes` come out of it. Returns the bytes copied."""
+    copied = 0
+    while True:
+        chunk = src.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            return copied
+        copied += len(chunk)
+        if copied > max_bytes:
+            raise UploadTooLarge(f"Upload exceeds the {max_bytes} byte limit")
+        dst.write(chunk)
+
+
+def write_upload(data: bytes, filename: str) -> str:
+    """Write upload bytes into UPLOAD_DIR (blocking). Returns the saved path."""
+    file_path = new_upload_path(filename)
+    with open(file_path, "wb") as f:
+        f.write(data)
+    return file_path
+
+
+def persist_upload_in_background(data: bytes, filename: str) -> None:
+    """Keep a copy of an in-memory upload on disk without making the request wait for it."""
+    async def _write():
+        try:
+            await asyncio.to_thread(write_upload, data, filename)
+        except Exception as e:
+            logger.warning(f"Failed to persist upload {filename}: {e}")
+
+    task = asyncio.create_task(_write())
+    _pending_writes.add(task)
+    task.add_done_callback(_pending_writes.discard)
@@ -3,9 +3,9 @@ import ollama
 import os
 
 async def test_prompts():
-    client = ollama.AsyncClient(host='http://10.11.200.109:11434')
+    client = ollama.AsyncClient(host=os.getenv('OLLAMA_BASE_URL', 'http://10.11.200.109:11434'))
     
-    image_path = r"g:\\_era\\vllm-ocr\\backend\\sample-images\\test-ocr.PNG"
+    image_path = os.path.join(os.path.dirname(__file__), "sample-images", "test-ocr.PNG")
     if not os.path.exists(image_path):
         print(f"ERROR: Image not found at {image_path}")
         return
@@ -19,7 +19,7 @@ async def debug_empty_response():
     model_name = "deepseek-ocr:latest"
     adapter = OllamaAdapter(model_name)
     
-    image_path = r"g:\_era\vllm-ocr\backend\sample-images\test-ocr.PNG"
+    image_path = os.path.join(os.path.dirname(__file__), "sample-images", "test-ocr.PNG")
     
     if not os.path.exists(image_path):
         print(f"Image not found at {image_path}")
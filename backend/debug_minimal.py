@@ -1,8 +1,9 @@
 import asyncio
+import os
 import ollama
 
 async def test_minimal():
-    client = ollama.AsyncClient(host='http://10.11.200.109:11434')
+    client = ollama.AsyncClient(host=os.getenv('OLLAMA_BASE_URL', 'http://10.11.200.109:11434'))
     
     # List models
     try:
@@ -14,7 +15,7 @@ async def test_minimal():
         print(f"Error listing models: {e}")
 
     model = "qwen3-vl:8b"
-    image_path = r"g:\_era\vllm-ocr\backend\sample-images\test-ocr.PNG"
+    image_path = os.path.join(os.path.dirname(__file__), "sample-images", "test-ocr.PNG")
     
     prompts = [
         "Convert this image to HTML.",
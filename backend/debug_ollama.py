@@ -1,9 +1,10 @@
 import asyncio
+import os
 import ollama
 import json
 
 async def test_ollama():
-    client = ollama.AsyncClient(host='http://10.11.200.109:11434')
+    client = ollama.AsyncClient(host=os.getenv('OLLAMA_BASE_URL', 'http://10.11.200.109:11434'))
     
     print("Fetching models...")
     try:
@@ -19,7 +20,7 @@ async def test_ollama():
         print(f"Error listing models: {e}")
 
     model_name = "deepseek-ocr:latest"
-    image_path = r"g:\\_era\\vllm-ocr\\backend\\sample-images\\test-ocr.PNG"
+    image_path = os.path.join(os.path.dirname(__file__), "sample-images", "test-ocr.PNG")
     
     print(f"\nTesting model {model_name} with image {image_path}...")
     
@@ -47,3 +47,54 @@ export const fetchBenchmarks = async () => {
   const response = await api.get('/benchmark');
   return response.data;
 };
+
+export interface OCRStreamHandlers {
+  onPass?: (pass: number, model: string) => void;
+  onToken?: (pass: number, text: string) => void;
+}
+
+// Streams OCR progress from /ocr/process/stream (Server-Sent Events) and resolves with the final result.
+export const processImageStream = async (
+  file: File,
+  handlers: OCRStreamHandlers,
+  modelName?: string,
+  prompt?: string,
+  template?: string,
+  signal?: AbortSignal,
+): Promise<OCRResponse> => {
+  const formData = new FormData();
+  formData.append('file', file);
+  if (modelName) formData.append('model_name', modelName);
+  if (prompt) formData.append('prompt', prompt);
+  if (template) formData.append('template', template);
+
+  const response = await fetch(`${API_URL}/ocr/process/stream`, { method: 'POST', body: formData, signal });
+  if (!response.ok || !response.body) {
+    throw new Error(`Streaming request failed with status ${response.status}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let boundary;
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const raw = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+
+      const event = raw.match(/^event: (.*)$/m)?.[1];
+      const data = JSON.parse(raw.match(/^data: (.*)$/m)?.[1] ?? 'null');
+      if (event === 'pass') handlers.onPass?.(data.pass, data.model);
+      else if (event === 'token') handlers.onToken?.(data.pass, data.text);
+      else if (event === 'result') return data as OCRResponse;
+      else if (event === 'error') throw new Error(data.detail);
+    }
+  }
+
+  throw new Error('Stream ended without a result');
+};